@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Line-based record format of an account file, which new reservations are
+appended to instead of rewriting it.
+
+@author: tanne
+"""
+import json
+
+
+class AccountFormat():
+    '''
+    Static class for the account file format. The first line is a JSON
+    header; each further line is one reservation ID (a JSON string), in the
+    order they were added:
+
+        {"v": 1, "username": "bob", "password": "scrypt$...", "filename": "bob"}
+        "ab"
+        "cd"
+
+    A line without its newline (an append cut short by a crash, or read
+    while it is being written) is ignored.
+
+    Methods
+    -------
+    encode(c_account: Acct) -> bytes
+        The whole file
+
+    encode_reservations(IDs: list [str]) -> bytes
+        Lines to append for new reservations
+
+    decode(data: bytes, filename) -> dict
+        The account record (username, password, filename, reservations)
+    '''
+
+    VERSION = 1
+
+    @classmethod
+    def encode(self, c_account) -> bytes:
+        '''
+        Return c_account's header & every reservation line
+        '''
+        header = json.dumps({'v': self.VERSION,
+                             'username': c_account.username,
+                             'password': c_account.password,
+                             'filename': c_account.filename}, ensure_ascii=False)
+        return (header + '\n').encode() + self.encode_reservations(c_account.reservations)
+
+
+    @staticmethod
+    def encode_reservations(IDs: list) -> bytes:
+        '''
+        Return the lines of reservation IDs, to append to an account file
+        '''
+        return ''.join(json.dumps(str(ID), ensure_ascii=False) + '\n' for ID in IDs).encode()
+
+
+    @classmethod
+    def decode(self, data: bytes, filename) -> dict:
+        '''
+        Turn an account file into a record. Raises ValueError if it is not
+        in this format.
+        '''
+        # Drop a torn last line (an append cut short, or still being
+        # written) before decoding, as it may end inside a UTF-8 character.
+        # The header must be complete.
+        text = data[:data.rfind(b'\n') + 1].decode()
+        header_end = text.find('\n')
+        body = text[header_end + 1:-1]
+        try:
+            if header_end < 0:
+                raise ValueError
+            header = json.loads(text[:header_end])
+            # One parse for the whole list
+            reservations = json.loads('[' + body.replace('\n', ',') + ']')
+        except ValueError:
+            raise ValueError(f'Account "{filename}" is not in a known format')
+
+        if header.pop('v', None) != self.VERSION:
+            raise ValueError(f'Account "{filename}" is not in a known format')
+
+        header['reservations'] = reservations
+        return header
@@ -5,15 +5,18 @@ Created on Fri Jun 24 17:27:19 2022
 @author: tanne
 """
 
-import os
-import pickle
+from CacheModule import TTLCache
+from PasswordModule import PasswordHasher
 from ReservationsModule import Res
+from StorageModule import Storage
+from TransactionModule import UnitOfWork
 
 
 class Acct():
     '''
     The non-static class for containing information in a user's account. Saved
-    to txt and pickle files in ../accounts/
+    to storage (by default, a .acct file in ../accounts/). Does not auto 
+    save: use AccountManager.create_acct to make new accounts.
     
     Attributes
     ----------
@@ -25,16 +28,23 @@ class Acct():
         The username of the user
         
     password : str
-        The user's password
+        Salted hash of the user's password (see PasswordHasher). Accounts
+        saved by older versions hold the password in plain text, until
+        they are next saved.
         
     reservations : list [str]
-        A list of the reservation IDs belonging to the user.
+        A list of the reservation IDs belonging to the user. Only appended
+        to, so storage can append new IDs instead of rewriting the list.
+        
+    stored : (str, str, int) | None
+        Username, password hash & number of reservations as last loaded 
+        from or saved to storage (set by AccountManager). None if never stored.
     
     
     Methods
     -------
     save(self) -> None:
-        Save the isntance to a text file and json.
+        Save the instance to storage.
     
     __str__(self) -> str
         Overload string operator to print readable account summary.
@@ -62,8 +72,7 @@ class Acct():
             self.filename = filename
             
         self.reservations = []
-        
-        self.save()
+        self.stored = None
     
     def __str__(self) -> str:
         '''
@@ -77,26 +86,29 @@ class Acct():
     
     def save(self) -> None:
         '''
-        Save the isntance to a text file and json. Update DaysIntialized.days
+        Save the instance to storage (by default, its .acct file).
         '''
-        with open(f'accounts/{self.filename}.pickle', 'wb') as file:
-            pickle.dump(self, file)
-        
-        with open(f'accounts/{self.filename}.txt', 'w+') as file:
-            file.write(self.__str__())
+        Storage.backend.save_acct(self)
         
 
 class AccountManager():
     '''
-    Static class for creating, loading, and modifying accounts.
+    Static class for creating, loading, and modifying accounts. Accounts
+    read or saved are cached for the session (acct_cache), so a burst of
+    commands for the same account reads storage once. Loads for update 
+    always read storage, under the account's lock.
     
     Methods
     ------ 
     account_exists(username: ID) -> bool:
         Check if a username has a corresponding file.
     
-    load_acct(filename: str) -> Acct:
-        Loads and constructs an account instance from files
+    load_acct(filename: str, for_update=False) -> Acct:
+        Loads and constructs an account instance from files. If for_update,
+        lock it (until the unit of work ends) first.
+        
+    load_accts(filenames, for_update=False) -> dict {str : Acct}
+        Load many accounts at once. Missing accounts are left out.
         
     create_acct(username: str, password: str, filename=None) -> Acct:
         Creates a new account instance and appropriate files
@@ -104,9 +116,16 @@ class AccountManager():
     add_reservation_to_acct(c_account: Acct, c_res: Res):
         Add a reservation to list of reservations. Update account files
         
-    change_password\
-        (c_account: Acct, old_password: str, new_password: str) -> None:
-        Change the account's password
+    try_change_password\
+        (c_account: Acct, old_password: str, new_password: str) -> bool:
+        Change the account's password, if old_password is right
+        
+    check_password(c_account: Acct, password: str) -> bool
+        Does password match the account's?
+        
+    authenticate(username: str, password: str) -> Acct | None
+        Load an account if password is right. Rehashes passwords stored in
+        plain text or with old settings.
     
     smite_acct(username: str) -> None:
         Remove the files associated with username
@@ -119,35 +138,193 @@ class AccountManager():
         Reset the list of reservations associated with this account.
         **for testing only
         
-    
+    acct_from_record(record: dict) -> Acct
+        Build an account from a record loaded by a storage backend
+        
+    save_acct(c_account: Acct) -> None
+        Save an account now, or at the end of the active unit of work
+        
+    configure_cache(capacity=None, ttl=None) -> None
+        Change the account cache size and/or time to live
+        
+    invalidate_acct(filename=None) -> None
+        Drop an account (or every account) from the cache
+        
+    Class Attributes
+    ----------------
+    acct_cache : TTLCache
+        Cached {filename: account record}, as last read from or saved to
+        storage. Records (not Acct instances) are kept, so changes to a 
+        loaded account never leak into the cache; they show once saved.
+        Changes made by other processes show when the entry expires.
         
     '''
+    
+    acct_cache = TTLCache(capacity=256, ttl=60.0)
+    
+
     @classmethod
     def account_exists(self, username: str) -> bool:
         '''
         Check if a username has a corresponding file.
         '''
-        if username in self.list_accounts_initialized():
+        if UnitOfWork.lookup(('acct', username)) != None:
+            return True
+        elif self.acct_cache.get(username) != None:
+            return True
+        elif Storage.backend.account_exists(username):
             return True
         else:
             return False
     
     
-    @staticmethod
-    def load_acct_from_file(filename: str) -> Acct:
+    @classmethod
+    def load_acct_from_file(self, filename: str, for_update=False) -> Acct:
         '''
-        Loads and constructs an account instance from files.
+        Loads and constructs an account instance from storage (by default, 
+        its .acct file), or from the account cache. An account that will be
+        saved must be loaded with for_update, inside a unit of work: a 
+        cached copy may be missing changes made by other processes.
         
         Parameters
         ----------
         filename : str
             The filename associated with an account. Default is username
+            
+        for_update : bool
+            Lock the account until the active unit of work ends, before
+            reading it. Use when the account will be changed. The cache is
+            skipped, so the change is made to the latest version.
+        '''
+        if for_update:
+            UnitOfWork.lock(('acct', filename))
+        
+        # An account changed in the current unit of work, not yet saved
+        pending = UnitOfWork.lookup(('acct', filename))
+        if pending != None:
+            return pending
+        
+        record = None if for_update else self.acct_cache.get(filename)
+        if record == None:
+            record = Storage.backend.load_acct(filename)
+            self.acct_cache.put(filename, record)
+        
+        return self.acct_from_record(record)
+    
+    
+    @classmethod
+    def load_accts(self, filenames, for_update=False) -> dict:
+        '''
+        Load many accounts with one storage call. Accounts that don't exist
+        are left out.
+        
+        Parameters
+        ----------
+        filenames : iterable [str]
+        
+        for_update : bool
+            Lock every account (all at once) until the active unit of work
+            ends, before reading them from storage (not the cache)
+        
+        Returns
+        -------
+        dict {str : Acct}
+            {filename: account}
+        '''
+        filenames = list(dict.fromkeys(filenames))
+        if for_update:
+            UnitOfWork.lock(*[('acct', filename) for filename in filenames])
+        
+        accounts = {}
+        for filename in filenames:
+            pending = UnitOfWork.lookup(('acct', filename))
+            if pending != None:
+                accounts[filename] = pending
+            elif not for_update:
+                record = self.acct_cache.get(filename)
+                if record != None:
+                    accounts[filename] = self.acct_from_record(record)
+        
+        records = Storage.backend.load_accts([filename for filename in filenames
+                                              if filename not in accounts])
+        for filename, record in records.items():
+            self.acct_cache.put(filename, record)
+            accounts[filename] = self.acct_from_record(record)
+        
+        return accounts
+    
+    
+    @staticmethod
+    def save_acct(c_account: Acct) -> None:
+        '''
+        Save an account now, or at the end of the active unit of work. A
+        plain text password is hashed first.
+        '''
+        if not PasswordHasher.is_hash(c_account.password):
+            c_account.password = PasswordHasher.hash(c_account.password)
+        UnitOfWork.save(c_account, ('acct', c_account.filename), 
+                        after=AccountManager._cache_acct)
+    
+    
+    @staticmethod
+    def _mark_stored(c_account: Acct) -> None:
+        # Runs once c_account is saved or loaded
+        c_account.stored = (c_account.username, c_account.password, 
+                            len(c_account.reservations))
+    
+    
+    @classmethod
+    def _cache_acct(self, c_account: Acct) -> None:
+        '''
+        Mark a just saved account as stored, and cache a copy of it
+        '''
+        self._mark_stored(c_account)
+        self.acct_cache.put(c_account.filename, 
+                            {'username': c_account.username,
+                             'password': c_account.password,
+                             'filename': c_account.filename,
+                             'reservations': list(c_account.reservations)})
+    
+    
+    @classmethod
+    def configure_cache(self, capacity=None, ttl=None) -> None:
         '''
-        #unpickle file
-        with open(f'accounts/{filename}.pickle', 'rb') as file:
-            c_account = pickle.load(file)
+        Change the account cache settings
+        
+        Parameters
+        ----------
+        capacity : None | int
+            Maximum number of accounts kept in memory. 0 disables the cache.
             
+        ttl : None | float
+            Seconds a cached account is used before it is read again
+        '''
+        if capacity != None:
+            self.acct_cache.resize(capacity)
+        
+        if ttl != None:
+            self.acct_cache.ttl = ttl
+    
+    
+    @classmethod
+    def invalidate_acct(self, filename=None) -> None:
+        '''
+        Drop an account from the cache so the next load reads storage. 
+        Drops every account if filename is None.
+        '''
+        self.acct_cache.invalidate(filename)
+    
+    
+    @classmethod
+    def acct_from_record(self, record: dict) -> Acct:
+        '''
+        Build an account from a record loaded by a storage backend
+        '''
+        c_account = Acct(record['username'], record['password'], record['filename'])
+        c_account.reservations = list(record['reservations'])
+        self._mark_stored(c_account)
         return c_account
+    
         
     @staticmethod
     def create_acct(username: str, password: str, filename=None) -> Acct:
@@ -159,11 +336,13 @@ class AccountManager():
         username : str
             The username of the account
         password : str
-            The password to log into the account
+            The password to log into the account. Only its hash is kept.
         filename : str (default None)
             The filename which points the account's save location
         '''
-        return Acct(username, password, filename)
+        c_account = Acct(username, password, filename)
+        AccountManager.save_acct(c_account)
+        return c_account
         
     
     @staticmethod
@@ -180,7 +359,7 @@ class AccountManager():
             The reservation to modify
         '''
         c_account.reservations.append(c_res.ID)
-        c_account.save()
+        AccountManager.save_acct(c_account)
         
         
     @staticmethod
@@ -192,15 +371,16 @@ class AccountManager():
         Parameters
         ----------
         c_account : Acct
-            The account we want to change the password for
+            The account we want to change the password for. It is 
+            rewritten whole, so load it with for_update.
         old_password : str
             The old password
         new_password : str
             The new password
         '''
-        if old_password == c_account.password:
-            c_account.password = new_password
-            c_account.save()
+        if AccountManager.check_password(c_account, old_password):
+            c_account.password = PasswordHasher.hash(new_password)
+            AccountManager.save_acct(c_account)
             return True
         
         else:
@@ -208,22 +388,55 @@ class AccountManager():
     
     
     @staticmethod
-    def smite_acct(filename=None) -> None:
+    def check_password(c_account: Acct, password: str) -> bool:
+        '''
+        Return True if password matches the account's. Hashing runs on
+        PasswordHasher's thread pool, which caps how many run at once.
+        '''
+        return PasswordHasher.verify_async(password, c_account.password).result()
+    
+    
+    @classmethod
+    def authenticate(self, username: str, password: str):
+        '''
+        Return the account if it exists and password matches, else None. A
+        password stored in plain text or hashed with other settings than
+        PasswordHasher's current ones is rehashed & saved.
+        '''
+        if not self.account_exists(username):
+            return None
+        
+        c_account = self.load_acct_from_file(username)
+        if not self.check_password(c_account, password):
+            return None
+        
+        if PasswordHasher.needs_rehash(c_account.password):
+            with UnitOfWork.begin():
+                old_hash = c_account.password
+                c_account = self.load_acct_from_file(username, for_update=True)
+                # Unless it was changed meanwhile
+                if c_account.password == old_hash:
+                    c_account.password = PasswordHasher.hash(password)
+                    self.save_acct(c_account)
+        
+        return c_account
+    
+    
+    @classmethod
+    def smite_acct(self, filename=None) -> None:
         '''
         Remove the files associated with username. **For testing only.
         '''
         
-        os.remove(f'./accounts/{filename}.txt')
-        os.remove(f'./accounts/{filename}.pickle')
+        Storage.backend.delete_acct(filename)
+        self.invalidate_acct(filename)
     
     @staticmethod
     def list_accounts_initialized() -> list:
         '''
         Return a list of the accounts that have been initialized
         '''
-        all_files = os.listdir('./accounts')
-        return \
-            [filename[:-4] for filename in all_files if filename[-4:] == '.txt']
+        return Storage.backend.list_accounts()
     
     @classmethod
     def unlist_reservations(self, filename: str) -> None:
@@ -232,9 +445,10 @@ class AccountManager():
         **for testing only
         '''
         # TODO verify by testing
-        c_account = self.load_acct_from_file(filename)
-        c_account.reservations = []
-        c_account.save()
+        with UnitOfWork.begin():
+            c_account = self.load_acct_from_file(filename, for_update=True)
+            c_account.reservations = []
+            AccountManager.save_acct(c_account)
 
     
     
@@ -1,6 +1,15 @@
+import argparse
+import json
+import sys
+import time
 from ReservationsAPI import ReservationsAPI
 from AccountModule import AccountManager
-from TimeUtilities import TimeRange
+from GarageModule import GarageManager
+from TimeUtilities import TimeRange, TimeTools
+from StorageModule import SQLiteStorage, Storage
+from MigrateStorage import StorageMigrator
+from PasswordModule import PasswordHasher
+from StatsUtilities import StatTools
 
 
 class AccountCommands():
@@ -21,6 +30,13 @@ class AccountCommands():
     view_account(username: str) -> str:
         Return a formatted string of an account's details or a failure string.
         
+    login(username: str, password: str) -> str:
+        Check an account's password, returning confirmation or failure.
+        
+    account_reservations(username, first_day, last_day, which) -> str:
+        Return a table of an account's reservations on some days, or a 
+        failure string.
+        
     create_account(username: str, password: str) -> str:
         Create an account. Returns a string giving the account details. 
         Or returns a string detailing why the command failed.
@@ -68,6 +84,22 @@ class AccountCommands():
                 out_string = 'Wrong number of arguments for this command.\n\n' \
                     'Try: "Try: "account view [username] [password]"'
             
+        elif user_command[1] == 'login':
+            if len(user_command) == 4:
+                out_string = self.login(user_command[2], user_command[3])
+                
+            else:
+                out_string = 'Wrong number of arguments for this command.\n\n' \
+                    'Try: "account login [username] [password]"'
+            
+        elif user_command[1] == 'reservations':
+            if 3 <= len(user_command) <= 6:
+                out_string = self.account_reservations(*user_command[2:])
+                
+            else:
+                out_string = 'Wrong number of arguments for this command.\n\n' \
+                    'Try: "account reservations [username] [first day] [last day] [active|cancelled|all]"'
+            
         elif user_command[1] == 'change' and user_command[2] == 'password':
             if len(user_command) == 6:
                 out_string = self.change_account_password\
@@ -103,6 +135,47 @@ class AccountCommands():
                 'To list the created accounts, use "account list"'
     
     
+    @staticmethod
+    def login(username: str, password: str) -> str:
+        '''
+        Check an account's password, returning confirmation or failure.
+        '''
+        if AccountManager.authenticate(username, password) == None:
+            return f'Error: incorrect username or password'
+        else:
+            return f'Logged in as {username}'
+    
+    
+    @staticmethod
+    def account_reservations(username: str, first_day='0', last_day='365', which='all') -> str:
+        '''
+        Return a table of the account's reservations from first_day to 
+        last_day: all of them, or only the 'active' or 'cancelled' ones.
+        '''
+        try:
+            first_day, last_day = int(first_day), int(last_day)
+            if not 0 <= first_day <= last_day <= 365:
+                return 'The days listed must be a range within 0-365.'
+        except ValueError:
+            return f'Error: days "{first_day}" to "{last_day}" could not be converted to integers.'
+        
+        filters = {'all': None, 'active': True, 'cancelled': False}
+        if which not in filters:
+            return f'Error: "{which}" should be one of active, cancelled or all.'
+        
+        if not AccountManager.account_exists(username):
+            return f'Account with username "{username}" could not be found\n\n'\
+                'To list the created accounts, use "account list"'
+        
+        reservations = ReservationsAPI.list_res_of_owner(username, first_day, last_day,
+                                                         filters[which])
+        rows = [f'{c_res.ID}\t{c_res.day}\t{c_res.tRange}\t{c_res.active}'
+                for c_res in reservations]
+        
+        return f'{len(rows)} reservations of {username} on days {first_day}-{last_day} ({which})\n\n'\
+            'ID\tDay\tTime\t\tActive\n' + '\n'.join(rows)
+    
+    
     @staticmethod
     def create_account(username: str, password: str) -> str:
         '''
@@ -146,8 +219,13 @@ class AccountCommands():
                 return f'Error: new password should be an alpha-numeric string'
         
         if AccountManager.account_exists(username):
-            c_acct = AccountManager.load_acct_from_file(username)
-            if AccountManager.try_change_password(c_acct, old_pass, new_pass):
+            # The whole account is rewritten, so change its latest version,
+            # locked (not a cached copy)
+            with ReservationsAPI.transaction():
+                c_acct = AccountManager.load_acct_from_file(username, for_update=True)
+                changed = AccountManager.try_change_password(c_acct, old_pass, new_pass)
+            
+            if changed:
                 return f'Password successfully changed!'
             else:
                 return f'Error: incorrect previous password'
@@ -284,13 +362,17 @@ class ReservationCommands():
             return f'Error: a TimeRange could not be created from {start_time} to {end_time}.\n\n'\
                 'The start and end times must be integers from 0-23 or 1-24, respectively.'
         
-        # Attempt to create the reservation
-        if ReservationsAPI.try_create_res(res_ID, username, day, tRange):
-            
-            c_acct = AccountManager.load_acct_from_file(username)
-            c_res = ReservationsAPI.get_res_from_file(res_ID)
-            AccountManager.add_reservation_to_acct(c_acct, c_res)
+        # Attempt to create the reservation & add it to the account, as one
+        # transaction
+        with ReservationsAPI.transaction():
+            created = ReservationsAPI.try_create_res(res_ID, username, day, tRange)
             
+            if created:
+                c_acct = AccountManager.load_acct_from_file(username, for_update=True)
+                c_res = ReservationsAPI.get_res_from_file(res_ID)
+                AccountManager.add_reservation_to_acct(c_acct, c_res)
+        
+        if created:
             return 'Successfully created the reservation! Details below.\n\n'\
                 f'{ReservationsAPI.get_res_from_file(res_ID)}\n'\
                 f'The availability on day {day} is now:\n\n'\
@@ -381,6 +463,13 @@ class DayCommands():
         
     view_day(day_ID: str) -> str
         Returns a formatted view of a Day's details, or a failure string
+        
+    find_free(hours: str, first_day: str, last_day: str) -> str
+        Returns the first times a reservation of that length could be made
+        
+    day_availability(first_day: str, last_day: str, hours: str) -> str
+        Returns a table of each day's free time, optionally only the days
+        with room for a reservation of that length
     
     '''
     @classmethod
@@ -412,6 +501,22 @@ class DayCommands():
             else:
                 out_string = 'Wrong number of arguments for this command.\n\n' \
                     'Try: "day view [day]"'
+        
+        elif user_command[1] == 'find':
+            if len(user_command) in range(3, 6):
+                out_string = self.find_free(*user_command[2:])
+                
+            else:
+                out_string = 'Wrong number of arguments for this command.\n\n' \
+                    'Try: "day find [hours] [first day] [last day]"'
+        
+        elif user_command[1] == 'availability':
+            if len(user_command) in range(2, 6):
+                out_string = self.day_availability(*user_command[2:])
+                
+            else:
+                out_string = 'Wrong number of arguments for this command.\n\n' \
+                    'Try: "day availability [first day] [last day] [hours]"'
                     
         else: 
             out_string = f'Command not found. Type "help" for more info'
@@ -435,6 +540,72 @@ class DayCommands():
         else:
             return f'Day with ID "{day_ID}" could not be found.\n\n'\
                 'To see days initialized, use "day list"'
+    
+    @staticmethod
+    def find_free(hours: str, first_day='0', last_day='365') -> str:
+        '''
+        Returns the first (up to 5) days & times where a reservation lasting
+        hours could be made, from first_day to last_day, or a failure string
+        '''
+        try:
+            duration = float(hours)
+            if not 0 < duration <= 24:
+                return 'The number of hours must be more than 0 and at most 24.'
+        except ValueError:
+            return f'Error: "{hours}" could not be converted to a number of hours.'
+        
+        try:
+            first_day, last_day = int(first_day), int(last_day)
+            if not 0 <= first_day <= last_day <= 365:
+                return 'The days searched must be a range within 0-365.'
+        except ValueError:
+            return f'Error: days "{first_day}" to "{last_day}" could not be converted to integers.'
+        
+        options = ReservationsAPI.find_available(duration, first_day, last_day)
+        if not options:
+            return f'No lift is free for {hours} hours between days {first_day} and {last_day}.'
+        
+        return 'Day\tStart\tEnd\tLift\n' + '\n'.join(
+            f'{day}\t{TimeTools.float_to_string(start)}\t'
+            f'{TimeTools.float_to_string(start + duration)}\t{lift}'
+            for day, start, lift in options)
+    
+    @staticmethod
+    def day_availability(first_day='0', last_day='365', hours=None) -> str:
+        '''
+        Returns a table of the free time on each saved day from first_day to
+        last_day: total free lift-hours, the longest time one lift is free &
+        the hours when every lift is booked. If hours is given, only days 
+        with room for a reservation that long are listed.
+        '''
+        try:
+            first_day, last_day = int(first_day), int(last_day)
+            if not 0 <= first_day <= last_day <= 365:
+                return 'The days searched must be a range within 0-365.'
+        except ValueError:
+            return f'Error: days "{first_day}" to "{last_day}" could not be converted to integers.'
+        
+        try:
+            duration = None if hours == None else float(hours)
+        except ValueError:
+            return f'Error: "{hours}" could not be converted to a number of hours.'
+        
+        saved = set(ReservationsAPI.list_days_initialized())
+        rows = []
+        n_empty = 0
+        
+        for day, summary in ReservationsAPI.list_availability(first_day, last_day):
+            if str(day) not in saved:
+                n_empty += 1
+            elif duration == None or summary.fits(duration):
+                full = [str(hour) for hour, free in enumerate(summary.free_slots) if free == 0]
+                rows.append(f'{day}\t{summary.free_hours():g}\t\t{summary.longest_hours():g}'
+                            f'\t\t{",".join(full) or "-"}')
+        
+        out_string = 'Day\tFree hours\tLongest free\tFully booked hours\n' + '\n'.join(rows)
+        if n_empty:
+            out_string += f'\n\n{n_empty} other days in this range have no reservations.'
+        return out_string
 
 
 class AdminUI():
@@ -450,6 +621,12 @@ class AdminUI():
         Relays user command to proper functions, and returns the response
         as a string
     
+    run_script(lines, output='text', stream=sys.stdout) -> dict
+        Run commands non-interactively, timing each. Returns a summary.
+        
+    format_timings(summary: dict) -> str
+        A table of a run_script summary's timings by command
+    
     get_ui_help() -> str:
         Returns a string of commands executable by user.
     
@@ -512,6 +689,95 @@ class AdminUI():
         else:
             return 'Command not found. Type "help" for more info'
     
+    @classmethod
+    def run_script(self, lines, output='text', stream=sys.stdout) -> dict:
+        '''
+        Run commands from lines (e.g. an open file, or sys.stdin) through
+        switch_user_command, split exactly as typed commands are. Blank 
+        lines & lines starting with '#' are skipped; 'quit' stops. A command
+        that raises is reported as an error, and the run goes on.
+        
+        Parameters
+        ----------
+        lines : iterable [str]
+        
+        output : str
+            'text': write each command's output, 'json': write one JSON 
+            object per command ({"line", "command", "seconds", "output" or
+            "error"}) and the summary as a last {"summary": ...} object,
+            'quiet': write nothing
+            
+        stream : file
+            Where output goes
+            
+        Returns
+        -------
+        dict
+            {'commands': int, 'errors': int, 'seconds': float, 'by_command':
+            {command: {'count', 'seconds', 'p50', 'p99', 'max'}}}, keyed by
+            the command's first two words (e.g. 'reservation create'), times
+            in seconds
+        '''
+        if output not in ('text', 'json', 'quiet'):
+            raise ValueError(f'output should be text, json or quiet, not "{output}"')
+        
+        timings = {}
+        n_errors = 0
+        start = time.perf_counter()
+        
+        for number, line in enumerate(lines, start=1):
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            
+            command = line.split(' ')
+            if command[0] == 'quit':
+                break
+            
+            result = {'line': number, 'command': line}
+            began = time.perf_counter()
+            try:
+                result['output'] = self.switch_user_command(command)
+            except Exception as error:
+                result['error'] = repr(error)
+                n_errors += 1
+            result['seconds'] = time.perf_counter() - began
+            timings.setdefault(' '.join(command[:2]), []).append(result['seconds'])
+            
+            if output == 'json':
+                stream.write(json.dumps(result) + '\n')
+            elif output == 'text':
+                stream.write(f"{result.get('output', 'Error: ' + result.get('error', ''))}\n\n")
+        
+        summary = {'commands': sum(len(times) for times in timings.values()),
+                   'errors': n_errors,
+                   'seconds': time.perf_counter() - start,
+                   'by_command': {name: {'count': len(times),
+                                         'seconds': sum(times),
+                                         'p50': StatTools.percentile(times, 50),
+                                         'p99': StatTools.percentile(times, 99),
+                                         'max': max(times)}
+                                  for name, times in sorted(timings.items())}}
+        if output == 'json':
+            stream.write(json.dumps({'summary': summary}) + '\n')
+        return summary
+    
+    
+    @staticmethod
+    def format_timings(summary: dict) -> str:
+        '''
+        Return a table of a run_script summary: count, total & percentile 
+        times of each command, then the totals
+        '''
+        lines = ['command              | count | total (ms) | p50 (ms) | p99 (ms) | max (ms)']
+        for name, t in summary['by_command'].items():
+            lines.append(f"{name:20s} | {t['count']:5d} | {t['seconds'] * 1e3:10.1f} | "
+                         f"{t['p50'] * 1e3:8.2f} | {t['p99'] * 1e3:8.2f} | {t['max'] * 1e3:8.2f}")
+        lines.append(f"{summary['commands']} commands ({summary['errors']} errors) in "
+                     f"{summary['seconds']:.2f} s")
+        return '\n'.join(lines)
+    
+    
     @classmethod
     def get_ui_help(self) -> str:
         '''
@@ -524,6 +790,10 @@ class AdminUI():
             '    Create a new account.\n\n'  \
             'account view [username]\n' \
             '    View the information of an account.\n\n'     \
+            'account login [username] [password]\n' \
+            '    Check an account\'s password.\n\n'     \
+            'account reservations [username] [first day] [last day] [active|cancelled|all]\n' \
+            '    List an account\'s reservations (days default to 0-365).\n\n'     \
             'account change password [username] [old password] [new password]\n' \
             '    Create a new account (will also overwrite).\n\n'    \
             'reservation create [username] [ID] [day] [start time] [end time]\n'     \
@@ -537,8 +807,63 @@ class AdminUI():
             'day list\n'     \
             '    List all of the initiated days.\n\n'    \
             'day view [day]\n'     \
-            '    View the timeslot data from a day'
+            '    View the timeslot data from a day\n\n'    \
+            'day availability [first day] [last day] [hours]\n'     \
+            '    Summarize the free time on each day (only days with room for\n' \
+            '    [hours], if given).\n\n'    \
+            'day find [hours] [first day] [last day]\n'     \
+            '    List the first free times for a reservation of that many hours\n' \
+            '    (days default to 0-365).'
 
 
 if __name__ == '__main__':
-    AdminUI.initiate_administrator_UI()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Car Lotter administrator UI')
+    parser.add_argument('--sqlite', metavar='PATH', 
+                        help='store data in this SQLite database instead of files')
+    parser.add_argument('--year', action='store_true',
+                        help='keep every day in one memory-mapped file, days/year.npy')
+    parser.add_argument('--journal', action='store_true',
+                        help='append changes to journal.log, and write the files on quit')
+    parser.add_argument('--repack', action='store_true',
+                        help='when a reservation fits no single lift, move others between '
+                        'lifts to make room')
+    parser.add_argument('--password-scheme', choices=PasswordHasher.SCHEMES,
+                        help=f'hash new passwords with this scheme (default {PasswordHasher.scheme})')
+    parser.add_argument('--password-cost', type=int, metavar='N',
+                        help='scrypt n (a power of 2) or PBKDF2 iterations of new password hashes')
+    parser.add_argument('--account-cache-ttl', type=float, metavar='SECONDS',
+                        help='reuse accounts read in this session for this long '
+                        f'(default {AccountManager.acct_cache.ttl:g}; 0 always re-reads)')
+    parser.add_argument('--script', metavar='FILE',
+                        help='run the commands in FILE ("-" for stdin) instead of prompting, '
+                        'then print timings to stderr')
+    parser.add_argument('--output', choices=('text', 'json', 'quiet'), default='text',
+                        help='with --script: print each output (default), one JSON object '
+                        'per command, or nothing')
+    args = parser.parse_args()
+    
+    GarageManager.repack_when_full = args.repack
+    AccountManager.configure_cache(ttl=args.account_cache_ttl)
+    try:
+        PasswordHasher.configure(scheme=args.password_scheme, cost=args.password_cost)
+    except ValueError as error:
+        parser.error(str(error))
+    
+    if args.sqlite:
+        ReservationsAPI.use_storage(SQLiteStorage(args.sqlite))
+    elif args.year:
+        ReservationsAPI.use_storage(StorageMigrator.open_backend('year:.'))
+    elif args.journal:
+        ReservationsAPI.use_storage(StorageMigrator.open_backend('journal:.'))
+    
+    if args.script:
+        try:
+            script = sys.stdin if args.script == '-' else open(args.script)
+        except OSError as error:
+            parser.error(f'Cannot read script: {error}')
+        with script:
+            summary = AdminUI.run_script(script, args.output)
+        print(AdminUI.format_timings(summary), file=sys.stderr)
+    else:
+        AdminUI.initiate_administrator_UI()
+    Storage.backend.close()
\ No newline at end of file
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Per-day summaries of free time, so searches & overviews of many days don't
+need to load each Day.
+
+@author: tanne
+"""
+import math
+import threading
+import numpy as np
+
+
+class DayAvailability():
+    '''
+    Summary of a day's free time. Day keeps its summary up to date as
+    reservations are written & removed (only the lift that changed is
+    re-summarized), and storage saves it alongside the day.
+
+    Attributes
+    ----------
+    n_lifts : int
+
+    slots_per_hour : int
+
+    free_runs : list [list [(int, int)]]
+        Every lift's maximal runs of free slots, as [start, end) pairs
+
+    longest : list [int]
+        Length of each lift's longest free run, in slots
+
+    free_slots : list [int]
+        Number of free slots (over every lift) in each hour of the day.
+        n_lifts * slots_per_hour when nothing is booked in that hour.
+
+    Methods
+    -------
+    @classmethod
+    from_grid(grid: SlotGrid) -> DayAvailability
+        Summarize a whole occupancy grid
+
+    @classmethod
+    empty(n_lifts, slots_per_hour) -> DayAvailability
+        Summary of a day without reservations
+
+    update_lift(grid, lift) -> None
+        Re-summarize one lift of grid, after it changed
+
+    longest_hours() -> float
+        The longest time any single lift is free
+
+    free_hours() -> float
+        Free time summed over every lift
+
+    fits(duration) -> bool
+        Is some lift free for duration hours in a row?
+
+    earliest_starts(duration, earliest, latest) -> list [(float, int)]
+        The earliest start (in hours) within each free run where duration
+        fits inside [earliest, latest], with its lift
+
+    copy() -> DayAvailability
+
+    to_record() -> dict
+    @classmethod
+    from_record(record: dict) -> DayAvailability
+        Convert to & from plain (JSON-able) records, for storage
+    '''
+
+    def __init__(self, slots_per_hour: int, free_runs: list, longest=None, free_slots=None):
+        '''
+        Parameters
+        ----------
+        slots_per_hour : int
+
+        free_runs : list [list [(int, int)]]
+            Kept, not copied
+
+        longest, free_slots : list [int], optional
+            Computed from free_runs if not given
+        '''
+        self.n_lifts = len(free_runs)
+        self.slots_per_hour = slots_per_hour
+        self.free_runs = free_runs
+
+        if longest == None:
+            longest = [max((e - s for s, e in runs), default=0) for runs in self.free_runs]
+        self.longest = list(longest)
+
+        if free_slots == None:
+            free_slots = sum((self._hour_counts(runs) for runs in self.free_runs),
+                             np.zeros(24, dtype=int)).tolist()
+        self.free_slots = list(free_slots)
+
+
+    @classmethod
+    def from_grid(self, grid):
+        '''
+        Summarize every lift of an occupancy grid (SlotGrid or BitGrid)
+        '''
+        free = grid.free().astype(np.int8)
+
+        # +1 where a run of free slots starts, -1 just past where it ends
+        padded = np.zeros((grid.n_lifts, grid.n_slots + 2), dtype=np.int8)
+        padded[:, 1:-1] = free
+        edges = np.diff(padded, axis=1)
+        lifts, starts = np.nonzero(edges == 1)
+        ends = np.nonzero(edges == -1)[1]
+
+        # nonzero goes lift by lift, so each lift's runs are one slice
+        pairs = list(zip(starts.tolist(), ends.tolist()))
+        bounds = np.searchsorted(lifts, np.arange(grid.n_lifts + 1)).tolist()
+        runs = [pairs[bounds[lift]:bounds[lift + 1]] for lift in range(grid.n_lifts)]
+
+        longest = np.zeros(grid.n_lifts, dtype=int)
+        np.maximum.at(longest, lifts, ends - starts)
+        free_slots = free.reshape(grid.n_lifts, 24, -1).sum(axis=(0, 2)).tolist()
+        return self(grid.n_slots // 24, runs, longest.tolist(), free_slots)
+
+
+    @classmethod
+    def empty(self, n_lifts: int, slots_per_hour: int):
+        '''
+        Summary of a day with n_lifts lifts & nothing booked
+        '''
+        return self(slots_per_hour, [[(0, 24 * slots_per_hour)] for lift in range(n_lifts)])
+
+
+    def _hour_counts(self, runs: list) -> np.ndarray:
+        # Free slots in each hour covered by runs
+        free = np.zeros(24 * self.slots_per_hour, dtype=int)
+        for s, e in runs:
+            free[s:e] = 1
+        return free.reshape(24, -1).sum(axis=1)
+
+
+    def update_lift(self, grid, lift: int) -> None:
+        '''
+        Re-summarize one lift of grid, after reservations in it changed.
+        O(slots in a day).
+        '''
+        free = np.zeros(grid.n_slots + 2, dtype=np.int8)
+        free[1:-1] = grid.slots[lift] == grid.FREE
+        edges = np.diff(free)
+        runs = list(zip(np.nonzero(edges == 1)[0].tolist(),
+                        np.nonzero(edges == -1)[0].tolist()))
+
+        free_slots = np.array(self.free_slots) - self._hour_counts(self.free_runs[lift])
+        self.free_slots = (free_slots + self._hour_counts(runs)).tolist()
+        self.free_runs[lift] = runs
+        self.longest[lift] = max((e - s for s, e in runs), default=0)
+
+
+    def longest_hours(self) -> float:
+        '''
+        Return the longest time (hours) that any single lift is free
+        '''
+        return max(self.longest, default=0) / self.slots_per_hour
+
+
+    def free_hours(self) -> float:
+        '''
+        Return the free time (hours) summed over every lift
+        '''
+        return sum(self.free_slots) / self.slots_per_hour
+
+
+    def fits(self, duration: float) -> bool:
+        '''
+        Return True if some lift is free for duration hours in a row
+        '''
+        # The tolerance absorbs float error, as in Day.slot_range
+        return max(self.longest, default=0) >= math.ceil(duration * self.slots_per_hour - 1e-9)
+
+
+    def earliest_starts(self, duration: float, earliest=0, latest=24) -> list:
+        '''
+        Return the earliest start within each free run where duration hours
+        fit, starting no earlier than earliest and ending by latest (hours).
+        Starts shared by several lifts are listed once, with the first lift.
+
+        Returns
+        -------
+        list [(float, int)]
+            (start hour, lift), sorted by start
+        '''
+        need = math.ceil(duration * self.slots_per_hour - 1e-9)
+        first = math.ceil(earliest * self.slots_per_hour - 1e-9)
+        last = math.floor(latest * self.slots_per_hour + 1e-9)
+
+        options = {}
+        for lift, runs in enumerate(self.free_runs):
+            if self.longest[lift] < need:
+                continue
+            for s, e in runs:
+                start = max(s, first)
+                if min(e, last) - start >= need:
+                    options.setdefault(start, lift)
+
+        return [(start / self.slots_per_hour, options[start]) for start in sorted(options)]
+
+
+    def copy(self):
+        '''
+        Return an independent copy of the summary
+        '''
+        return DayAvailability(self.slots_per_hour, [list(runs) for runs in self.free_runs],
+                               self.longest, self.free_slots)
+
+
+    def to_record(self) -> dict:
+        '''
+        Return the summary as a dict of lists & ints, for storage
+        '''
+        return {'slots_per_hour': self.slots_per_hour,
+                'free_runs': [[list(run) for run in runs] for runs in self.free_runs],
+                'longest': self.longest,
+                'free_slots': self.free_slots}
+
+
+    @classmethod
+    def from_record(self, record: dict):
+        '''
+        Build a summary from a record made by to_record
+        '''
+        free_runs = [[tuple(run) for run in runs] for runs in record['free_runs']]
+        return self(record['slots_per_hour'], free_runs,
+                    record.get('longest'), record.get('free_slots'))
+
+
+class AvailabilityIndex():
+    '''
+    The availability summaries of days read or saved so far, each stamped
+    with the day's version in storage (see day_stamp), like GarageManager's
+    day cache. Safe to share between threads.
+
+    Attributes
+    ----------
+    summaries : dict {str : (object, DayAvailability)}
+        {filename: (stamp, summary)}
+
+    Methods
+    -------
+    update(filename, stamp, summary) -> None
+        Store a copy of a day's summary as of stamp
+
+    get(filename) -> (stamp, DayAvailability) | None
+
+    invalidate(filename=None) -> None
+        Forget one day's summary, or all of them
+    '''
+
+    def __init__(self):
+        self.summaries = {}
+        self._lock = threading.Lock()
+
+
+    def update(self, filename, stamp, summary: DayAvailability) -> None:
+        '''
+        Store a copy of summary (so later, uncommitted changes to the day
+        don't show), valid while the day's stamp in storage is stamp
+        '''
+        entry = (stamp, summary.copy())
+        with self._lock:
+            self.summaries[str(filename)] = entry
+
+
+    def get(self, filename):
+        '''
+        Return (stamp, summary) for a day, or None
+        '''
+        return self.summaries.get(str(filename))
+
+
+    def invalidate(self, filename=None) -> None:
+        '''
+        Forget a day's summary. Forgets every day if filename is None.
+        '''
+        with self._lock:
+            if filename == None:
+                self.summaries.clear()
+            else:
+                self.summaries.pop(str(filename), None)
@@ -0,0 +1,1194 @@
+# -*- coding: utf-8 -*-
+"""
+Timing scripts for the garage engine. Each benchmark runs inside a scratch
+directory, so the real days/, reservations/ and accounts/ folders are never
+touched. Correctness is checked by the tests (python -m pytest tests), which
+reuse the random workloads & reference implementations here.
+
+Usage: python Benchmarks.py [benchmark name ...]
+
+@author: tanne
+"""
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from AccountModule import AccountManager
+from AdminUI import AccountCommands, AdminUI, ReservationCommands
+from AvailabilityModule import DayAvailability
+from GarageModule import Day, GarageManager
+from IndexModule import OwnerIndex
+from LoadGenerator import LoadGenerator
+from MigrateStorage import StorageMigrator
+from OccupancyModule import BitGrid, SlotGrid
+from PasswordModule import PasswordHasher
+from ReservationsModule import Res, ResManager
+from ResFormatModule import ResFormat
+from ReservationsAPI import ReservationsAPI
+from ReservationServer import ReservationServer
+from StatsUtilities import StatTools
+from StorageModule import FileStorage, JournalStorage, Storage, YearStorage
+from TimeUtilities import TimeRange
+
+
+BACKENDS = {'files': 'files:.', 'sqlite': 'sqlite:bench.db'}
+
+
+@contextlib.contextmanager
+def scratch_workspace():
+    '''
+    Run the enclosed code inside a temporary directory that has empty days/,
+    reservations/ and accounts/ folders.
+    '''
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for folder in ('days', 'reservations', 'accounts'):
+            os.mkdir(os.path.join(tmp_dir, folder))
+        os.chdir(tmp_dir)
+        try:
+            yield tmp_dir
+        finally:
+            os.chdir(old_dir)
+
+
+@contextlib.contextmanager
+def scratch_backend(backend):
+    '''
+    Run the enclosed code inside a scratch_workspace, with ReservationsAPI
+    using backend: a storage spec (see StorageMigrator.open_backend) or a
+    function returning the backend. The backend in use at the end is
+    closed, and the previous one restored.
+    '''
+    old_backend = Storage.backend
+    with scratch_workspace():
+        ReservationsAPI.use_storage(StorageMigrator.open_backend(backend)
+                                    if isinstance(backend, str) else backend())
+        try:
+            yield Storage.backend
+        finally:
+            Storage.backend.close()
+            ReservationsAPI.use_storage(old_backend)
+
+
+def time_call(func, repeats: int) -> float:
+    '''
+    Return the mean wall time of func() over repeats calls, in microseconds
+    '''
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def random_day(n_lifts: int, seed=0, fill_ratio=0.5, slots_per_hour=1) -> Day:
+    '''
+    Build a Day whose lifts are roughly fill_ratio full of random
+    reservations (up to 8 hours long). The Day is filled directly through
+    its grid (then its res_locs & availability summary rebuilt) & not saved.
+    '''
+    rng = np.random.default_rng(seed)
+    c_day = Day(seed, n_lifts, slots_per_hour=slots_per_hour)
+    n_slots = c_day.grid.n_slots
+    n = 0
+
+    for lift in range(n_lifts):
+        while c_day.grid.free()[lift].mean() > 1 - fill_ratio:
+            s = int(rng.integers(0, n_slots - 1))
+            e = int(rng.integers(s + 1, min(s + 8 * slots_per_hour, n_slots) + 1))
+            if c_day.grid.free()[lift, s:e].all():
+                c_day.grid.fill(lift, s, e, f'r{n}')
+                n += 1
+
+    c_day.rebuild_res_locs()
+    c_day.availability = DayAvailability.from_grid(c_day.grid)
+    return c_day
+
+
+def copy_grid(grid: SlotGrid) -> SlotGrid:
+    '''
+    Return an independent copy of grid, so destructive ops can be repeated
+    '''
+    return SlotGrid(grid.n_lifts, slots=grid.slots.copy(), ids=grid.ids)
+
+
+# ---------------------------------------------------------------------------
+# Reference implementations (object-dtype grid, as Day used to store it)
+# ---------------------------------------------------------------------------
+
+def legacy_find_best_lift(reservedSlots: np.ndarray, tRange: TimeRange) -> int:
+    '''
+    Day.findBestLift as written for the object-dtype reservedSlots array
+    '''
+    s = int(tRange.start)
+    e = int(tRange.end)
+    res_times = np.arange(s, e)
+    b_lift = -1
+    min_score = sys.maxsize
+
+    for k in range(reservedSlots.shape[0]):
+        opens = np.where(reservedSlots[k] == None)[0]
+
+        if np.all(np.isin(res_times, opens)):
+            i = s
+            j = e-1
+            while reservedSlots[k, i] == None and i > 0:
+                i -= 1
+            while reservedSlots[k, j] == None and j < 23:
+                j += 1
+
+            d1 = s - i
+            d2 = j - e
+            score = (d1 - (d1**2)/48 )  + (d2 - (d2**2)/48 )
+
+            if score < min_score:
+                min_score = score
+                b_lift = k
+
+    return b_lift
+
+
+def loop_find_best_lift(free: np.ndarray, tRange: TimeRange) -> int:
+    '''
+    The per-lift findBestLift loop, run on a boolean free-slot mask
+    '''
+    s = int(tRange.start)
+    e = int(tRange.end)
+    b_lift = -1
+    min_score = sys.maxsize
+
+    for k in range(free.shape[0]):
+        if free[k, s:e].all():
+            i = s
+            j = e-1
+            while free[k, i] and i > 0:
+                i -= 1
+            while free[k, j] and j < 23:
+                j += 1
+
+            d1 = s - i
+            d2 = j - e
+            score = (d1 - (d1**2)/48 )  + (d2 - (d2**2)/48 )
+
+            if score < min_score:
+                min_score = score
+                b_lift = k
+
+    return b_lift
+
+
+def legacy_remove_res(reservedSlots: np.ndarray, ID: str) -> None:
+    '''
+    Day.remove_res as written for the object-dtype reservedSlots array
+    '''
+    reservedSlots[reservedSlots == ID] = None
+
+
+def legacy_find_lift(reservedSlots: np.ndarray, ID: str) -> int:
+    '''
+    Day.findLift as written for the object-dtype reservedSlots array
+    '''
+    return np.where(reservedSlots == ID)[0][0]
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+def bench_occupancy_grid(lift_counts=(2, 16, 64, 256), repeats=200) -> None:
+    '''
+    Compare the object-dtype grid with SlotGrid for findBestLift, findLift
+    and remove_res on days with many lifts.
+    '''
+    tRange = TimeRange(start=10, end=12)
+    print('lifts | op            | object (us) | int32 (us) | speedup')
+
+    with scratch_workspace():
+        for n_lifts in lift_counts:
+            c_day = random_day(n_lifts)
+            id_array = c_day.reservedSlots
+            ID = c_day.grid.ids[max(c_day.grid.ids)]
+
+            pairs = {
+                'findBestLift': (
+                    lambda: legacy_find_best_lift(id_array, tRange),
+                    lambda: c_day.findBestLift(tRange)),
+                'findLift': (
+                    lambda: legacy_find_lift(id_array, ID),
+                    lambda: c_day.grid.find(ID)),
+                'remove_res': (
+                    lambda: legacy_remove_res(id_array.copy(), ID),
+                    lambda: copy_grid(c_day.grid).clear(ID)),
+            }
+
+            for op, (old, new) in pairs.items():
+                t_old = time_call(old, repeats)
+                t_new = time_call(new, repeats)
+                print(f'{n_lifts:5d} | {op:13s} | {t_old:11.1f} | '
+                      f'{t_new:10.1f} | {t_old / t_new:6.1f}x')
+
+
+def bench_best_lift(lift_counts=(2, 16, 64, 256, 1024), repeats=200) -> None:
+    '''
+    Compare the batched findBestLift with the per-lift loop
+    '''
+    tRange = TimeRange(start=10, end=12)
+    print('lifts | loop (us) | batched (us) | speedup')
+
+    with scratch_workspace():
+        for n_lifts in lift_counts:
+            c_day = random_day(n_lifts)
+            free = c_day.grid.free()
+            t_old = time_call(lambda: loop_find_best_lift(free, tRange), repeats)
+            t_new = time_call(lambda: c_day.findBestLift(tRange), repeats)
+            print(f'{n_lifts:5d} | {t_old:9.1f} | {t_new:12.1f} | '
+                  f'{t_old / t_new:6.1f}x')
+
+
+def count_day_io(func, *args) -> dict:
+    '''
+    Run func(*args) and return how many day loads & writes it performed
+    '''
+    before = dict(Day.io_counts)
+    func(*args)
+    return {k: Day.io_counts[k] - before[k] for k in before}
+
+
+def bench_disk_io(capacities=(0, 64)) -> None:
+    '''
+    Report the day loads & writes performed by each ReservationsAPI call,
+    with the GarageManager day cache disabled (0) and enabled.
+    '''
+    old_capacity = GarageManager.day_cache.capacity
+
+    for capacity in capacities:
+        GarageManager.configure_cache(capacity=capacity)
+        GarageManager.invalidate_day()
+        GarageManager.day_cache.reset_stats()
+
+        with scratch_workspace():
+            calls = [
+                ('try_create_res', ReservationsAPI.try_create_res,
+                 'aa', 'bob', 1, TimeRange(start=3, end=6)),
+                ('try_create_res', ReservationsAPI.try_create_res,
+                 'bb', 'bob', 1, TimeRange(start=8, end=10)),
+                ('try_if_available', ReservationsAPI.try_if_available,
+                 1, TimeRange(start=4, end=9)),
+                ('findLift', ReservationsAPI.findLift, 'aa'),
+                ('get_day_from_file', ReservationsAPI.get_day_from_file, 1),
+                ('try_modify_res (same day)', ReservationsAPI.try_modify_res,
+                 'aa', 1, TimeRange(start=2, end=7)),
+                ('try_modify_res (new day)', ReservationsAPI.try_modify_res,
+                 'aa', 2, TimeRange(start=2, end=7)),
+                ('cancel_res', ReservationsAPI.cancel_res, 'bb'),
+            ]
+            print(f'day cache capacity {capacity}')
+            print('call                       | day loads | day writes')
+            for name, func, *args in calls:
+                counts = count_day_io(func, *args)
+                print(f'{name:26s} | {counts["loads"]:9d} | {counts["writes"]:10d}')
+
+        print(f'cache stats: {GarageManager.day_cache.stats}')
+        print()
+
+    GarageManager.configure_cache(capacity=old_capacity)
+    GarageManager.invalidate_day()
+
+
+def bench_directory_index(file_counts=(100, 1000, 10000, 50000), repeats=50) -> None:
+    '''
+    Compare os.listdir membership checks with ResManager.res_index lookups
+    '''
+    print('files | listdir (us) | index (us) | speedup')
+
+    for n_files in file_counts:
+        with scratch_workspace():
+            for i in range(n_files):
+                open(f'reservations/r{i}.txt', 'w').close()
+
+            Storage.backend.res_index.refresh(force=True)
+            ID = f'r{n_files // 2}'
+            t_old = time_call(lambda: f'{ID}.txt' in os.listdir('./reservations'),
+                              repeats)
+            t_new = time_call(lambda: ReservationsAPI.res_exists(ID), repeats)
+            print(f'{n_files:5d} | {t_old:12.1f} | {t_new:10.1f} | '
+                  f'{t_old / t_new:6.1f}x')
+
+
+def bench_storage(n_res=2000, n_owners=50) -> None:
+    '''
+    Time creating, modifying & querying reservations with the file and
+    SQLite storage backends
+    '''
+    print('backend | create (ms) | modify (ms) | owner query (ms)')
+
+    for name, spec in BACKENDS.items():
+        with scratch_backend(spec):
+            rng = np.random.default_rng(0)
+            requests = []
+            for i in range(n_res):
+                s = int(rng.integers(0, 20))
+                requests.append((f'r{i}', f'owner{i % n_owners}',
+                                 int(rng.integers(1, 366)),
+                                 TimeRange(start=s, end=s + int(rng.integers(1, 5)))))
+
+            created = []
+            start = time.perf_counter()
+            for ID, owner, day, tRange in requests:
+                if ReservationsAPI.try_create_res(ID, owner, day, tRange):
+                    created.append((ID, day, tRange))
+            t_create = (time.perf_counter() - start) / n_res * 1e3
+
+            to_modify = created[:len(created) // 4]
+            start = time.perf_counter()
+            for ID, day, tRange in to_modify:
+                ReservationsAPI.try_modify_res(ID, day % 365 + 1, tRange)
+            t_modify = (time.perf_counter() - start) / len(to_modify) * 1e3
+
+            t_query = time_call(lambda: ReservationsAPI.list_res_of_owner('owner7'), 5) / 1e3
+            print(f'{name:7s} | {t_create:11.3f} | {t_modify:11.3f} | {t_query:16.2f}')
+
+
+def random_requests(n: int, days: list, seed=0, prefix='r') -> list:
+    '''
+    Return n booking requests (ID, owner, day, start, end) spread over days
+    '''
+    rng = np.random.default_rng(seed)
+    requests = []
+    for i in range(n):
+        s = int(rng.integers(0, 22))
+        e = min(24, s + int(rng.integers(1, 5)))
+        requests.append((f'{prefix}{i}', f'owner{i % 50}', int(rng.choice(days)), s, e))
+    return requests
+
+
+def book_all(requests: list) -> list:
+    '''
+    Try each (ID, owner, day, start, end) request. Returns the IDs booked.
+    '''
+    return [ID for ID, owner, day, s, e in requests
+            if ReservationsAPI.try_create_res(ID, owner, day, TimeRange(start=s, end=e))]
+
+
+def book_in_process(spec: str, requests: list) -> list:
+    '''
+    book_all, in a worker process with its own connection to the backend
+    '''
+    ReservationsAPI.use_storage(StorageMigrator.open_backend(spec))
+    return book_all(requests)
+
+
+def run_concurrently(spec: str, chunks: list, processes=False) -> tuple:
+    '''
+    Book each chunk of requests in its own thread (or process). Returns the
+    booked IDs and the elapsed seconds.
+    '''
+    start = time.perf_counter()
+    if processes:
+        with multiprocessing.Pool(len(chunks)) as pool:
+            results = pool.starmap(book_in_process, [(spec, chunk) for chunk in chunks])
+    else:
+        with ThreadPoolExecutor(len(chunks)) as pool:
+            results = list(pool.map(book_all, chunks))
+    seconds = time.perf_counter() - start
+
+    return [ID for IDs in results for ID in IDs], seconds
+
+
+def bench_concurrency(per_worker=500, worker_counts=(1, 2, 4, 8)) -> None:
+    '''
+    Book thousands of reservations from many threads / processes at once,
+    per_worker requests each. 'shared' runs send every worker at the same
+    8 days, so most requests collide; 'own days' runs give each worker its
+    own 40 days, to measure how throughput scales.
+    '''
+    print('backend | mode      | workers | days     | requests | booked | req/s')
+
+    for name, spec in BACKENDS.items():
+        for kind in ('threads', 'processes'):
+            for days in ('shared', 'own days'):
+                for n_workers in worker_counts:
+                    with scratch_backend(spec):
+                        chunks = []
+                        for w in range(n_workers):
+                            pool = list(range(1, 9)) if days == 'shared' \
+                                else list(range(1 + 40 * w, 41 + 40 * w))
+                            chunks.append(random_requests(per_worker, pool, seed=w,
+                                                          prefix=f'w{w}r'))
+
+                        booked, seconds = run_concurrently(spec, chunks, kind == 'processes')
+                        n_requests = sum(len(chunk) for chunk in chunks)
+                        print(f'{name:7s} | {kind:9s} | {n_workers:7d} | {days:8s} | '
+                              f'{n_requests:8d} | {len(booked):6d} | '
+                              f'{n_requests / seconds:6.0f}')
+
+
+def bench_bulk(n_requests=5000, n_days=100) -> None:
+    '''
+    Compare creating reservations one try_create_res call at a time with a
+    single try_create_many call
+    '''
+    requests = [(ID, owner, day, TimeRange(start=s, end=e)) for ID, owner, day, s, e
+                in random_requests(n_requests, list(range(1, n_days + 1)))]
+    print('backend | method          | total (s) | per request (us) | day writes | booked')
+
+    for name, spec in BACKENDS.items():
+        for method in ('try_create_res', 'try_create_many'):
+            with scratch_backend(spec):
+                writes = Day.io_counts['writes']
+
+                start = time.perf_counter()
+                if method == 'try_create_res':
+                    created = [ReservationsAPI.try_create_res(*request) for request in requests]
+                else:
+                    created = ReservationsAPI.try_create_many(requests)
+                seconds = time.perf_counter() - start
+
+                print(f'{name:7s} | {method:15s} | {seconds:9.2f} | '
+                      f'{seconds / n_requests * 1e6:16.0f} | '
+                      f'{Day.io_counts["writes"] - writes:10d} | {sum(created)}')
+
+
+def random_res_stream(n: int, seed=0) -> list:
+    '''
+    Return n random 1-4 hour reservations on day 1
+    '''
+    rng = np.random.default_rng(seed)
+    stream = []
+    for i in range(n):
+        s = int(rng.integers(0, 23))
+        e = min(24, s + int(rng.integers(1, 5)))
+        stream.append(Res(f'r{i}', 'bench', 1, TimeRange(start=s, end=e)))
+    return stream
+
+
+def bench_repack(lift_counts=(8, 32, 128)) -> None:
+    '''
+    Book a stream of random requests (4x a day's capacity in hours) into an
+    empty day, once with the online placement only and once re-packing the
+    day when a request fits no lift. Reports bookings accepted and the time
+    per repack.
+    '''
+    print('lifts | requests | booked (online) | booked (repack) | repacks | check (us) | repack (us)')
+
+    for n_lifts in lift_counts:
+        stream = random_res_stream(n_lifts * 24 * 4 // 2, seed=n_lifts)
+        booked = {}
+        t_check = []
+        t_repack = []
+
+        for repack in (False, True):
+            c_day = Day(1, n_lifts)
+            booked[repack] = 0
+            for c_res in stream:
+                if c_day.findBestLift(c_res.tRange) != -1:
+                    c_day.write_res(c_res)
+                    booked[repack] += 1
+                    continue
+                if not repack:
+                    continue
+
+                start = time.perf_counter()
+                fits = c_day.fits_after_repack(c_res.tRange)
+                t_check.append(time.perf_counter() - start)
+                if fits:
+                    start = time.perf_counter()
+                    c_day.repack_res(c_res)
+                    t_repack.append(time.perf_counter() - start)
+                    booked[repack] += 1
+
+        print(f'{n_lifts:5d} | {len(stream):8d} | {booked[False]:15d} | {booked[True]:15d} | '
+              f'{len(t_repack):7d} | {np.mean(t_check) * 1e6:10.1f} | '
+              f'{np.mean(t_repack) * 1e6:11.1f}')
+
+
+def bench_resolution(lift_counts=(2, 16, 64), resolutions=(1, 4, 12), repeats=200) -> None:
+    '''
+    Time the day engine & its persistence at hourly, 15 minute and 5 minute
+    slots, on half-full days
+    '''
+    print('lifts | slots/hour | reservations | findBestLift (us) | write+remove (us) | '
+          'save (us) | load (us) | grid (KB)')
+
+    for n_lifts in lift_counts:
+        for slots_per_hour in resolutions:
+            c_day = random_day(n_lifts, seed=1, fill_ratio=0.5, slots_per_hour=slots_per_hour)
+            c_res = Res('zz', 'bench', c_day.day, TimeRange(start=9.25, end=11))
+
+            t_best = time_call(lambda: c_day.findBestLift(c_res.tRange), repeats)
+
+            def write_remove():
+                try:
+                    c_day.write_res(c_res)
+                except ValueError:
+                    pass
+                c_day.remove_res(c_res)
+            t_write = time_call(write_remove, repeats)
+
+            with scratch_workspace():
+                backend = FileStorage()
+                t_save = time_call(lambda: backend.save_day(c_day), 20)
+                t_load = time_call(lambda: GarageManager.day_from_record(
+                    backend.load_day(c_day.filename)), 20)
+
+            print(f'{n_lifts:5d} | {slots_per_hour:10d} | {len(c_day.grid.handles):12d} | '
+                  f'{t_best:17.1f} | {t_write:17.1f} | {t_save:9.0f} | {t_load:9.0f} | '
+                  f'{c_day.grid.slots.nbytes / 1024:9.1f}')
+
+
+def bench_bit_grid(lift_counts=(2, 8, 16, 64, 256), resolutions=(1, 12), repeats=500) -> None:
+    '''
+    Compare best_lift on the NumPy grid (SlotGrid) and on lift bitmasks
+    (BitGrid), on half-full days
+    '''
+    print('lifts | slots/hour | SlotGrid (us) | BitGrid (us) | speedup')
+
+    for n_lifts in lift_counts:
+        for slots_per_hour in resolutions:
+            c_day = random_day(n_lifts, seed=3, slots_per_hour=slots_per_hour)
+            bits = BitGrid(n_lifts, slots=c_day.grid.slots, ids=c_day.grid.ids)
+            s, e = 9 * slots_per_hour, 11 * slots_per_hour
+
+            t_numpy = time_call(lambda: c_day.grid.best_lift(s, e), repeats)
+            t_bits = time_call(lambda: bits.best_lift(s, e), repeats)
+            print(f'{n_lifts:5d} | {slots_per_hour:10d} | {t_numpy:13.1f} | {t_bits:12.1f} | '
+                  f'{t_numpy / t_bits:6.1f}x')
+
+
+def naive_find_free(duration: int, n=5) -> list:
+    '''
+    Find the first n (day, start hour) where duration hours are free by
+    asking try_if_available about every whole-hour start on every day
+    '''
+    options = []
+    for day in range(366):
+        for start in range(24 - duration + 1):
+            if ReservationsAPI.try_if_available(day, TimeRange(start=start, end=start + duration)):
+                options.append((day, start))
+                if len(options) == n:
+                    return options
+    return options
+
+
+def bench_search(lift_counts=(2, 16), n_free_days=5, duration=6) -> None:
+    '''
+    Time a search for the first free 6 hours over a year where every saved
+    day only has 4 free hours per lift, so every day is scanned. Compares
+    probing each day with try_if_available, find_available reading every
+    day's saved summary (cold), and with every summary already held (warm).
+    '''
+    print('lifts | naive probe (ms) | find, cold (ms) | find, warm (ms) | day loads (cold / warm)')
+
+    for n_lifts in lift_counts:
+        old_lifts = GarageManager.default_num_lifts
+        GarageManager.default_num_lifts = n_lifts
+
+        with scratch_backend('files:.'):
+            for day in range(366 - n_free_days):
+                c_day = Day(day, n_lifts)
+                for lift in range(n_lifts):
+                    c_day.write_res(Res(f'r{lift}', 'bench', day, TimeRange(start=0, end=20)))
+                c_day.save()
+
+            start = time.perf_counter()
+            naive_find_free(duration)
+            t_naive = time.perf_counter() - start
+
+            GarageManager.invalidate_day()
+            start = time.perf_counter()
+            cold_loads = count_day_io(ReservationsAPI.find_available, duration)['loads']
+            t_cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            warm_loads = count_day_io(ReservationsAPI.find_available, duration)['loads']
+            t_warm = time.perf_counter() - start
+
+        GarageManager.default_num_lifts = old_lifts
+        print(f'{n_lifts:5d} | {t_naive * 1e3:16.1f} | {t_cold * 1e3:15.1f} | '
+              f'{t_warm * 1e3:15.1f} | {cold_loads} / {warm_loads}')
+
+
+def bench_availability(n_lifts=16, fill_ratio=0.7) -> None:
+    '''
+    Time a year-wide availability view (ReservationsAPI.list_availability)
+    of 366 saved days: summarizing each day after loading it, reading the
+    summaries saved with the days (cold) & from the availability index
+    (warm), with each storage backend
+    '''
+    print('backend | load every day (ms) | summaries, cold (ms) | summaries, warm (ms)')
+
+    for name, spec in BACKENDS.items():
+        with scratch_backend(spec) as backend:
+            with backend.transaction():
+                for day in range(366):
+                    c_day = random_day(n_lifts, seed=day, fill_ratio=fill_ratio)
+                    backend.save_day(c_day)
+
+            def load_every_day():
+                GarageManager.invalidate_day()
+                return [(day, GarageManager.load_day(day).availability) for day in range(366)]
+
+            def cold():
+                GarageManager.invalidate_day()
+                return ReservationsAPI.list_availability()
+
+            t_load = time_call(load_every_day, 3) / 1e3
+            t_cold = time_call(cold, 3) / 1e3
+            t_warm = time_call(ReservationsAPI.list_availability, 3) / 1e3
+            print(f'{name:7s} | {t_load:19.1f} | {t_cold:20.1f} | {t_warm:20.1f}')
+
+
+def bench_res_locs(lift_counts=(2, 16, 64, 256), slots_per_hour=12, repeats=500) -> None:
+    '''
+    Compare finding & removing a reservation by searching the grid with
+    looking its span up in Day.res_locs, on half-full 5 minute days
+    '''
+    print('lifts | op         | grid search (us) | res_locs (us) | speedup')
+
+    for n_lifts in lift_counts:
+        c_day = random_day(n_lifts, seed=5, slots_per_hour=slots_per_hour)
+        ID = c_day.grid.ids[max(c_day.grid.ids)]
+        c_res = Res(ID, 'bench', c_day.day, TimeRange(start=0, end=1))
+        span = c_day.res_locs[ID]
+
+        def clear_fill(span):
+            c_day.grid.clear(ID, span)
+            c_day.grid.fill(*c_day.res_locs[ID], ID)
+
+        pairs = {
+            'findLift': (lambda: c_day.grid.find(ID), lambda: c_day.findLift(c_res)),
+            'clear+fill': (lambda: clear_fill(None), lambda: clear_fill(span)),
+        }
+
+        for op, (old, new) in pairs.items():
+            t_old = time_call(old, repeats)
+            t_new = time_call(new, repeats)
+            print(f'{n_lifts:5d} | {op:10s} | {t_old:16.1f} | {t_new:13.1f} | '
+                  f'{t_old / t_new:6.1f}x')
+
+
+def bench_day_format(lift_counts=(2, 16, 64, 256), resolutions=(1, 12), repeats=50) -> None:
+    '''
+    Compare saving & loading (into a Day) half-full days in the text format
+    (str(day) + .npy) and the binary format (DayFormat), and their sizes
+    '''
+    print('lifts | slots/hour | save text (us) | save binary (us) | '
+          'load text (us) | load binary (us) | text (KB) | binary (KB)')
+
+    for n_lifts in lift_counts:
+        for slots_per_hour in resolutions:
+            c_day = random_day(n_lifts, seed=6, slots_per_hour=slots_per_hour)
+            times = {}
+            sizes = {}
+
+            with scratch_workspace():
+                for binary in (False, True):
+                    backend = FileStorage(binary_days=binary)
+                    load = lambda: GarageManager.day_from_record(backend.load_day(c_day.filename))
+                    times['save', binary] = time_call(lambda: backend.save_day(c_day), repeats)
+                    times['load', binary] = time_call(load, repeats)
+                    sizes[binary] = sum(os.path.getsize(os.path.join('days', name))
+                                        for name in os.listdir('days')
+                                        if not name.endswith('.json')) / 1024
+
+            print(f'{n_lifts:5d} | {slots_per_hour:10d} | {times["save", False]:14.0f} | '
+                  f'{times["save", True]:16.0f} | {times["load", False]:14.0f} | '
+                  f'{times["load", True]:16.0f} | {sizes[False]:9.1f} | {sizes[True]:11.1f}')
+
+
+def bench_year(n_lifts=16, slots_per_hour=4, repeats=3) -> None:
+    '''
+    Compare a file per day (FileStorage) with one memory-mapped year 
+    (YearStorage), on a year of half-full days: opening the backend and 
+    summarizing every day's free time (cold), loading every day, and saving
+    one day
+    '''
+    old_lifts = GarageManager.default_num_lifts
+    GarageManager.default_num_lifts = n_lifts
+    days = [random_day(n_lifts, seed=day, slots_per_hour=slots_per_hour) for day in range(366)]
+    for day, c_day in enumerate(days):
+        c_day.day, c_day.filename = day, str(day)
+    print('backend | open + year availability (ms) | load every day (ms) | save day (us)')
+
+    for name in ('files', 'year'):
+        def open_backend():
+            if name == 'files':
+                return FileStorage()
+            return YearStorage(n_lifts=n_lifts, slots_per_hour=slots_per_hour)
+
+        with scratch_backend(open_backend) as backend:
+            with backend.transaction():
+                for c_day in days:
+                    backend.save_day(c_day)
+
+            def year_availability():
+                ReservationsAPI.use_storage(open_backend())
+                return ReservationsAPI.list_availability()
+
+            def load_every_day():
+                GarageManager.invalidate_day()
+                return [GarageManager.load_day(day) for day in range(366)]
+
+            t_open = time_call(year_availability, repeats) / 1e3
+            t_load = time_call(load_every_day, repeats) / 1e3
+            t_save = time_call(lambda: Storage.backend.save_day(days[0]), 20 * repeats)
+            print(f'{name:7s} | {t_open:29.1f} | {t_load:19.1f} | {t_save:13.0f}')
+
+    GarageManager.default_num_lifts = old_lifts
+
+
+def legacy_parse_res(text: str) -> dict:
+    '''
+    The original FileStorage.load_res parser (lowercases the ID & owner)
+    '''
+    lines = text.split('\n')
+
+    for i in range(len(lines)):
+        lines[i] = lines[i].split(':')
+        for j in range(len(lines[i])):
+            lines[i][j] = lines[i][j].strip().lower()
+
+    constructor = {'id': str,
+             'day': int,
+             'times': TimeRange,
+             'owner': str,
+             'active': lambda value: value == 'true'}
+
+    record = {}
+    for line in lines:
+        key = line[0]
+        record[key] = constructor[key](line[1])
+
+    tRange = record.pop('times')
+    record['start'] = tRange.start
+    record['end'] = tRange.end
+    record['ID'] = record.pop('id')
+
+    return record
+
+
+def legacy_load_res(filename: str) -> dict:
+    '''
+    The original FileStorage.load_res
+    '''
+    with open(f'reservations/{filename}.txt'.lower()) as file:
+        return legacy_parse_res(file.read())
+
+
+def bench_res_format(n_res=100000) -> None:
+    '''
+    Time loading n_res reservations (file -> Res) with the original text
+    parser, with ResFormat reading the same text files, and with ResFormat
+    reading its own records, plus parsing alone (from bytes in memory)
+    '''
+    rng = np.random.default_rng(7)
+    reservations = []
+    for i in range(n_res):
+        s = float(rng.integers(0, 20))
+        reservations.append(Res(f'Res{i}X', f'Owner{i % 97}', int(rng.integers(0, 366)),
+                                TimeRange(start=s, end=s + 2.5), active=bool(i % 3)))
+    expected = [(r.ID, r.owner, r.day, r.start, r.end, r.active) for r in reservations]
+    filenames = [r.filename.lower() for r in reservations]
+    print('reader                 | load all (s) | per res (us) | parse only (us)')
+
+    def report(name, load, parse, blobs):
+        start = time.perf_counter()
+        loaded = [ResManager.res_from_record(load(filename)) for filename in filenames]
+        t_load = time.perf_counter() - start
+        t_parse = time_call(lambda: [parse(blob) for blob in blobs], 1) / n_res
+        print(f'{name:22s} | {t_load:12.2f} | {t_load / n_res * 1e6:12.1f} | {t_parse:15.2f}')
+        return [(r.ID, r.owner, r.day, r.start, r.end, r.active) for r in loaded]
+
+    with scratch_workspace():
+        for c_res in reservations:
+            with open(f'reservations/{c_res.filename.lower()}.txt', 'w') as file:
+                file.write(c_res.toString())
+        backend = FileStorage()
+        text_blobs = [c_res.toString().encode() for c_res in reservations]
+
+        legacy = report('original (text)', legacy_load_res,
+                        lambda blob: legacy_parse_res(blob.decode()), text_blobs)
+        report('ResFormat (text)', backend.load_res,
+                      lambda blob: ResFormat.decode(blob, ''), text_blobs)
+
+        with backend.transaction():
+            for c_res in reservations:
+                backend.save_res(c_res)
+        json_blobs = [ResFormat.encode(c_res) for c_res in reservations]
+        report('ResFormat (record)', backend.load_res,
+                         lambda blob: ResFormat.decode(blob, ''), json_blobs)
+        backend.close()
+
+    wrong = sum(a != b for a, b in zip(legacy, expected))
+    print(f'original parser changed {wrong} of {n_res} reservations (lowercased ID/owner)')
+
+
+def bench_journal(n_requests=2000, n_days=50) -> None:
+    '''
+    Time booking reservations one try_create_res call at a time with the
+    file storage (with & without fsync) and the journal storage at several
+    fsync batch sizes. For the journal, also time replaying it on startup
+    (after closing it without compacting, as a crash would) and compacting
+    it.
+    '''
+    requests = [(ID, owner, day, TimeRange(start=s, end=e)) for ID, owner, day, s, e
+                in random_requests(n_requests, list(range(1, n_days + 1)))]
+    configs = [('files', lambda: FileStorage()),
+               ('files, fsync', lambda: FileStorage(fsync=True)),
+               ('journal, sync 1', lambda: JournalStorage(sync_every=1)),
+               ('journal, sync 32', lambda: JournalStorage(sync_every=32)),
+               ('journal, no sync', lambda: JournalStorage(sync_every=0))]
+    print('backend          | per request (us) | journal (KB) | replay (ms) | compact (ms)')
+
+    for name, open_backend in configs:
+        with scratch_backend(open_backend):
+            start = time.perf_counter()
+            for request in requests:
+                ReservationsAPI.try_create_res(*request)
+            t_request = (time.perf_counter() - start) / n_requests * 1e6
+
+            line = f'{name:16s} | {t_request:16.0f}'
+            if isinstance(Storage.backend, JournalStorage):
+                Storage.backend.journal.close()
+                start = time.perf_counter()
+                ReservationsAPI.use_storage(open_backend())
+                t_replay = (time.perf_counter() - start) * 1e3
+                size = Storage.backend.journal.size / 1024
+                start = time.perf_counter()
+                Storage.backend.compact()
+                t_compact = (time.perf_counter() - start) * 1e3
+                line += f' | {size:12.0f} | {t_replay:11.1f} | {t_compact:12.1f}'
+            print(line)
+
+
+def bench_owner_index(n_res=1000000, n_owners=10000, n_files=20000, repeats=200) -> None:
+    '''
+    Time "owner X's active reservations on days 100-120" with the owner
+    index: on n_res reservation records in memory (building the index, 
+    querying it, against scanning every record), then on n_files saved 
+    reservations (against FileStorage.list_res_of_owner, which reads every
+    file, with 50 owners)
+    '''
+    rng = np.random.default_rng(9)
+    owners = rng.integers(0, n_owners, n_res).tolist()
+    days = rng.integers(0, 366, n_res).tolist()
+    active = (rng.random(n_res) < 0.9).tolist()
+    records = [(f'r{i}', {'owner': f'owner{owners[i]}', 'day': days[i], 'active': active[i]})
+               for i in range(n_res)]
+    owner = 'owner7'
+
+    def scan():
+        return sorted((record['day'], filename) for filename, record in records
+                      if record['owner'] == owner and 100 <= record['day'] <= 120
+                      and record['active'])
+
+    index = OwnerIndex()
+    start = time.perf_counter()
+    index.build(records)
+    t_build = time.perf_counter() - start
+    t_scan = time_call(scan, 3)
+    t_query = time_call(lambda: index.query(owner, 100, 120, True), repeats)
+    t_update = time_call(lambda: index.update('r0', *records[0][1].values()), repeats)
+    print(f'{n_res} records, {n_owners} owners: build {t_build:.2f} s | scan {t_scan / 1e3:.1f} ms'
+          f' | query {t_query:.1f} us | update {t_update:.1f} us')
+
+    with scratch_backend('files:.'):
+        with Storage.backend.transaction():
+            # Fewer owners, so the owner queried has a few dozen matches
+            for i, (filename, record) in enumerate(records[:n_files]):
+                Storage.backend.save_res(Res(filename, f'owner{i % 50}', record['day'],
+                                             TimeRange(start=1, end=2), record['active']))
+
+        def read_all():
+            return sorted(record['ID'] for record in Storage.backend.list_res_of_owner(owner)
+                          if 100 <= record['day'] <= 120 and record['active'])
+
+        def indexed():
+            return sorted(c_res.ID for c_res in ReservationsAPI.list_res_of_owner(owner, 100, 120, True))
+
+        t_read_all = time_call(read_all, 1)
+        start = time.perf_counter()
+        found = indexed()
+        t_first = time.perf_counter() - start
+        t_indexed = time_call(indexed, repeats)
+        print(f'{n_files} files: read every file {t_read_all / 1e3:.0f} ms | first indexed query '
+              f'(builds) {t_first * 1e3:.0f} ms | indexed {t_indexed:.0f} us ({len(found)} found)')
+
+
+@contextlib.contextmanager
+def password_settings(**settings):
+    '''
+    Use other PasswordHasher settings inside the block (e.g, a cheap cost,
+    for benchmarks that create many accounts)
+    '''
+    old = {'scheme': PasswordHasher.scheme, 'cost': PasswordHasher.cost}
+    PasswordHasher.configure(**settings)
+    try:
+        yield
+    finally:
+        PasswordHasher.configure(**old)
+
+
+def legacy_save_acct(backend: FileStorage, c_account) -> None:
+    '''
+    The original FileStorage.save_acct: pickle the account & write a text
+    copy
+    '''
+    filename = c_account.filename
+    backend._write(os.path.join(backend.root, 'accounts', f'{filename}.pickle'),
+                   pickle.dumps(c_account))
+    backend._write(os.path.join(backend.root, 'accounts', f'{filename}.txt'),
+                   str(c_account).encode())
+
+
+def bench_account_store(sizes=(10, 1000, 10000), n_adds=200, n_accounts=2000) -> None:
+    '''
+    Time adding a reservation to an account that already has n of them
+    (pickle + text rewrite vs appending to the .acct file), and loading it
+    back. Then time loading n_accounts accounts one by one and in one 
+    batch (load_accts), with the file & SQLite backends.
+    '''
+    print('reservations | add, pickle (us) | add, append (us) | load, pickle (us) | '
+          'load, .acct (us)')
+
+    for size in sizes:
+        with scratch_backend('files:.') as backend, \
+                password_settings(scheme='pbkdf2_sha256', cost=1):
+            c_account = AccountManager.create_acct('bob', 'pw')
+            c_account.reservations = [f'r{i}' for i in range(size)]
+            AccountManager.save_acct(c_account)
+            IDs = iter(f'n{i}' for i in range(2 * n_adds))
+
+            def add_legacy():
+                c_account.reservations.append(next(IDs))
+                legacy_save_acct(backend, c_account)
+
+            def add():
+                c_account.reservations.append(next(IDs))
+                AccountManager.save_acct(c_account)
+
+            t_add_legacy = time_call(add_legacy, n_adds)
+            t_add = time_call(add, n_adds)
+            t_load_legacy = time_call(lambda: backend._load_pickled_acct('bob'), 20)
+            # From storage, not the account cache
+            t_load = time_call(lambda: AccountManager.acct_from_record(backend.load_acct('bob')), 20)
+
+        print(f'{size:12d} | {t_add_legacy:16.0f} | {t_add:16.0f} | {t_load_legacy:17.0f} | '
+              f'{t_load:16.0f}')
+
+    print()
+    print('backend | one by one (ms) | load_accts (ms)')
+    usernames = [f'user{i}' for i in range(n_accounts)]
+    for name, spec in BACKENDS.items():
+        with scratch_backend(spec), password_settings(scheme='pbkdf2_sha256', cost=1):
+            with ReservationsAPI.transaction():
+                for username in usernames:
+                    c_account = AccountManager.create_acct(username, 'pw')
+                    c_account.reservations = [f'{username}r{i}' for i in range(5)]
+
+            t_single = time_call(lambda: [AccountManager.load_acct_from_file(username)
+                                          for username in usernames], 3) / 1e3
+            t_batch = time_call(lambda: AccountManager.load_accts(usernames), 3) / 1e3
+            print(f'{name:7s} | {t_single:15.1f} | {t_batch:15.1f}')
+
+
+def bench_passwords(settings=(('scrypt', 2 ** 12), ('scrypt', 2 ** 14), ('scrypt', 2 ** 15),
+                              ('pbkdf2_sha256', 100000), ('pbkdf2_sha256', 600000)),
+                    n_logins=8) -> None:
+    '''
+    Logins per second at each password scheme & cost: checking a hash for
+    the first time, again (from the verification cache), and n_logins
+    first-time checks at once on PasswordHasher's thread pool. Also times
+    a cached AccountManager.authenticate on the file storage, which loads
+    the account too.
+    '''
+    print(f'pool workers: {PasswordHasher.workers}')
+    print('scheme        |    cost | first (/s) | cached (/s) | pool (/s) | authenticate (/s)')
+    for scheme, cost in settings:
+        with password_settings(scheme=scheme, cost=cost):
+            stored = PasswordHasher.hash('hunter2')
+
+            def first():
+                PasswordHasher.clear_cache()
+                PasswordHasher.verify('hunter2', stored)
+
+            t_first = time_call(first, 3)
+            t_cached = time_call(lambda: PasswordHasher.verify('hunter2', stored), 1000)
+
+            hashes = [PasswordHasher.hash('hunter2') for _ in range(n_logins)]
+            start = time.perf_counter()
+            futures = [PasswordHasher.verify_async('hunter2', hashed) for hashed in hashes]
+            for future in futures:
+                future.result()
+            t_pool = (time.perf_counter() - start) / n_logins * 1e6
+
+            with scratch_backend('files:.'):
+                AccountManager.create_acct('bob', 'hunter2')
+                t_auth = time_call(lambda: AccountManager.authenticate('bob', 'hunter2'), 200)
+
+        print(f'{scheme:13s} | {cost:7d} | {1e6 / t_first:10.1f} | {1e6 / t_cached:11.0f} | '
+              f'{1e6 / t_pool:9.1f} | {1e6 / t_auth:17.0f}')
+
+
+def bench_account_cache(n_accounts=20, rounds=5) -> None:
+    '''
+    Run bursts of admin commands for each account (view, list its
+    reservations, log in, book, view again), with & without the account
+    cache, and count how often storage was asked for an account
+    '''
+    print('backend | cache | read command (us) | booking (us) | account reads | exists checks')
+    for name, spec in BACKENDS.items():
+        for capacity in (0, 256):
+            with scratch_backend(spec) as backend, \
+                    password_settings(scheme='pbkdf2_sha256', cost=1):
+                AccountManager.configure_cache(capacity=capacity)
+                usernames = [f'user{i}' for i in range(n_accounts)]
+                for username in usernames:
+                    AccountManager.create_acct(username, 'pw')
+                AccountManager.invalidate_acct()
+
+                counts = {'load_acct': 0, 'account_exists': 0}
+                for method in counts:
+                    def counted(*args, method=method, func=getattr(backend, method)):
+                        counts[method] += 1
+                        return func(*args)
+                    setattr(backend, method, counted)
+
+                IDs = iter(f'{i:02x}' for i in range(256))
+                t_read = t_book = 0
+                for r in range(rounds):
+                    for i, username in enumerate(usernames):
+                        start = time.perf_counter()
+                        AccountCommands.view_account(username)
+                        AccountCommands.account_reservations(username, '0', '10')
+                        AccountCommands.login(username, 'pw')
+                        t_read += time.perf_counter() - start
+
+                        start = time.perf_counter()
+                        ReservationCommands.create_reservation(
+                            username, next(IDs), str(r), str(i), str(i + 1))
+                        t_book += time.perf_counter() - start
+
+                        start = time.perf_counter()
+                        AccountCommands.view_account(username)
+                        t_read += time.perf_counter() - start
+
+                t_read /= rounds * n_accounts * 4 / 1e6
+                t_book /= rounds * n_accounts / 1e6
+
+            print(f'{name:7s} | {capacity:5d} | {t_read:17.0f} | {t_book:12.0f} | '
+                  f'{counts["load_acct"]:13d} | {counts["account_exists"]:13d}')
+
+    AccountManager.configure_cache(capacity=256)
+
+
+def bench_server(client_counts=(1, 8, 32), day_counts=(1, 60), requests=100) -> None:
+    '''
+    Run a ReservationServer & LoadGenerator (default mix) on one event
+    loop, with more & more clients, booking either one day (every change
+    waits for the same day) or 60 days. Reports latency percentiles &
+    throughput.
+    '''
+    print('backend | clients | days | requests | p50 (ms) | p99 (ms) | req/s')
+
+    async def run(n_clients, n_days):
+        server = ReservationServer(port=0, workers=8)
+        await server.start()
+        try:
+            generator = LoadGenerator(port=server.port, clients=n_clients, requests=requests,
+                                      days=n_days)
+            return await generator.run()
+        finally:
+            await server.close()
+
+    for name, spec in BACKENDS.items():
+        for n_days in day_counts:
+            for n_clients in client_counts:
+                with scratch_backend(spec):
+                    latencies, _, seconds = asyncio.run(run(n_clients, n_days))
+
+                every = [latency for values in latencies.values() for latency in values]
+                print(f'{name:7s} | {n_clients:7d} | {n_days:4d} | {len(every):8d} | '
+                      f'{StatTools.percentile(every, 50) * 1e3:8.2f} | '
+                      f'{StatTools.percentile(every, 99) * 1e3:8.2f} | '
+                      f'{len(every) / seconds:5.0f}')
+
+
+def admin_script(n_accounts=20, n_reservations=500, seed=0) -> list:
+    '''
+    Return a repeatable admin command script: create accounts, then book,
+    view, move & cancel reservations, with day & account views between
+    '''
+    # The admin UI takes 2 character IDs: up to 36 ** 2 reservations
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    rng = np.random.default_rng(seed)
+    lines = [f'account create user{i} pw{i}' for i in range(n_accounts)]
+    for i in range(n_reservations):
+        username = f'user{rng.integers(n_accounts)}'
+        ID = digits[i // 36 % 36] + digits[i % 36]
+        day, start = rng.integers(1, 31), rng.integers(0, 22)
+        lines += [f'reservation create {username} {ID} {day} {start} {start + 2}',
+                  f'reservation view {ID}',
+                  f'account view {username}']
+        if i % 7 == 0:
+            lines.append(f'reservation modify time {ID} {day % 30 + 1} {start} {start + 1}')
+        if i % 25 == 0:
+            lines.append(f'reservation cancel {ID}')
+        if i % 10 == 0:
+            lines += [f'day view {day}', f'account reservations {username} 0 30 active',
+                      f'account login {username} pw{username[4:]}']
+    return lines
+
+
+def bench_admin_script(n_accounts=20, n_reservations=500) -> None:
+    '''
+    Replay admin_script through AdminUI.run_script (output off) on the
+    file & SQLite backends, and print its per-command timings
+    '''
+    script = admin_script(n_accounts, n_reservations)
+    for name, spec in BACKENDS.items():
+        with scratch_backend(spec), password_settings(scheme='pbkdf2_sha256', cost=1000):
+            summary = AdminUI.run_script(script, output='quiet')
+
+        print(f'-- {name} --')
+        print(AdminUI.format_timings(summary))
+
+
+BENCHMARKS = {
+    'occupancy': bench_occupancy_grid,
+    'bestlift': bench_best_lift,
+    'diskio': bench_disk_io,
+    'index': bench_directory_index,
+    'storage': bench_storage,
+    'concurrency': bench_concurrency,
+    'bulk': bench_bulk,
+    'repack': bench_repack,
+    'resolution': bench_resolution,
+    'bitgrid': bench_bit_grid,
+    'search': bench_search,
+    'availability': bench_availability,
+    'reslocs': bench_res_locs,
+    'dayformat': bench_day_format,
+    'year': bench_year,
+    'resformat': bench_res_format,
+    'journal': bench_journal,
+    'owners': bench_owner_index,
+    'accounts': bench_account_store,
+    'passwords': bench_passwords,
+    'account-cache': bench_account_cache,
+    'server': bench_server,
+    'admin-script': bench_admin_script,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f'== {name} ==')
+        BENCHMARKS[name]()
+        print()
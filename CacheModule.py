@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+In-process caches shared by the managers.
+
+@author: tanne
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache():
+    '''
+    A bounded mapping that evicts the least recently used entry once full.
+    Safe to share between threads.
+
+    Attributes
+    ----------
+    capacity : int
+        Maximum number of entries kept. 0 disables caching.
+
+    stats : dict {str : int}
+        Running totals of 'hits', 'misses' and 'evictions'
+
+    Methods
+    -------
+    get(key) -> object | None
+        Return the cached value (marking it recently used), or None
+
+    put(key, value) -> None
+        Insert / replace a value, evicting the oldest entry if full
+
+    invalidate(key=None) -> None
+        Drop one key, or every key if key is None
+
+    resize(capacity) -> None
+        Change the capacity, evicting entries if needed
+    '''
+
+    def __init__(self, capacity=64):
+        '''
+        Parameters
+        ----------
+        capacity : int, optional
+            Maximum number of entries kept. 0 disables caching.
+        '''
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+
+    def get(self, key):
+        '''
+        Return the value cached for key, or None. Counts a hit or a miss.
+        '''
+        with self._lock:
+            if key not in self._entries:
+                self.stats['misses'] += 1
+                return None
+
+            self.stats['hits'] += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+
+    def put(self, key, value) -> None:
+        '''
+        Insert or replace the value for key. Evicts the least recently used
+        entries if the cache is over capacity.
+        '''
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+
+    def invalidate(self, key=None) -> None:
+        '''
+        Drop key from the cache. Drops everything if key is None.
+        '''
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+    def resize(self, capacity: int) -> None:
+        '''
+        Change the capacity, evicting the oldest entries if needed
+        '''
+        with self._lock:
+            self.capacity = capacity
+            self._evict()
+
+
+    def reset_stats(self) -> None:
+        '''
+        Set hit, miss & eviction counts back to 0
+        '''
+        for key in self.stats:
+            self.stats[key] = 0
+
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+
+class TTLCache(LRUCache):
+    '''
+    An LRUCache whose entries also expire ttl seconds after they were put,
+    for data that other processes may change without telling us. An
+    expired entry is dropped and counts as a miss (and an 'expirations' in
+    stats).
+
+    Attributes
+    ----------
+    ttl : float | None
+        Seconds an entry stays valid. None never expires entries.
+
+    clock : callable () -> float
+        Time source, time.monotonic by default
+    '''
+
+    def __init__(self, capacity=64, ttl=60.0, clock=time.monotonic):
+        '''
+        Parameters
+        ----------
+        capacity : int, optional
+            Maximum number of entries kept. 0 disables caching.
+
+        ttl : float | None, optional
+            Seconds an entry stays valid. None never expires entries.
+
+        clock : callable, optional
+            Time source
+        '''
+        super().__init__(capacity)
+        self.ttl = ttl
+        self.clock = clock
+        self.stats['expirations'] = 0
+
+
+    def get(self, key):
+        '''
+        Return the value cached for key, or None if it is missing or has
+        expired. Counts a hit or a miss.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry != None and entry[1] != None and self.clock() >= entry[1]:
+                del self._entries[key]
+                self.stats['expirations'] += 1
+                entry = None
+
+            if entry == None:
+                self.stats['misses'] += 1
+                return None
+
+            self.stats['hits'] += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+
+    def put(self, key, value) -> None:
+        '''
+        Insert or replace the value for key, valid for ttl seconds from now
+        '''
+        expires = None if self.ttl == None else self.clock() + self.ttl
+        super().put(key, (value, expires))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary encoding of a Day, read back without parsing text or
+unpickling.
+
+@author: tanne
+"""
+import struct
+import numpy as np
+
+
+class DayFormat():
+    '''
+    Static class for the binary day format. All numbers are little-endian.
+
+        header  magic b'CDAY', version (uint16), flags (uint16), day,
+                n_lifts, slots_per_hour, n_ids, ID bytes (int32 each)
+        grid    int32 [n_lifts x 24*slots_per_hour] handles (0 = free)
+        handles int32 [n_ids]
+        spans   int32 [n_ids x 3] (lift, start slot, end slot) of each handle
+        IDs     n_ids UTF-8 strings joined by '\\n'
+
+    The arrays are read with np.frombuffer straight from the file's bytes,
+    so decoding costs no copies. The grid is read-only unless data is a
+    bytearray; SlotGrid copies it on the first change.
+
+    Methods
+    -------
+    encode(c_day: Day) -> bytes
+
+    decode(data: bytes | bytearray, filename) -> dict
+        The day record (see StorageModule)
+    '''
+
+    MAGIC = b'CDAY'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHiiiii')
+    INT = np.dtype('<i4')
+
+    @classmethod
+    def encode(self, c_day) -> bytes:
+        '''
+        Return c_day (grid, handle table & res_locs) as bytes
+        '''
+        grid = c_day.grid
+        handles = sorted(grid.ids)
+        IDs = '\n'.join(grid.ids[h] for h in handles).encode()
+        spans = [c_day.res_locs[grid.ids[h]] for h in handles]
+
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, 0, int(c_day.day), grid.n_lifts,
+                                  grid.n_slots // 24, len(handles), len(IDs))
+
+        return b''.join([header,
+                         grid.slots.astype(self.INT, copy=False).tobytes(),
+                         np.array(handles, dtype=self.INT).tobytes(),
+                         np.array(spans, dtype=self.INT).reshape(-1, 3).tobytes(),
+                         IDs])
+
+
+    @classmethod
+    def decode(self, data, filename) -> dict:
+        '''
+        Turn bytes made by encode back into a day record. Raises ValueError
+        if data is not a day in this format.
+        '''
+        magic, version, flags, day, n_lifts, slots_per_hour, n_ids, n_bytes = \
+            self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version > self.VERSION:
+            raise ValueError(f'Day "{filename}" is not in a known binary format')
+
+        n_slots = 24 * slots_per_hour
+        offset = self.HEADER.size
+        slots = np.frombuffer(data, self.INT, n_lifts * n_slots, offset).reshape(n_lifts, n_slots)
+        offset += slots.nbytes
+        handles = np.frombuffer(data, self.INT, n_ids, offset).tolist()
+        offset += 4 * n_ids
+        spans = np.frombuffer(data, self.INT, 3 * n_ids, offset).reshape(-1, 3).tolist()
+        offset += 12 * n_ids
+        IDs = bytes(data[offset:offset + n_bytes]).decode().split('\n') if n_ids else []
+
+        return {'day': day,
+                'n_lifts': n_lifts,
+                'slots': slots,
+                'ids': dict(zip(handles, IDs)),
+                'res_locs': {ID: tuple(span) for ID, span in zip(IDs, spans)},
+                'filename': str(filename)}
+
@@ -4,12 +4,18 @@ Created on Fri Jun 24 17:27:21 2022
 
 @author: tanne
 """
-import ast
 from ReservationsModule import Res
 from TimeUtilities import TimeRange
+from OccupancyModule import SlotGrid, BitGrid
+from PackingModule import LiftPacker
+from CacheModule import LRUCache
+from AvailabilityModule import AvailabilityIndex, DayAvailability
+from StorageModule import Storage
+from TransactionModule import UnitOfWork
+from TimeUtilities import TimeTools
 import numpy as np
+import math
 import sys
-import os
 
 
 class Day():
@@ -19,6 +25,9 @@ class Day():
     days_initiated : list [int]
         list of filenames of days that have already been initiated & saved
     
+    io_counts : dict {str : int}
+        Running totals of day 'loads' and 'writes' (one per day file)
+    
     Instance Attributes
     ----------
     day_ID : Int
@@ -27,36 +36,76 @@ class Day():
     n_lifts : Int
         Number of lifts (depth of ReservedSlots array)
         
-    ReservedSlots : npArray (num_lifts x 24) # Optional
-        All times slots in a day. 
+    ReservedSlots : npArray (num_lifts x 24*slots_per_hour) # Optional
+        All times slots in a day, as reservation IDs (None if free). 
         - First axis is lift #
-        - Second axis is start hour
+        - Second axis is start slot (the start hour, if hourly)
+        Read-only view of grid, kept for compatibility.
+        
+    slots_per_hour : int
+        Time resolution of the grid, e.g. 4 for 15 minute slots
+        
+    grid : SlotGrid | BitGrid
+        Integer-coded occupancy grid backing ReservedSlots
         
-    res_locs : dict {str : int} # Optional
-        A dictionary mapping reservation IDs to lift number
+    res_locs : dict {str : (int, int, int)}
+        Maps each reservation ID in the day to its (lift, start slot, end 
+        slot), so reservations are found & removed without searching the
+        grid. Rebuilt from the grid if it doesn't match it.
+        
+    availability : DayAvailability
+        Summary of the day's free time, built from the grid on first use.
+        Then updated by write_res, remove_res & repack_res, and saved with 
+        the day.
+        
+    dirty : bool
+        True if the Day has changed since it was last saved / loaded
         
     Methods
     -------
     remove_res(self, c_res) -> None 
-        Removes all entries of a Res from ReservedSlots
+        Removes all entries of a Res from ReservedSlots. Marks dirty
         
-    write_res(self, c_res) -> None
-        Inserts Res ID into appropriate self.ReservedSlots locations
+    write_res(self, c_res, repack=False) -> None
+        Inserts Res ID into appropriate self.ReservedSlots locations. Marks
+        dirty. If repack, moves other reservations between lifts if that is
+        the only way to fit it.
+        
+    fits_after_repack(self, tRange, modifying=None) -> bool
+        Could tRange be inserted if reservations were moved between lifts?
+        
+    repack_res(self, c_res) -> bool
+        Re-assign every reservation's lift so that c_res fits, and insert it
         
     findBestLift(self, tRange, modifying=None or Res) -> int
         returns the best lift to insert place Res in. 
         - If type(modifying)==Res, then accounts for placing in current loc.
             Only != None when called by liftManager class
-        - If no spot available, return == 0
+        - If no spot available, return == -1
         
     findLift(c_res: Res) -> int
         Return the index of the lift in which a reservation resides
         
+    check_res_locs(self) -> bool
+        Does res_locs match the grid?
+        
+    rebuild_res_locs(self) -> None
+        Rebuild res_locs from the grid
+        
+    slot_range(tRange) -> (int, int)
+        The grid slots [s, e) covering a time range
+        
     __str__(self) -> String
         Return data from Day as a readable string
         
+    reservations_to_string(self) -> String
+        Each lift's reservations & their times, one line per lift
+        
     save(self) -> None
-        Write data from self into a file titled self.ID.txt * self.ID.npy
+        Write data from self into a file titled self.ID.day (see DayFormat)
+        
+    flush(self) -> bool
+        Save only if dirty. Returns True if files were written
     
     @classmethod
     initialize_days_initiated(self):
@@ -69,9 +118,12 @@ class Day():
     
     '''
     
-    def __init__(self, day_ID, num_lifts, reservedSlots=None, res_locs=None, filename=None):
+    io_counts = {'loads': 0, 'writes': 0}
+    
+    def __init__(self, day_ID, num_lifts, reservedSlots=None, res_locs=None, filename=None, handles=None, slots_per_hour=1, grid_class=SlotGrid):
         '''
-        Initialize values of new instance
+        Initialize values of new instance. Does not write any files; call
+        save() or flush() to persist.
         
         Parameters
         ----------
@@ -81,8 +133,21 @@ class Day():
             Number of lifts (depth Reserved slots).
             
         ReservedSlots : 2d ndarray, optional
+            Either integer handles (see SlotGrid) or reservation IDs
+        
+        res_locs : dict {ID str : (int, int, int)}, optional
+            Older files hold {} or {ID: lift}; these are rebuilt from the
+            grid.
         
-        res_locs : dict {ID str : int}, optional
+        handles : dict {int : ID str}, optional
+            Handle table for an integer ReservedSlots array
+            
+        slots_per_hour : int, optional
+            Resolution of a new (empty) day. A given ReservedSlots array 
+            sets its own resolution (its width / 24).
+            
+        grid_class : SlotGrid | BitGrid, optional
+            Occupancy engine backing the day (see OccupancyModule)
         '''
         
         self.day = day_ID
@@ -95,45 +160,122 @@ class Day():
         
         self.n_lifts = num_lifts
         
-        if type(reservedSlots) == np.ndarray:
-            self.reservedSlots = reservedSlots
+        if type(reservedSlots) != np.ndarray:
+            self.grid = grid_class(num_lifts, n_slots=24 * slots_per_hour)
+        elif reservedSlots.dtype == object:
+            self.grid = grid_class.from_id_array(reservedSlots)
         else:
-            self.reservedSlots = np.full((num_lifts, 24), None)
+            self.grid = grid_class(num_lifts, slots=reservedSlots, ids=handles)
             
-        if res_locs != None:
-            self.res_locs = res_locs
-        else:
-            self.res_locs = {}
+        self.slots_per_hour = self.grid.n_slots // 24
             
-        self.save()
+        # Spans may load as lists (json). Rebuild an index that doesn't
+        # cover exactly the reservations in the grid (e.g, an older file)
+        self.res_locs = {ID: tuple(loc) for ID, loc in (res_locs or {}).items()
+                         if isinstance(loc, (tuple, list)) and len(loc) == 3}
+        if self.res_locs.keys() != self.grid.handles.keys():
+            self.rebuild_res_locs()
+        
+        self._availability = None
+        self.dirty = False
         
     
+    @property
+    def availability(self) -> DayAvailability:
+        '''
+        Summary of the day's free time. Built on first use, as days that are
+        only read rarely need it
+        '''
+        if self._availability == None:
+            self._availability = DayAvailability.from_grid(self.grid)
+        return self._availability
+    
+    @availability.setter
+    def availability(self, summary: DayAvailability):
+        self._availability = summary
+    
+    
+    @property
+    def reservedSlots(self) -> np.ndarray:
+        '''
+        The time slots as reservation IDs (None if free). Built from grid
+        '''
+        return self.grid.to_id_array()
+    
+    
     def remove_res(self, c_res: Res) -> None:
         '''
         Removes all entries of a Res from ReservedSlots
         '''
-        ID = c_res.ID
-        self.reservedSlots[self.reservedSlots == ID] = None
-        self.save()
+        loc = self.res_locs.pop(c_res.ID, None)
         
+        self.grid.clear(c_res.ID, loc)
+        if loc != None:
+            self.availability.update_lift(self.grid, loc[0])
+        self.dirty = True
         
-    def write_res(self, c_res: Res) -> None:
+        
+    def write_res(self, c_res: Res, repack=False) -> None:
         '''
-        Inserts Res ID into appropriate self.ReservedSlots locations
+        Inserts Res ID into appropriate self.ReservedSlots locations. If no
+        lift is free for its whole time range and repack is True, other 
+        reservations are moved between lifts to make room (see repack_res).
         '''
         # Find the best lift. Insert string into appropriate coordinates
         tRange = c_res.tRange
         lift = self.findBestLift(tRange)
         
+        if lift == -1 and repack and self.repack_res(c_res):
+            return
+        
         if lift == -1:
             raise ValueError(f'The following reservation does not fit in {self.day}:\n{c_res}')
         
-        # TODO Indexing only works if start & end times are multiples of hours
-        self.reservedSlots[lift, int(tRange.start):int(tRange.end)] = c_res.ID
-        self.save()
+        s, e = self.slot_range(tRange)
+        self.grid.fill(lift, s, e, c_res.ID)
+        self.res_locs[c_res.ID] = (lift, s, e)
+        self.availability.update_lift(self.grid, lift)
+        self.dirty = True
+        
         
+    def fits_after_repack(self, tRange: TimeRange, modifying=None) -> bool:
+        '''
+        Return True if tRange could be inserted when reservations are free to
+        move between lifts, i.e, if no slot in tRange is already booked in
+        every lift.
         
-    def findBestLift(self, tRange: TimeRange):
+        Parameters
+        ----------
+        tRange : TimeRange
+        modifying : None | Res
+            If given, this reservation's slots are treated as open
+        '''
+        ignore = None if modifying == None else modifying.ID
+        occupied = ~self.grid.free(ignore)
+        return LiftPacker.fits(occupied, *self.slot_range(tRange))
+    
+    
+    def repack_res(self, c_res: Res) -> bool:
+        '''
+        Re-assign every reservation (plus c_res) to a lift, keeping each in 
+        its current lift where possible, and insert c_res. Returns False, 
+        leaving the day unchanged, if they can't all fit.
+        '''
+        spans = self.grid.spans()
+        spans[c_res.ID] = (None, *self.slot_range(c_res.tRange))
+        
+        placements = LiftPacker.assign(spans, self.grid.n_lifts)
+        if placements == None:
+            return False
+        
+        self.grid.rebuild(placements)
+        self.res_locs = dict(placements)
+        self.availability = None
+        self.dirty = True
+        return True
+        
+        
+    def findBestLift(self, tRange: TimeRange, modifying=None):
         '''
         returns the best lift to insert place Res in. If no contiguous time 
         slots are available, returns -1.
@@ -142,6 +284,10 @@ class Day():
         ----------
         tRange : TimeRange
             The time range over contiguous slots in question.
+            
+        modifying : None | Res
+            If given, the time slots of this reservation are treated as open
+            (i.e, the reservation could be moved over itself).
 
         Returns
         -------
@@ -149,37 +295,12 @@ class Day():
             The lift (index of reservedSlots) where the reservation should be
             inserted. Returns -1 if not possible to insert.
         '''
-        s = int(tRange.start)
-        e = int(tRange.end)
-        res_times = np.arange(s, e)
-        b_lift = -1
-        min_score = sys.maxsize
+        s, e = self.slot_range(tRange)
         
-        # Iterate through each lift, and determine if the reservation will fit
-        # in that lift. If it does, calculate the score.
-        for k in range(self.n_lifts):
-            opens = np.where(self.reservedSlots[k] == None)[0]
-            
-            # If fit, find score. Else, continue
-            if np.all(np.isin(res_times, opens)):
-                # Find the gap between current res and nearest reservations.
-                # Calculate score, and assign new best lift & score
-                i = s
-                j = e-1
-                while self.reservedSlots[k, i] == None and i > 0:
-                    i -= 1
-                while self.reservedSlots[k, j] == None and j < 23:
-                    j += 1
-                
-                d1 = s - i
-                d2 = j - e
-                score = (d1 - (d1**2)/48 )  + (d2 - (d2**2)/48 )
-                
-                if score < min_score:
-                    min_score = score
-                    b_lift = k
-        
-        return b_lift
+        # The lift leaving the smallest gaps to its neighbouring reservations
+        # wins (see SlotGrid.best_lift)
+        ignore = None if modifying == None else modifying.ID
+        return self.grid.best_lift(s, e, ignore=ignore)
         
         
     def findLift(self, c_res: Res) -> int:
@@ -191,35 +312,75 @@ class Day():
         c_res : Res
             The reservation in question
         '''
-        # Find the first coordinate of the first 'ID' value in reservedSlots
-        return np.where(self.reservedSlots == c_res.ID)[0][0]
+        loc = self.res_locs.get(c_res.ID)
+        if loc == None:
+            raise IndexError(f'Reservation "{c_res.ID}" is not in day {self.day}')
+        
+        return loc[0]
+    
+    
+    def check_res_locs(self) -> bool:
+        '''
+        Return True if res_locs holds exactly the span of every reservation 
+        in the grid
+        '''
+        return self.res_locs == self.grid.spans()
+    
+    
+    def rebuild_res_locs(self) -> None:
+        '''
+        Rebuild res_locs from the reservations in the grid
+        '''
+        self.res_locs = self.grid.spans()
+    
+    
+    def slot_range(self, tRange: TimeRange) -> tuple:
+        '''
+        Return the grid slots [s, e) covering tRange. Times between slot 
+        boundaries are rounded outwards.
+        '''
+        # The tolerance absorbs float error (e.g, 0.1 hours at 10 per hour)
+        s = math.floor(tRange.start * self.slots_per_hour + 1e-9)
+        e = math.ceil(tRange.end * self.slots_per_hour - 1e-9)
+        return (s, e)
     
     
     def __str__(self) -> str:
         
-        # Create string: day, number lifts, location dictionary, and np array
+        # Create string: day, number lifts, location dictionary, handle table
+        # and np array
         s1 = f'Day {self.day}'
         s2 = f'{self.n_lifts} Lifts'
+        if self.slots_per_hour != 1:
+            s2 += f', {self.slots_per_hour} slots per hour'
         s3 = str(self.res_locs)
-        s4 = self.timeslots_to_string()
+        s4 = str(self.grid.ids)
+        s5 = self.timeslots_to_string()
         
-        return f'{s1}\n{s2}\n{s3}\n\n{s4}'
+        return f'{s1}\n{s2}\n{s3}\n{s4}\n\n{s5}'
     
         
     def timeslots_to_string(self):
         '''
-        Return a string of just the day's timeslots. Useful in UI applications
+        Return a string of just the day's timeslots. Useful in UI applications.
+        Sub-hour days list each lift's reservations instead, as a row of 
+        slots would be too wide.
         '''
+        if self.slots_per_hour != 1:
+            return self.reservations_to_string()
+        
         # TODO #6
         out_s = 'Start hour: 00   01   02   03   04   05   06   07   08   09   10   11   12   '\
             '13   14   15   16   17   18   19   20   21   22   23\n'\
             '----------------------------------------------------------------------------'\
             '-------------------------------------------------------\n'\
         
+        reservedSlots = self.reservedSlots
+        
         for i in range(0, self.n_lifts):
             
             out_s += (f'Lift #{i} | '\
-            + np.array2string(self.reservedSlots[i], max_line_width=sys.maxsize)
+            + np.array2string(reservedSlots[i], max_line_width=sys.maxsize)
             + '\n')
         
         
@@ -227,22 +388,50 @@ class Day():
         return out_s
     
     
+    def reservations_to_string(self) -> str:
+        '''
+        Return each lift's reservations in time order, e.g.
+        'Lift #0 | ab 9:15-10:00, cd 11:00-11:05'
+        '''
+        by_lift = [[] for i in range(self.grid.n_lifts)]
+        for ID, (lift, s, e) in sorted(self.grid.spans().items(), key=lambda item: item[1]):
+            start = TimeTools.float_to_string(s / self.slots_per_hour)
+            end = TimeTools.float_to_string(e / self.slots_per_hour)
+            by_lift[lift].append(f'{ID} {start}-{end}')
+        
+        return ''.join(f'Lift #{i} | ' + ', '.join(spans) + '\n'
+                       for i, spans in enumerate(by_lift))
+    
+    
     def save(self) -> None:
         '''
-        Write all data from self to text file & numpy file
+        Write all data from self to storage (by default, the binary day 
+        file, see DayFormat). Nothing is pickled. The readable text is only
+        made on demand, by str(day).
         '''
-        filename = f'days/{self.filename}.txt'
+        Day.io_counts['writes'] += 1
+        Storage.backend.save_day(self)
+        self.dirty = False
+    
+    
+    def flush(self) -> bool:
+        '''
+        Save the day if it has changed since it was loaded or last saved.
+        Returns True if files were written
+        '''
+        if not self.dirty:
+            return False
         
-        with open(filename, mode='w') as file:
-            file.write(str(self))
-            
-        np.save(f'days/{self.filename}', self.reservedSlots)
+        self.save()
+        return True
         
     
 
 class GarageManager():
     '''
-    Static class for interfacing (managing) Day instances & files. 
+    Static class for interfacing (managing) Day instances & files. Loaded
+    days are kept in a write-through LRU cache, so repeated calls for the
+    same day only read its files once.
     
     Methods
     --------
@@ -254,17 +443,29 @@ class GarageManager():
 
     remove_res(c_res: Res) -> None
         Clear a reservation from reserved slots (thereby opening that time
-        range for another reservation)
+        range for another reservation). Saves the day once.
 
     write_res(c_res: Res) -> None
-        Write a reservation's ID into the appropriate day & time slots
+        Write a reservation's ID into the appropriate day & time slots. Saves
+        the day once.
+        
+    write_many(day_ID, reservations: list [Res]) -> list [bool]
+        Write many reservations into one day, in order, skipping those that
+        don't fit. Loads & saves the day once.
 
     modify_res(old_res: Res, new_d, new_s, new_e) -> None
         1) removes reservation ID from all past days & times
         2) Write's reservation ID into new day, with new start & end
     
     load_day(day_ID: int) -> Day
-        Creates Day instance from files with name 'ID' (integer).
+        Creates Day instance from files with name 'ID' (integer). Read-only:
+        never writes files.
+        
+    day_exists(day_ID) -> bool
+        Check if a day has been saved
+        
+    list_days() -> list [str]
+        List the days that have been saved
 
     create_day(day: int, n_lifts: int) -> Day
         Constructs new Day instance with ID 'day'. Automatically saves to files
@@ -275,20 +476,75 @@ class GarageManager():
     findLift(c_res: Res) -> int:
         Return the index of the lift in which a reservation resides
         
+    lock_days(*day_IDs) -> None
+        Lock days until the active unit of work ends, so their availability
+        can't change between a check and a write
+        
+    configure_cache(capacity=None, validate=None) -> None
+        Change the day cache size and/or file validation
+        
+    invalidate_day(day_ID=None) -> None
+        Drop a day (or every day) from the cache, forcing a reload
+        
+    use_occupancy(grid_class) -> None
+        Switch the occupancy engine (SlotGrid or BitGrid) of loaded days
+        
+    day_availability(day_ID) -> DayAvailability
+        A day's free-time summary, without loading the day when possible
+        
+    list_availability(first_day, last_day) -> list [(int, DayAvailability)]
+        The free-time summary of every day in a range
+        
+    find_free(duration, first_day, last_day, earliest, latest, n) -> list
+        The first n (day, start hour, lift) where duration hours are free
+        
     Class Attributes
     ----------------
     default_num_lifts : int
         Number of lifts that each day has.
+        
+    day_cache : LRUCache
+        Cached {filename: (Day, file stamp)}. See day_cache.stats
+        
+    validate_cache : bool
+        If True, a cached day is reloaded when it has changed in storage
+        (e.g, written by another process).
+        
+    repack_when_full : bool
+        If True, a reservation that fits in no single lift is still accepted
+        when moving other reservations between lifts makes room for it.
+        False by default, so lift assignments in storage only change when
+        asked to (--repack in AdminUI, ImportReservations & 
+        ReservationServer).
+        
+    slots_per_hour : int
+        Time resolution of new days (1 = hourly, 4 = 15 minutes, 12 = 5 
+        minutes). Saved days keep the resolution they were created with.
+        
+    grid_class : SlotGrid | BitGrid
+        Occupancy engine of loaded days. BitGrid is faster for few lifts. 
+        Change it with use_occupancy.
+        
+    availability : AvailabilityIndex
+        Free-time summaries of the days read or saved so far
+        
     '''
     
     default_num_lifts = 2
+    day_cache = LRUCache(capacity=64)
+    validate_cache = True
+    repack_when_full = False
+    slots_per_hour = 1
+    grid_class = SlotGrid
+    availability = AvailabilityIndex()
 
     @classmethod
     def check_if_available(self, day_ID, tRange: TimeRange, res_modifiying=None) -> bool:
         '''
-        TODO #1 Does not consider shifting reservations around
         Check if a reservation can be created for specified day, time range,
-        and (optionally) by overwriting an existing reservation
+        and (optionally) by overwriting an existing reservation. If 
+        repack_when_full, reservations may be shifted between lifts to make 
+        room.
         
         Parameters
         -----------
@@ -311,18 +567,20 @@ class GarageManager():
         if res_modifiying == None or res_modifiying.day != day_ID:
             best_lift = c_day.findBestLift(tRange)
         
-        # If new time slot & old reservation (modifying) are on same day: 
-        # 1) remove old res,
-        # 2) find best lift,
-        # 3) replace old res.
+        # If new time slot & old reservation (modifying) are on same day, 
+        # treat the old reservation's slots as open. The day is not changed.
         else:
-            c_day.remove_res(res_modifiying)
-            best_lift = c_day.findBestLift(tRange)
-            c_day.write_res(res_modifiying)
+            best_lift = c_day.findBestLift(tRange, modifying=res_modifiying)
         
         
-        # If best lift == -1, then new time range is not available
-        if best_lift == -1:
+        # If best lift == -1, then new time range is not available, unless
+        # the day's reservations can be re-packed around it
+        if best_lift == -1 and self.repack_when_full:
+            if res_modifiying == None or res_modifiying.day != day_ID:
+                return c_day.fits_after_repack(tRange)
+            else:
+                return c_day.fits_after_repack(tRange, modifying=res_modifiying)
+        elif best_lift == -1:
             return False
         else:
             return True
@@ -336,6 +594,7 @@ class GarageManager():
         '''
         c_day = self.load_day(c_res.day)
         c_day.remove_res(c_res)
+        self._flush_day(c_day)
     
     
     @classmethod
@@ -345,8 +604,40 @@ class GarageManager():
         '''
         
         c_day = self.load_day(c_res.day)
-        c_day.write_res(c_res)
-        c_day.save()
+        c_day.write_res(c_res, repack=self.repack_when_full)
+        self._flush_day(c_day)
+    
+    
+    @classmethod
+    def write_many(self, day_ID, reservations: list) -> list:
+        '''
+        Loads day_ID once, writes each reservation into its best lift (in 
+        order), and saves the day once. Reservations that don't fit are 
+        skipped.
+        
+        Parameters
+        ----------
+        day_ID : int
+        reservations : list [Res]
+            Reservations on day_ID
+        
+        Returns
+        -------
+        list [bool]
+            Whether each reservation was written
+        '''
+        c_day = self.load_day(day_ID)
+        written = []
+        
+        for c_res in reservations:
+            try:
+                c_day.write_res(c_res, repack=self.repack_when_full)
+                written.append(True)
+            except ValueError:
+                written.append(False)
+        
+        self._flush_day(c_day)
+        return written
     
     
     @classmethod
@@ -364,11 +655,23 @@ class GarageManager():
         return c_day.findLift(c_res)
     
     
+    @staticmethod
+    def lock_days(*day_IDs) -> None:
+        '''
+        Lock days until the active unit of work has committed, so no other 
+        thread or process can book them in between. Lock every day a call 
+        needs at once (they are taken in sorted order, avoiding deadlocks), 
+        and before loading them.
+        '''
+        UnitOfWork.lock(*[('day', str(day_ID)) for day_ID in day_IDs])
+    
+    
     @classmethod
     def load_day(self, day_ID: int, filename=None) -> Day:
         '''
-        Loads day 'day_id' if possible. Else, creates new Day instance 
-        (and corresponding files). 
+        Loads day 'day_id' if possible. Else, creates new (empty) Day 
+        instance. No files are written: the new day is saved the first time 
+        it is changed & flushed. Served from day_cache when possible.
         
         Parameters
         -----------
@@ -385,28 +688,202 @@ class GarageManager():
         if filename == None:
             filename = day_ID
         
-        # If day has not been initiated, create not (don't try to load)
-        if f'{day_ID}.txt' not in os.listdir('./days'):
-            return self.create_day(day_ID)
+        # A day changed in the current unit of work, but not yet saved
+        pending = UnitOfWork.lookup(('day', str(filename)))
+        if pending != None:
+            return pending
+        
+        # Use the cached day, unless it has changed in storage since it was 
+        # cached
+        entry = self.day_cache.get(str(filename))
+        
+        if entry != None:
+            c_day, stamp = entry
+            if not self.validate_cache or stamp == Storage.backend.day_stamp(filename):
+                return c_day
+        
+        # Stamp before reading: if the day is written meanwhile, the stamp 
+        # is already stale and the next load reads it again
+        stamp = Storage.backend.day_stamp(filename)
+        c_day = self._read_day(day_ID, filename)
+        self.day_cache.put(c_day.filename, (c_day, stamp))
+        return c_day
+    
+    
+    @staticmethod
+    def day_exists(day_ID) -> bool:
+        '''
+        Check if a day has been saved to storage
+        '''
+        return Storage.backend.day_exists(day_ID)
+    
+    
+    @staticmethod
+    def list_days() -> list:
+        '''
+        List the (file)names of the days saved to storage
+        '''
+        return Storage.backend.list_days()
+    
+    
+    @classmethod
+    def _read_day(self, day_ID: int, filename) -> Day:
+        '''
+        Read day 'day_ID' from storage, bypassing the cache
+        '''
+        # If day has not been initiated, create new. Reading is the check: 
+        # the directory index may not have seen a day another process just
+        # created
+        try:
+            record = Storage.backend.load_day(filename)
+        except FileNotFoundError:
+            return Day(day_ID, self.default_num_lifts, slots_per_hour=self.slots_per_hour,
+                       grid_class=self.grid_class)
+        
+        Day.io_counts['loads'] += 1
+        return self.day_from_record(record)
+    
+    
+    @classmethod
+    def day_from_record(self, record: dict) -> Day:
+        '''
+        Build a Day from a record loaded by a storage backend
+        '''
+        return Day(record['day'], record['n_lifts'], record['slots'], \
+                   record['res_locs'], handles=record['ids'], \
+                   filename=record['filename'], grid_class=self.grid_class)
+    
+    
+    @classmethod
+    def _flush_day(self, c_day: Day) -> None:
+        '''
+        Save a changed day (at the end of the unit of work, if one is active),
+        then update its cache entry
+        '''
+        if c_day.dirty:
+            UnitOfWork.save(c_day, ('day', str(c_day.filename)), after=self._cache_day)
+    
+    
+    @classmethod
+    def _cache_day(self, c_day: Day) -> None:
+        '''
+        (Re)insert a day in the cache, stamped with its current version in
+        storage
+        '''
+        stamp = Storage.backend.day_stamp(c_day.filename)
+        self.day_cache.put(c_day.filename, (c_day, stamp))
+        self.availability.update(c_day.filename, stamp, c_day.availability)
+    
+    
+    @classmethod
+    def configure_cache(self, capacity=None, validate=None) -> None:
+        '''
+        Change the day cache settings
         
-        # If day has been initiated, load.
-        else:
-            txt_file_name = f'days/{filename}.txt'
-            np_file_name = f'days/{filename}.npy'
-            
-            # Open the file, and parse out each attribute
-            with open(txt_file_name, mode='r') as file:
-                raw = file.read().split('\n') #split by line
-                
-                # Find the number of lifts (2nd line, all chars before first space)
-                # Find res_locs by using handy-dandy eval function
-                day_ID = int(raw[0].split(' ')[-1])
-                num_lifts = int(raw[1].split(' ')[0])
-                res_locs = ast.literal_eval(raw[2])
-                
-            reservedSlots = np.load(np_file_name, allow_pickle=True)
+        Parameters
+        ----------
+        capacity : None | int
+            Maximum number of days kept in memory. 0 disables the cache.
             
-            return Day(day_ID, num_lifts, reservedSlots, res_locs)
+        validate : None | bool
+            Whether cached days are checked against their file on each load
+        '''
+        if capacity != None:
+            self.day_cache.resize(capacity)
+        
+        if validate != None:
+            self.validate_cache = validate
+    
+    
+    @classmethod
+    def invalidate_day(self, day_ID=None) -> None:
+        '''
+        Drop a day (and its availability summary) from the cache so the next
+        load re-reads its files. Drops every day if day_ID is None.
+        '''
+        self.day_cache.invalidate(None if day_ID == None else str(day_ID))
+        self.availability.invalidate(day_ID)
+    
+    
+    @classmethod
+    def use_occupancy(self, grid_class) -> None:
+        '''
+        Back days loaded from now on with grid_class (SlotGrid or BitGrid), 
+        and drop cached days so they are reloaded with it
+        '''
+        self.grid_class = grid_class
+        self.invalidate_day()
+    
+    
+    @classmethod
+    def day_availability(self, day_ID, stored=True) -> DayAvailability:
+        '''
+        Return a day's free-time summary. Served from the availability index,
+        or read from storage (where it is saved with the day) if out of date.
+        Only days saved before summaries were kept are loaded.
+        
+        Parameters
+        ----------
+        day_ID : int
+        stored : bool
+            False if the day is known not to be in storage (so it is empty)
+        '''
+        if not stored:
+            return DayAvailability.empty(self.default_num_lifts, self.slots_per_hour)
+        
+        entry = self.availability.get(day_ID)
+        if entry != None:
+            stamp, summary = entry
+            if not self.validate_cache or stamp == Storage.backend.day_stamp(day_ID):
+                return summary
+        
+        # Stamp before reading, as in load_day
+        stamp = Storage.backend.day_stamp(day_ID)
+        try:
+            summary = DayAvailability.from_record(Storage.backend.load_day_availability(day_ID))
+        except FileNotFoundError:
+            summary = self.load_day(day_ID).availability
+        
+        self.availability.update(day_ID, stamp, summary)
+        return summary
+    
+    
+    @classmethod
+    def list_availability(self, first_day=0, last_day=365) -> list:
+        '''
+        Return [(day, DayAvailability)] for days first_day to last_day 
+        (inclusive). Days never saved get an empty summary.
+        '''
+        stored = set(self.list_days())
+        return [(day_ID, self.day_availability(day_ID, str(day_ID) in stored))
+                for day_ID in range(first_day, last_day + 1)]
+    
+    
+    @classmethod
+    def find_free(self, duration: float, first_day=0, last_day=365, earliest=0, latest=24, n=5) -> list:
+        '''
+        Search days first_day to last_day (inclusive) for the first n places 
+        where duration hours are free on one lift, between the hours earliest
+        and latest, using each day's availability summary. Days never saved
+        count as empty.
+        
+        Returns
+        -------
+        list [(int, float, int)]
+            (day, start hour, lift), earliest first. At most one option per
+            run of free time on a lift, so options on one day are spread out.
+        '''
+        stored = set(self.list_days())
+        options = []
+        
+        for day_ID in range(first_day, last_day + 1):
+            summary = self.day_availability(day_ID, str(day_ID) in stored)
+            for start, lift in summary.earliest_starts(duration, earliest, latest):
+                options.append((day_ID, start, lift))
+                if len(options) == n:
+                    return options
+        
+        return options
     
     
     @staticmethod
@@ -425,7 +902,10 @@ class GarageManager():
             
         Return: Day instance
         '''
-        return (Day(day_ID, n_lifts))
+        c_day = Day(day_ID, n_lifts, slots_per_hour=GarageManager.slots_per_hour,
+                    grid_class=GarageManager.grid_class)
+        UnitOfWork.save(c_day, ('day', str(c_day.filename)), after=GarageManager._cache_day)
+        return c_day
     
     
     @classmethod
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk-create reservations from JSON lines read on stdin.
+
+Usage: python ImportReservations.py [--storage SPEC] [--batch-size N]
+                                   [--slots-per-hour N] [--repack] < requests.jsonl
+    where each line is {"ID": "ab", "owner": "bob", "day": 3, "start": 4, "end": 8}
+    (times are hours, and may be fractional, e.g. 9.25 for 9:15)
+    and SPEC is 'files:<root directory>' (default 'files:.'), 'sqlite:<db path>',
+    'year:<root directory>' or 'journal:<root directory>'
+
+One JSON result per input line is written to stdout, e.g.
+    {"line": 1, "ID": "ab", "created": true}
+    {"line": 2, "error": "..."}
+
+@author: tanne
+"""
+import argparse
+import json
+import sys
+from GarageModule import GarageManager
+from MigrateStorage import StorageMigrator
+from ReservationsAPI import ReservationsAPI
+from TimeUtilities import TimeRange
+
+
+class ReservationImporter():
+    '''
+    Static class for streaming reservation requests into ReservationsAPI.
+
+    Methods
+    -------
+    parse_request(line: str) -> (str, str, int, TimeRange)
+        Turn one JSON line into a request for ReservationsAPI.try_create_many.
+        Raises ValueError if it is malformed.
+
+    parse_fields(fields: dict) -> (str, str, int, TimeRange)
+        The same, for a decoded JSON object
+
+    import_lines(lines, batch_size=10000) -> generator [dict]
+        Create the reservations in lines, one transaction per batch. Yields
+        one result per line.
+    '''
+
+    @classmethod
+    def parse_request(self, line: str) -> tuple:
+        '''
+        Turn one JSON line into an (ID, owner, day, tRange) request. Raises
+        ValueError if it is malformed.
+        '''
+        try:
+            fields = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'Malformed request: {error!r}')
+
+        return self.parse_fields(fields)
+
+
+    @staticmethod
+    def parse_fields(fields: dict) -> tuple:
+        '''
+        Turn a request's fields {"ID", "owner", "day", "start", "end"} into
+        an (ID, owner, day, tRange) request. Raises ValueError if they are
+        malformed.
+        '''
+        try:
+            ID, owner = str(fields['ID']), str(fields['owner'])
+            day, s, e = int(fields['day']), float(fields['start']), float(fields['end'])
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f'Malformed request: {error!r}')
+
+        if not ID.isalnum():
+            raise ValueError(f'Reservation ID "{ID}" should be alpha-numeric')
+        if day < 0 or day > 365:
+            raise ValueError(f'Day {day} is not in 0-365')
+        if not 0 <= s < e <= 24:
+            raise ValueError(f'Times {s:g}-{e:g} are not a range within 0-24')
+
+        return (ID, owner, day, TimeRange(start=s, end=e))
+
+
+    @classmethod
+    def import_lines(self, lines, batch_size=10000):
+        '''
+        Create the reservations listed in lines (JSON strings). Lines are
+        read & committed batch_size at a time, so any number of lines can be
+        streamed. Yields a result dict per non-blank line, in order.
+        '''
+        batch = []
+
+        for number, line in enumerate(lines, start=1):
+            if line.strip():
+                batch.append((number, line))
+            if len(batch) >= batch_size:
+                yield from self._import_batch(batch)
+                batch = []
+
+        yield from self._import_batch(batch)
+
+
+    @classmethod
+    def _import_batch(self, batch: list) -> list:
+        results = {}
+        requests = []
+        numbers = []
+
+        for number, line in batch:
+            try:
+                requests.append(self.parse_request(line))
+                numbers.append(number)
+            except ValueError as error:
+                results[number] = {'line': number, 'error': str(error)}
+
+        created = ReservationsAPI.try_create_many(requests)
+        for number, request, ok in zip(numbers, requests, created):
+            results[number] = {'line': number, 'ID': request[0], 'created': ok}
+
+        return [results[number] for number, line in batch]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create reservations from JSON lines on stdin')
+    parser.add_argument('--storage', default='files:.',
+                        help="'files:<root>' (default 'files:.'), 'sqlite:<path>', "
+                             "'year:<root>' or 'journal:<root>'")
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='lines committed per transaction (default 10000)')
+    parser.add_argument('--slots-per-hour', type=int, default=1,
+                        help='time resolution of days created by the import (default 1)')
+    parser.add_argument('--repack', action='store_true',
+                        help='when a reservation fits no single lift, move others between '
+                             'lifts to make room')
+    args = parser.parse_args()
+
+    GarageManager.slots_per_hour = args.slots_per_hour
+    GarageManager.repack_when_full = args.repack
+    backend = StorageMigrator.open_backend(args.storage)
+    ReservationsAPI.use_storage(backend)
+
+    counts = {'created': 0, 'failed': 0}
+    for result in ReservationImporter.import_lines(sys.stdin, args.batch_size):
+        counts['created' if result.get('created') else 'failed'] += 1
+        print(json.dumps(result))
+
+    backend.close()
+    print(f"Created {counts['created']} reservations, {counts['failed']} failed",
+          file=sys.stderr)
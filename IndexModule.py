@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory indexes over the data directories, so existence checks don't list
+a whole directory, and per-owner queries don't read every reservation.
+
+@author: tanne
+"""
+import bisect
+import os
+import threading
+
+
+class DirectoryIndex():
+    '''
+    A set of the file names (without suffix) in one directory. Built on first
+    use, then kept up to date by the managers' create / delete paths. Safe
+    to share between threads.
+
+    Attributes
+    ----------
+    directory : str
+        The directory being indexed, relative to the working directory
+
+    suffix : str | tuple [str]
+        Only files ending in suffix (or one of the suffixes) are indexed
+        (e.g, '.txt')
+
+    check_mtime : bool
+        If True, every lookup compares the directory's modification time with
+        the one seen at the last scan, and rescans if files were added or
+        removed by someone else (e.g, another process or by hand).
+
+    Methods
+    -------
+    __contains__(name) -> bool
+        O(1) check if name{suffix} exists
+
+    names() -> list [str]
+        Sorted list of indexed names
+
+    add(name) -> None
+        Record that name{suffix} has been written
+
+    discard(name) -> None
+        Record that name{suffix} has been deleted
+
+    refresh(force=False) -> None
+        Rescan the directory if it changed (or always, if force)
+    '''
+
+    def __init__(self, directory: str, suffix='.txt', check_mtime=True):
+        '''
+        Parameters
+        ----------
+        directory : str
+        suffix : str, optional
+        check_mtime : bool, optional
+        '''
+        self.directory = directory
+        self.suffix = suffix
+        self.check_mtime = check_mtime
+        self._names = set()
+        self._stamp = None
+        self._lock = threading.RLock()
+
+
+    def __contains__(self, name) -> bool:
+        self.refresh()
+        return str(name) in self._names
+
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._names)
+
+
+    def names(self) -> list:
+        '''
+        Return a sorted list of the indexed names
+        '''
+        self.refresh()
+        return sorted(self._names)
+
+
+    def add(self, name) -> None:
+        '''
+        Record that name{suffix} exists. Call after writing the file.
+        '''
+        with self._lock:
+            self._scan_once()
+            self._names.add(str(name))
+            self._restamp()
+
+
+    def discard(self, name) -> None:
+        '''
+        Record that name{suffix} no longer exists. Call after deleting it.
+        '''
+        with self._lock:
+            self._scan_once()
+            self._names.discard(str(name))
+            self._restamp()
+
+
+    def refresh(self, force=False) -> None:
+        '''
+        Rescan the directory if it was never scanned, if it changed since the
+        last scan (when check_mtime is on), or if force is True.
+        '''
+        with self._lock:
+            if self._stamp != None and not force:
+                if not self.check_mtime or self._stamp == self._dir_stamp():
+                    return
+
+            suffixes = (self.suffix,) if isinstance(self.suffix, str) else self.suffix
+            self._names = {entry.name[:-len(suffix)] for entry in os.scandir(self.directory)
+                           for suffix in suffixes if entry.name.endswith(suffix)}
+            self._stamp = self._dir_stamp()
+
+
+    def _scan_once(self) -> None:
+        # add & discard follow our own writes, which already changed the
+        # directory's mtime, so they only scan if nothing was scanned yet
+        if self._stamp == None:
+            self.refresh()
+
+
+    def _restamp(self) -> None:
+        # Accept the mtime left by our own writes, so they don't trigger a
+        # rescan
+        self._stamp = self._dir_stamp()
+
+
+    def _dir_stamp(self):
+        # The working directory is part of the stamp, so a chdir rescans
+        path = os.path.abspath(self.directory)
+        return (path, os.stat(path).st_mtime_ns)
+
+
+class OwnerIndex():
+    '''
+    Every owner's reservations, sorted by day, so queries like "owner X's
+    active reservations on days 100-120" don't load every reservation. 
+    Built from storage on first use, then kept up to date by ResManager as
+    reservations are saved & deleted. Reservations changed by another 
+    process are not seen until invalidate(). Safe to share between threads.
+
+    Attributes
+    ----------
+    entries : dict {str : (str, int, bool)}
+        {reservation filename: (owner, day, active)}
+
+    by_owner : dict {str : ([int], [str])}
+        {owner: (days, filenames)}, both sorted by (day, filename)
+
+    built : bool
+        False until build() (or after invalidate())
+
+    Methods
+    -------
+    build(records) -> None
+        Index (filename, record) pairs, replacing the current contents
+
+    ensure_built(load_records) -> None
+        build(load_records()) unless already built
+
+    update(filename, owner, day, active) -> None
+        Add or move one reservation
+
+    discard(filename) -> None
+
+    query(owner, first_day=0, last_day=365, active=None) -> list [str]
+        Filenames of owner's reservations on days first_day-last_day, 
+        filtered by active (unless None), sorted by day
+
+    invalidate() -> None
+        Forget everything; the next use rebuilds from storage
+    '''
+
+    def __init__(self):
+        self.entries = {}
+        self.by_owner = {}
+        self.built = False
+        self._lock = threading.RLock()
+
+
+    def build(self, records) -> None:
+        '''
+        Replace the index with records, an iterable of (filename, record)
+        pairs as loaded by a storage backend
+        '''
+        # Updates wait until the records are read, so none are lost
+        with self._lock:
+            entries = {}
+            rows = {}
+            for filename, record in records:
+                entries[filename] = (record['owner'], record['day'], record['active'])
+                rows.setdefault(record['owner'], []).append((record['day'], filename))
+
+            by_owner = {}
+            for owner, pairs in rows.items():
+                pairs.sort()
+                by_owner[owner] = ([day for day, filename in pairs],
+                                   [filename for day, filename in pairs])
+
+            self.entries, self.by_owner, self.built = entries, by_owner, True
+
+
+    def ensure_built(self, load_records) -> None:
+        '''
+        Build the index from load_records() (see build), unless it is built
+        '''
+        with self._lock:
+            if not self.built:
+                self.build(load_records())
+
+
+    def update(self, filename: str, owner: str, day: int, active: bool) -> None:
+        '''
+        Record the reservation saved as filename, replacing its old entry.
+        Ignored until the index is built (building reads it from storage).
+        '''
+        with self._lock:
+            if not self.built:
+                return
+            self._remove(filename)
+            self.entries[filename] = (owner, day, active)
+            days, filenames = self.by_owner.setdefault(owner, ([], []))
+            i = self._position(days, filenames, day, filename)
+            days.insert(i, day)
+            filenames.insert(i, filename)
+
+
+    def discard(self, filename: str) -> None:
+        '''
+        Forget the reservation saved as filename, if indexed
+        '''
+        with self._lock:
+            self._remove(filename)
+
+
+    def _remove(self, filename: str) -> None:
+        entry = self.entries.pop(filename, None)
+        if entry == None:
+            return
+
+        owner, day = entry[:2]
+        days, filenames = self.by_owner[owner]
+        i = self._position(days, filenames, day, filename)
+        del days[i], filenames[i]
+        if not days:
+            del self.by_owner[owner]
+
+
+    @staticmethod
+    def _position(days: list, filenames: list, day: int, filename: str) -> int:
+        # Where (day, filename) is, or belongs, in an owner's sorted lists
+        i = bisect.bisect_left(days, day)
+        end = bisect.bisect_right(days, day, i)
+        return bisect.bisect_left(filenames, filename, i, end)
+
+
+    def query(self, owner: str, first_day=0, last_day=365, active=None) -> list:
+        '''
+        Return the filenames of owner's reservations on days first_day to
+        last_day (inclusive), sorted by day. If active is True (False), only
+        active (cancelled) reservations are listed.
+        '''
+        with self._lock:
+            days, filenames = self.by_owner.get(owner, ([], []))
+            i = bisect.bisect_left(days, first_day)
+            j = bisect.bisect_right(days, last_day)
+            found = filenames[i:j]
+            if active != None:
+                found = [filename for filename in found if self.entries[filename][2] == active]
+
+        return found
+
+
+    def invalidate(self) -> None:
+        '''
+        Forget every entry, so the index is rebuilt from storage when next
+        used
+        '''
+        with self._lock:
+            self.entries, self.by_owner, self.built = {}, {}, False
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only journal of committed writes, replayed on startup.
+
+@author: tanne
+"""
+import json
+import os
+import struct
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError: # Windows: nothing stops a second process opening it
+    fcntl = None
+
+
+class Journal():
+    '''
+    An append-only log file. Each entry is the set of writes one commit
+    made, {name: data (bytes), None for a deletion, or (offset, data) for
+    data added to the file at offset}, appended with a single write. All
+    numbers are little-endian.
+
+        header  magic b'CJNL', crc32 of the rest, index bytes, data bytes
+                (uint32 each)
+        index   JSON list of [name, data length or null] for each write,
+                or [name, data length, offset] for an addition
+        data    the data of each write, back to back
+
+    A crash mid-append leaves a torn last entry, which fails its crc and is
+    cut off by replay(). Only one process can have a journal open.
+
+    Attributes
+    ----------
+    path : str
+
+    sync_every : int
+        fsync the log every sync_every appends. 1 makes each commit durable
+        before it returns; larger values batch the fsyncs, so up to
+        sync_every - 1 commits can be lost in a power failure (not in a
+        crash of the process). 0 leaves it to the OS.
+
+    size : int
+        Bytes in the log
+
+    Methods
+    -------
+    append(writes: dict) -> None
+        Append one commit's writes {name: bytes | None | (offset, bytes)}
+
+    replay() -> generator [dict]
+        Every entry's writes, oldest first
+
+    sync() -> None
+        fsync appends made since the last sync
+
+    truncate() -> None
+        Empty the log (once its writes are saved elsewhere)
+
+    close() -> None
+    '''
+
+    MAGIC = b'CJNL'
+    HEADER = struct.Struct('<4sIII')
+
+    def __init__(self, path: str, sync_every=1):
+        '''
+        Parameters
+        ----------
+        path : str
+            The log file. Created if missing.
+
+        sync_every : int, optional
+            See the class docstring
+        '''
+        self.path = path
+        self.sync_every = sync_every
+        self._fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT)
+        self._unsynced = 0
+        self._lock = threading.Lock()
+
+        if fcntl != None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(self._fd)
+                raise RuntimeError(f'Journal "{path}" is open in another process')
+
+        self.size = os.fstat(self._fd).st_size
+
+
+    def append(self, writes: dict) -> None:
+        '''
+        Append one commit's writes {name: bytes | None | (offset, bytes)} as
+        a single entry
+        '''
+        index = []
+        chunks = []
+        for name, data in writes.items():
+            if isinstance(data, tuple):
+                index.append([name, len(data[1]), data[0]])
+                chunks.append(data[1])
+            else:
+                index.append([name, None if data == None else len(data)])
+                if data != None:
+                    chunks.append(data)
+        index = json.dumps(index).encode()
+        data = b''.join(chunks)
+        crc = zlib.crc32(data, zlib.crc32(index))
+        entry = b''.join([self.HEADER.pack(self.MAGIC, crc, len(index), len(data)), index, data])
+
+        with self._lock:
+            view = memoryview(entry)
+            while view:
+                view = view[os.write(self._fd, view):]
+            self.size += len(entry)
+
+            self._unsynced += 1
+            if self.sync_every and self._unsynced >= self.sync_every:
+                os.fsync(self._fd)
+                self._unsynced = 0
+
+
+    def replay(self):
+        '''
+        Yield every complete entry's writes {name: bytes | None | (offset,
+        bytes)}, oldest first. A torn or corrupt entry ends the log: it & anything after it
+        are cut off.
+        '''
+        with self._lock:
+            with open(self.path, 'rb') as file:
+                log = file.read()
+
+        offset = 0
+        while offset < len(log):
+            entry = self._parse(log, offset)
+            if entry == None:
+                with self._lock:
+                    os.ftruncate(self._fd, offset)
+                    self.size = offset
+                return
+
+            writes, offset = entry
+            yield writes
+
+
+    def _parse(self, log: bytes, offset: int):
+        # Return (writes, offset of the next entry), or None if the entry at
+        # offset is incomplete or fails its checks
+        if offset + self.HEADER.size > len(log):
+            return None
+
+        magic, crc, n_index, n_data = self.HEADER.unpack_from(log, offset)
+        start = offset + self.HEADER.size
+        end = start + n_index + n_data
+        if magic != self.MAGIC or end > len(log) or zlib.crc32(log[start:end]) != crc:
+            return None
+
+        writes = {}
+        position = start + n_index
+        for name, length, *offset in json.loads(log[start:start + n_index]):
+            if length == None:
+                writes[name] = None
+            else:
+                data = log[position:position + length]
+                writes[name] = (offset[0], data) if offset else data
+                position += length
+
+        return writes, end
+
+
+    def sync(self) -> None:
+        '''
+        fsync appends that have not been synced yet
+        '''
+        with self._lock:
+            if self._unsynced:
+                os.fsync(self._fd)
+                self._unsynced = 0
+
+
+    def truncate(self) -> None:
+        '''
+        Empty the log
+        '''
+        with self._lock:
+            os.ftruncate(self._fd, 0)
+            os.fsync(self._fd)
+            self.size = 0
+            self._unsynced = 0
+
+
+    def close(self) -> None:
+        '''
+        Sync & close the log
+        '''
+        self.sync()
+        os.close(self._fd)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Load generator for ReservationServer: many concurrent clients, each sending a
+mix of requests one after another, then a report of throughput & latency.
+
+Usage: python LoadGenerator.py [--host HOST] [--port N] [--clients N]
+                               [--requests N] [--days N] [--mix MIX] [--seed N]
+    where MIX weights the operations, e.g. 'create=6,get=2,find=1,cancel=1'
+    (the default)
+
+e.g.   python ReservationServer.py --storage sqlite:load.db &
+       python LoadGenerator.py --clients 32 --requests 200
+
+@author: tanne
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from StatsUtilities import StatTools
+
+
+class LoadGenerator():
+    '''
+    Drives a ReservationServer with clients concurrent connections. Each
+    client sends requests requests, waiting for each response before the
+    next, and records every latency by operation. Reservations are made on
+    days 0 to days - 1 (fewer days means more requests for the same day),
+    under IDs unique to the run.
+
+    Attributes
+    ----------
+    host : str
+
+    port : int
+
+    clients : int
+
+    requests : int
+        Requests sent by each client
+
+    days : int
+
+    mix : dict {str : float}
+        Weight of each operation: create, get, modify, cancel, find,
+        availability, owner
+
+    seed : int
+
+    Methods
+    -------
+    run() -> (dict {str : list [float]}, dict {str : int}, float)  (coroutine)
+        Run the load. Returns the latencies (seconds) and error counts of
+        each operation, and the wall time.
+
+    @classmethod
+    report(latencies, errors, seconds) -> str
+        A table of requests, errors, p50, p99 & max latency per operation
+    '''
+
+    OPERATIONS = ('create', 'get', 'modify', 'cancel', 'find', 'availability', 'owner')
+    DEFAULT_MIX = {'create': 6, 'get': 2, 'find': 1, 'cancel': 1}
+
+    def __init__(self, host='127.0.0.1', port=8765, clients=8, requests=100, days=30,
+                 mix=None, seed=0):
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.requests = requests
+        self.days = days
+        self.mix = dict(self.DEFAULT_MIX if mix == None else mix)
+        unknown = set(self.mix) - set(self.OPERATIONS)
+        if unknown:
+            raise ValueError(f'Unknown ops {sorted(unknown)}; use {", ".join(self.OPERATIONS)}')
+        self.seed = seed
+        self._run_ID = os.urandom(3).hex()
+
+
+    async def run(self) -> tuple:
+        '''
+        Run every client at once. Returns ({op: [latency]}, {op: errors},
+        wall time), latencies & wall time in seconds.
+        '''
+        latencies = {op: [] for op in self.mix}
+        errors = {op: 0 for op in self.mix}
+
+        start = time.perf_counter()
+        await asyncio.gather(*[self._client(number, latencies, errors)
+                               for number in range(self.clients)])
+        return latencies, errors, time.perf_counter() - start
+
+
+    async def _client(self, number: int, latencies: dict, errors: dict) -> None:
+        rng = random.Random(self.seed * 100003 + number)
+        ops, weights = list(self.mix), list(self.mix.values())
+        owner = f'kiosk{number}'
+        booked = []
+
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            for i in range(self.requests):
+                op = rng.choices(ops, weights)[0]
+                if op in ('get', 'modify', 'cancel') and not booked:
+                    op = 'create' if 'create' in self.mix else 'find'
+                request = self._request(op, rng, owner, booked, f'{self._run_ID}c{number}n{i}')
+                request['id'] = i
+
+                sent = time.perf_counter()
+                writer.write((json.dumps(request) + '\n').encode())
+                await writer.drain()
+                response = json.loads(await reader.readline())
+                latencies.setdefault(op, []).append(time.perf_counter() - sent)
+
+                if not response.get('ok'):
+                    errors[op] = errors.get(op, 0) + 1
+                elif op == 'create' and response['result']:
+                    booked.append(request['ID'])
+                elif op == 'cancel':
+                    booked.remove(request['ID'])
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+
+    def _request(self, op: str, rng: random.Random, owner: str, booked: list, ID: str) -> dict:
+        # A random request for op
+        day = rng.randrange(self.days)
+        start = rng.randrange(24)
+        end = min(24, start + rng.choice((1, 2, 3)))
+
+        if op == 'create':
+            return {'op': op, 'ID': ID, 'owner': owner, 'day': day, 'start': start, 'end': end}
+        elif op in ('get', 'cancel'):
+            return {'op': op, 'ID': rng.choice(booked)}
+        elif op == 'modify':
+            return {'op': op, 'ID': rng.choice(booked), 'day': day, 'start': start, 'end': end}
+        elif op == 'find':
+            return {'op': op, 'duration': rng.choice((1, 2, 4)), 'first_day': day,
+                    'last_day': min(365, day + 7), 'n': 3}
+        elif op == 'availability':
+            return {'op': op, 'first_day': day, 'last_day': min(365, day + 7)}
+        else:
+            return {'op': op, 'owner': owner}
+
+
+    @classmethod
+    def report(self, latencies: dict, errors: dict, seconds: float) -> str:
+        '''
+        Return a table of the requests, errors & latencies (ms) of each
+        operation, and of all of them, with the overall throughput
+        '''
+        every = [latency for values in latencies.values() for latency in values]
+        rows = [(op, values, errors.get(op, 0)) for op, values in latencies.items() if values]
+        rows.append(('all', every, sum(errors.values())))
+
+        lines = ['op           | requests | errors | p50 (ms) | p99 (ms) | max (ms)']
+        for op, values, n_errors in rows:
+            lines.append(f'{op:12s} | {len(values):8d} | {n_errors:6d} | '
+                         f'{StatTools.percentile(values, 50) * 1e3:8.2f} | '
+                         f'{StatTools.percentile(values, 99) * 1e3:8.2f} | '
+                         f'{max(values, default=math.nan) * 1e3:8.2f}')
+        lines.append(f'{len(every)} requests in {seconds:.2f} s: {len(every) / seconds:.0f} req/s')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test a ReservationServer')
+    parser.add_argument('--host', default='127.0.0.1', help='server address (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='server port (default 8765)')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='concurrent connections (default 8)')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='requests sent by each client (default 100)')
+    parser.add_argument('--days', type=int, default=30,
+                        help='book days 0 to DAYS - 1 (default 30)')
+    parser.add_argument('--mix', default='create=6,get=2,find=1,cancel=1',
+                        help='operation weights (default create=6,get=2,find=1,cancel=1); '
+                             'also modify, availability & owner')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default 0)')
+    args = parser.parse_args()
+
+    try:
+        mix = {op: float(weight) for op, _, weight in
+               (item.partition('=') for item in args.mix.split(','))}
+        generator = LoadGenerator(args.host, args.port, args.clients, args.requests, args.days,
+                                  mix, args.seed)
+    except ValueError as error:
+        parser.error(f'Bad --mix "{args.mix}" ({error}); use e.g. create=6,get=2')
+
+    print(LoadGenerator.report(*asyncio.run(generator.run())))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Named locks shared by threads of one process and, through lock files, by
+several processes.
+
+@author: tanne
+"""
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows: locks only cover the current process
+    fcntl = None
+
+
+class LockManager():
+    '''
+    Hands out exclusive locks by name (e.g, ('day', '12')). Within a
+    process a thread lock is used; if directory is set (and the platform has
+    fcntl), a flock on directory/{name}.lock also excludes other processes.
+
+    Attributes
+    ----------
+    directory : str | None
+        Where lock files are kept. None for in-process locks only.
+
+    Methods
+    -------
+    acquire(key) -> None
+        Block until key is locked by the calling thread
+
+    release(key) -> None
+        Unlock key (must be held by the calling thread)
+    '''
+
+    def __init__(self, directory=None):
+        '''
+        Parameters
+        ----------
+        directory : str, optional
+            Folder for lock files. Created on first use.
+        '''
+        self.directory = directory
+        self._locks = {}
+        self._files = {}
+        self._guard = threading.Lock()
+
+
+    def acquire(self, key) -> None:
+        '''
+        Block until key is locked by the calling thread (and process)
+        '''
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        lock.acquire()
+
+        if self.directory != None and fcntl != None:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                fd = os.open(self._lock_path(key), os.O_RDWR | os.O_CREAT)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                lock.release()
+                raise
+            self._files[key] = fd
+
+
+    def release(self, key) -> None:
+        '''
+        Unlock key. The calling thread must hold it.
+        '''
+        fd = self._files.pop(key, None)
+        if fd != None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+        self._locks[key].release()
+
+
+    def _lock_path(self, key) -> str:
+        name = '-'.join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+        return os.path.join(self.directory, f'{name}.lock')
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Copy every day, reservation and account from one storage backend to another.
+
+Usage: python MigrateStorage.py SOURCE TARGET
+    where SOURCE & TARGET are 'files:<root directory>', 'sqlite:<db path>'
+    , 'year:<root directory>' (days in one memory-mapped file) or
+    'journal:<root directory>' (files, written through root/journal.log)
+
+e.g.   python MigrateStorage.py files:. sqlite:carlotter.db
+
+@author: tanne
+"""
+import argparse
+import os
+from AccountModule import AccountManager
+from GarageModule import GarageManager
+from ReservationsModule import ResManager
+from StorageModule import FileStorage, JournalStorage, SQLiteStorage, YearStorage
+
+
+class StorageMigrator():
+    '''
+    Static class for moving data between storage backends.
+
+    Methods
+    -------
+    open_backend(spec: str) -> FileStorage | SQLiteStorage | YearStorage | JournalStorage
+        Open a backend from a 'files:<root>', 'sqlite:<path>', 'year:<root>'
+        or 'journal:<root>' string
+
+    migrate(source, target) -> dict {str : int}
+        Copy everything from source to target. Returns counts per kind.
+    '''
+
+    @staticmethod
+    def open_backend(spec: str):
+        '''
+        Open a backend from a 'files:<root>', 'sqlite:<path>', 'year:<root>'
+        or 'journal:<root>' string. Missing folders / database files are 
+        created.
+        A new year file gets GarageManager's number of lifts & resolution.
+        '''
+        kind, _, location = spec.partition(':')
+
+        if kind in ('files', 'year', 'journal'):
+            root = location or '.'
+            for folder in ('days', 'reservations', 'accounts'):
+                os.makedirs(os.path.join(root, folder), exist_ok=True)
+            if kind == 'year':
+                return YearStorage(root, GarageManager.default_num_lifts, 
+                                   GarageManager.slots_per_hour)
+            if kind == 'journal':
+                return JournalStorage(root)
+            return FileStorage(root)
+        elif kind == 'sqlite':
+            return SQLiteStorage(location or 'carlotter.db')
+        else:
+            raise ValueError(f'Unknown storage "{spec}". Use files:<root>, sqlite:<path> '
+                             'year:<root> or journal:<root>')
+
+
+    @staticmethod
+    def migrate(source, target) -> dict:
+        '''
+        Copy every day, reservation & account from source into target.
+        Existing entries in target with the same names are overwritten.
+        Everything is written in one transaction of the target.
+        '''
+        counts = {'days': 0, 'reservations': 0, 'accounts': 0}
+
+        with target.transaction():
+            for filename in source.list_days():
+                c_day = GarageManager.day_from_record(source.load_day(filename))
+                target.save_day(c_day)
+                counts['days'] += 1
+
+            for filename in source.list_res():
+                c_res = ResManager.res_from_record(source.load_res(filename))
+                c_res.filename = filename
+                target.save_res(c_res)
+                counts['reservations'] += 1
+
+            for filename in source.list_accounts():
+                c_account = AccountManager.acct_from_record(source.load_acct(filename))
+                # Not stored in target yet: write it whole
+                c_account.stored = None
+                target.save_acct(c_account)
+                counts['accounts'] += 1
+
+        return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Copy all data between storage backends')
+    parser.add_argument('source', help="'files:<root>', 'sqlite:<path>', 'year:<root>' "
+                                       "or 'journal:<root>'")
+    parser.add_argument('target', help="'files:<root>', 'sqlite:<path>', 'year:<root>' "
+                                       "or 'journal:<root>'")
+    args = parser.parse_args()
+
+    source = StorageMigrator.open_backend(args.source)
+    target = StorageMigrator.open_backend(args.target)
+    counts = StorageMigrator.migrate(source, target)
+    source.close()
+    target.close()
+
+    print(f"Copied {counts['days']} days, {counts['reservations']} reservations "
+          f"and {counts['accounts']} accounts from {args.source} to {args.target}")
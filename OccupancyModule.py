@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Occupancy engines used by Day to keep track of which reservation sits in
+which lift & time slot.
+
+@author: tanne
+"""
+import numpy as np
+
+
+class SlotGrid():
+    '''
+    Integer-coded occupancy grid. Every slot holds a small integer handle
+    instead of the reservation ID string, so comparisons against the grid are
+    plain vectorized NumPy operations (no boxed Python objects).
+
+    Attributes
+    ----------
+    n_lifts : int
+        Number of lifts (first axis of slots)
+
+    n_slots : int
+        Number of time slots per lift (second axis of slots)
+
+    slots : npArray int32 (n_lifts x n_slots)
+        The handle stored in each slot. 0 means the slot is free. May be a
+        read-only view (e.g, of a memory-mapped year), copied on the first 
+        change.
+
+    handles : dict {str : int}
+        Maps reservation IDs to their handle
+
+    ids : dict {int : str}
+        Maps handles back to reservation IDs
+
+    Methods
+    -------
+    fill(lift, s, e, ID) -> None
+        Write ID into slots [s, e) of lift
+
+    clear(ID, span=None) -> None
+        Free every slot holding ID (only those in span, if it is known)
+
+    find(ID) -> int
+        Return the first lift holding ID
+
+    free(ignore=None) -> npArray (bool)
+        Mask of the free slots
+
+    fit_gaps(s, e, ignore=None) -> (npArray, npArray, npArray)
+        For every lift: does [s, e) fit, and the free gaps on either side
+
+    best_lift(s, e, ignore=None) -> int
+        The lift where [s, e) fits most snugly, or -1
+
+    spans() -> dict {str : (int, int, int)}
+        (lift, start, end) of every reservation in the grid
+
+    rebuild(placements) -> None
+        Refill the grid from {ID: (lift, start, end)}
+
+    to_id_array() -> npArray (object)
+        The grid expressed with reservation IDs (None for free slots)
+
+    @classmethod
+    from_id_array(id_array) -> SlotGrid
+        Build a grid from an object array of IDs (the legacy format)
+    '''
+
+    FREE = 0
+
+    def __init__(self, n_lifts, n_slots=24, slots=None, ids=None):
+        '''
+        Parameters
+        ----------
+        n_lifts : int
+
+        n_slots : int, optional
+            Defaults to one slot per hour.
+
+        slots : 2d ndarray of ints, optional
+
+        ids : dict {int : str}, optional
+            Handle table matching slots
+        '''
+        if slots is not None:
+            self.slots = np.asarray(slots, dtype=np.int32)
+        else:
+            self.slots = np.zeros((n_lifts, n_slots), dtype=np.int32)
+
+        self.n_lifts, self.n_slots = self.slots.shape
+
+        if ids is not None:
+            self.ids = dict(ids)
+        else:
+            self.ids = {}
+
+        self.handles = {ID: h for h, ID in self.ids.items()}
+        self._next_handle = max(self.ids, default=0) + 1
+
+
+    def handle_of(self, ID: str) -> int:
+        '''
+        Return the handle of ID, allocating a new one if needed
+        '''
+        h = self.handles.get(ID)
+
+        if h is None:
+            h = self._next_handle
+            self._next_handle += 1
+            self.handles[ID] = h
+            self.ids[h] = ID
+
+        return h
+
+
+    def _own_slots(self) -> None:
+        # Copy slots before the first change if they are a read-only view
+        if not self.slots.flags.writeable:
+            self.slots = self.slots.copy()
+
+
+    def fill(self, lift: int, s: int, e: int, ID: str) -> None:
+        '''
+        Write ID into slots [s, e) of lift
+        '''
+        self._own_slots()
+        self.slots[lift, s:e] = self.handle_of(ID)
+
+
+    def clear(self, ID: str, span=None) -> None:
+        '''
+        Free every slot holding ID and forget its handle. If the (lift, 
+        start, end) span holding ID is given, only that span is cleared, 
+        instead of searching the whole grid.
+        '''
+        h = self.handles.pop(ID, None)
+
+        if h is None:
+            return
+
+        del self.ids[h]
+        self._own_slots()
+        if span is not None:
+            lift, s, e = span
+            self.slots[lift, s:e] = self.FREE
+        else:
+            self.slots[self.slots == h] = self.FREE
+
+
+    def find(self, ID: str) -> int:
+        '''
+        Return the first lift holding ID. Raises IndexError if ID is not
+        in the grid
+        '''
+        h = self.handles.get(ID, -1)
+        return np.where(self.slots == h)[0][0]
+
+
+    def free(self, ignore=None) -> np.ndarray:
+        '''
+        Return a boolean mask (n_lifts x n_slots), True where slots are free.
+        Slots holding the ID 'ignore' also count as free.
+        '''
+        free = self.slots == self.FREE
+
+        if ignore in self.handles:
+            free |= self.slots == self.handles[ignore]
+
+        return free
+
+
+    def fit_gaps(self, s: int, e: int, ignore=None):
+        '''
+        Check slots [s, e) on every lift at once. Slots holding the ID
+        'ignore' count as free.
+
+        Returns
+        -------
+        fits : npArray (bool)
+            True for lifts where every slot in [s, e) is free
+        d1 : npArray (int)
+            Distance from s back to the nearest occupied slot (or slot 0)
+        d2 : npArray (int)
+            Distance from e to the nearest occupied slot (or the last slot)
+        '''
+        occupied = ~self.free(ignore)
+        idx = np.arange(self.n_slots)
+        fits = ~occupied[:, s:e].any(axis=1)
+
+        # Last occupied slot before s, and first occupied slot from e onward.
+        # Clamped to the grid edges, as if the walk stopped there.
+        if s > 0:
+            last = (occupied[:, :s] * idx[:s]).max(axis=1)
+        else:
+            last = np.zeros(self.n_lifts, dtype=int)
+
+        if e < self.n_slots:
+            first = np.where(occupied[:, e:], idx[e:], self.n_slots - 1).min(axis=1)
+        else:
+            first = np.full(self.n_lifts, self.n_slots - 1)
+
+        return fits, s - last, first - e
+
+
+    def best_lift(self, s: int, e: int, ignore=None) -> int:
+        '''
+        Return the lift where [s, e) fits leaving the smallest gaps, or -1
+        if it fits in none. Slots holding the ID 'ignore' count as free.
+        '''
+        fits, d1, d2 = self.fit_gaps(s, e, ignore=ignore)
+
+        if not fits.any():
+            return -1
+
+        # Score every lift. Lifts that don't fit can never be the minimum.
+        # argmin picks the first best lift, as the old per-lift loop did.
+        # Gaps are in slots, so the day's length is 2 * n_slots half-slots
+        # (48 when hourly).
+        width = 2 * self.n_slots
+        score = (d1 - (d1**2)/width )  + (d2 - (d2**2)/width )
+        score[~fits] = np.inf
+
+        return int(np.argmin(score))
+
+
+    def spans(self) -> dict:
+        '''
+        Return {ID: (lift, start, end)} for every reservation in the grid.
+        Each reservation fills one contiguous run of slots on one lift.
+        '''
+        lifts, cols = np.nonzero(self.slots)
+        handles, first, counts = np.unique(self.slots[lifts, cols], return_index=True,
+                                           return_counts=True)
+
+        return {self.ids[h]: (int(lifts[i]), int(cols[i]), int(cols[i] + n))
+                for h, i, n in zip(handles.tolist(), first.tolist(), counts.tolist())}
+
+
+    def rebuild(self, placements: dict) -> None:
+        '''
+        Empty the grid and write each ID into its placement. IDs in the grid
+        but not in placements are forgotten.
+
+        Parameters
+        ----------
+        placements : dict {str : (int, int, int)}
+            {ID: (lift, start, end)}
+        '''
+        for ID in set(self.handles) - set(placements):
+            self.clear(ID)
+
+        slots = np.zeros_like(self.slots)
+        for ID, (lift, s, e) in placements.items():
+            slots[lift, s:e] = self.handle_of(ID)
+
+        self.slots = slots
+
+
+    def to_id_array(self) -> np.ndarray:
+        '''
+        Return the grid as an object array of IDs, None for free slots
+        '''
+        # Snapshot slots, then ids, then the handle count, so a reader that
+        # doesn't hold the day's lock can't see a handle without room for
+        # it (fill registers a handle before writing it). A handle cleared
+        # meanwhile reads as free.
+        slots = self.slots.copy()
+        ids = dict(self.ids)
+        lookup = np.full(self._next_handle, None, dtype=object)
+        for h, ID in ids.items():
+            lookup[h] = ID
+
+        return lookup[slots]
+
+
+    @classmethod
+    def from_id_array(self, id_array: np.ndarray):
+        '''
+        Build a grid from an object array of IDs (None for free slots), as
+        stored by older versions of Day
+        '''
+        handles = {}
+        slots = np.zeros(id_array.shape, dtype=np.int32)
+
+        for (lift, slot), ID in np.ndenumerate(id_array):
+            if ID is not None:
+                slots[lift, slot] = handles.setdefault(ID, len(handles) + 1)
+
+        return self(*id_array.shape, slots=slots,
+                    ids={h: ID for ID, h in handles.items()})
+
+
+class BitGrid(SlotGrid):
+    '''
+    SlotGrid that also keeps each lift's occupancy as a bitmask (a Python
+    int, bit i set if slot i is taken), so best_lift tests a lift with one
+    AND and finds the neighbouring reservations with bit tricks, instead of
+    building NumPy arrays. Fastest for few lifts; the handle grid (slots) is
+    kept in step, so everything else works as in SlotGrid.
+
+    Attributes
+    ----------
+    masks : list [int]
+        Occupancy bitmask of each lift
+
+    res_masks : dict {str : (int, int)}
+        (lift, bitmask) of each reservation, for ignoring it when modifying
+    '''
+
+    def __init__(self, n_lifts, n_slots=24, slots=None, ids=None):
+        super().__init__(n_lifts, n_slots, slots, ids)
+        self._remask()
+
+
+    def _remask(self) -> None:
+        # Rebuild every mask from the handle grid
+        self.masks = [0] * self.n_lifts
+        self.res_masks = {}
+
+        for ID, (lift, s, e) in self.spans().items():
+            mask = (1 << e) - (1 << s)
+            self.masks[lift] |= mask
+            self.res_masks[ID] = (lift, mask)
+
+
+    def fill(self, lift: int, s: int, e: int, ID: str) -> None:
+        super().fill(lift, s, e, ID)
+        mask = (1 << e) - (1 << s)
+        self.masks[lift] |= mask
+        self.res_masks[ID] = (lift, mask)
+
+
+    def clear(self, ID: str, span=None) -> None:
+        super().clear(ID, span)
+        if ID in self.res_masks:
+            lift, mask = self.res_masks.pop(ID)
+            self.masks[lift] &= ~mask
+
+
+    def rebuild(self, placements: dict) -> None:
+        super().rebuild(placements)
+        self._remask()
+
+
+    def best_lift(self, s: int, e: int, ignore=None) -> int:
+        '''
+        Same result as SlotGrid.best_lift, computed on the lift bitmasks
+        '''
+        request = (1 << e) - (1 << s)
+        below = (1 << s) - 1
+        width = 2 * self.n_slots
+        last_slot = self.n_slots - 1
+        ignore_lift, ignore_mask = self.res_masks.get(ignore, (-1, 0))
+
+        best, best_score = -1, None
+        for lift, mask in enumerate(self.masks):
+            if lift == ignore_lift:
+                mask &= ~ignore_mask
+            if mask & request:
+                continue
+
+            # Nearest taken slot before s (its highest bit), or slot 0
+            before = mask & below
+            d1 = s - (before.bit_length() - 1 if before else 0)
+
+            # Nearest taken slot from e on (its lowest bit), clamped to the
+            # last slot
+            after = mask >> e
+            first = e + (after & -after).bit_length() - 1 if after else last_slot
+            d2 = min(first, last_slot) - e
+
+            score = (d1 - (d1**2)/width ) + (d2 - (d2**2)/width )
+            if best_score == None or score < best_score:
+                best, best_score = lift, score
+
+        return best
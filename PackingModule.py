@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Offline lift assignment: re-pack a whole day's reservations into its lifts.
+
+Lifts are machines and reservations are intervals, so this is interval
+partitioning (colouring an interval graph). Interval graphs are perfect: a
+day's reservations fit into n lifts exactly when no time slot is booked more
+than n times, however the greedy online placement has spread them.
+
+@author: tanne
+"""
+import heapq
+import numpy as np
+
+
+class LiftPacker():
+    '''
+    Static class for re-assigning reservations to lifts.
+
+    Methods
+    -------
+    fits(occupied: npArray (bool), s: int, e: int) -> bool
+        Could [s, e) be added to the day if reservations were moved between
+        lifts?
+
+    assign(spans: dict, n_lifts: int) -> dict | None
+        Assign every reservation a lift, preferring the lift it is in.
+        None if they can't all fit.
+    '''
+
+    @staticmethod
+    def fits(occupied: np.ndarray, s: int, e: int) -> bool:
+        '''
+        Return True if [s, e) can be added to a day whose occupied slots are
+        given (n_lifts x n_slots), allowing every reservation to change lift.
+
+        Parameters
+        ----------
+        occupied : npArray (bool)
+            True for each booked slot
+        s, e : int
+            Slots requested, [s, e)
+        '''
+        booked = occupied.sum(0)
+        return bool((booked[s:e] < occupied.shape[0]).all())
+
+
+    @staticmethod
+    def assign(spans: dict, n_lifts: int):
+        '''
+        Assign each reservation a lift so none overlap, with a sweep over
+        start times (O(n log n)). A reservation keeps its current lift when
+        that lift is free at its start, so few reservations move.
+
+        Parameters
+        ----------
+        spans : dict {str : (int | None, int, int)}
+            {ID: (current lift or None, start, end)}
+        n_lifts : int
+
+        Returns
+        -------
+        dict {str : (int, int, int)} | None
+            {ID: (lift, start, end)}, or None if more than n_lifts
+            reservations overlap at some time
+        '''
+        busy = []                   # (end, lift) of lifts in use
+        free = list(range(n_lifts)) # heap of free lifts (may hold stale entries)
+        is_free = [True] * n_lifts
+        placements = {}
+
+        for ID, (current, s, e) in sorted(spans.items(), key=lambda item: item[1][1:]):
+            # Free every lift whose reservation has ended by s
+            while busy and busy[0][0] <= s:
+                lift = heapq.heappop(busy)[1]
+                is_free[lift] = True
+                heapq.heappush(free, lift)
+
+            if current != None and current < n_lifts and is_free[current]:
+                lift = current
+            else:
+                while free and not is_free[free[0]]:
+                    heapq.heappop(free)
+                if not free:
+                    return None
+                lift = heapq.heappop(free)
+
+            is_free[lift] = False
+            heapq.heappush(busy, (e, lift))
+            placements[ID] = (lift, s, e)
+
+        return placements
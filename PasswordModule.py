@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Salted password hashing & verification for accounts.
+
+@author: tanne
+"""
+import base64
+import collections
+import concurrent.futures
+import hashlib
+import hmac
+import os
+import threading
+
+
+class PasswordHasher():
+    '''
+    Static class for hashing & checking account passwords. A hash is stored
+    as one string, holding everything needed to check it:
+
+        scrypt$16384$<salt>$<hash>            (cost = n; r = 8, p = 1)
+        pbkdf2_sha256$600000$<salt>$<hash>    (cost = iterations)
+
+    (salt & hash in unpadded base64). Strings in any other form are
+    passwords saved in plain text by older versions: they still verify, and
+    needs_rehash() is True for them.
+
+    Hashing is slow on purpose. Successful verifications are remembered (by
+    a keyed digest of the hash & password, never the password itself), so
+    repeated logins within a session are cheap; changing the password
+    changes the hash, which drops the entry. verify_async runs verification
+    on a small thread pool, which also caps how many hashes (and how much
+    scrypt memory) are in use at once; AccountManager checks passwords
+    through it. hashlib releases the GIL while hashing, so other threads 
+    keep running.
+
+    Attributes
+    ----------
+    scheme : str
+        Scheme of new hashes, one of SCHEMES
+
+    cost : int
+        Cost of new hashes: scrypt's n (a power of 2), or PBKDF2's
+        iterations
+
+    workers : int
+        Threads in verify_async's pool
+
+    cache_size : int
+        Successful verifications remembered. 0 turns the cache off.
+
+    Methods
+    -------
+    configure(scheme=None, cost=None, workers=None, cache_size=None) -> None
+        Change the settings. Existing hashes keep verifying.
+
+    hash(password: str) -> str
+
+    is_hash(stored: str) -> bool
+        Is stored a hash (rather than a plain text password)?
+
+    verify(password: str, stored: str) -> bool
+
+    verify_async(password: str, stored: str) -> Future [bool]
+        verify on the thread pool
+
+    needs_rehash(stored: str) -> bool
+        Is stored plain text, or hashed with other settings than the
+        current ones?
+
+    clear_cache() -> None
+    '''
+
+    SCHEMES = ('scrypt', 'pbkdf2_sha256')
+    DEFAULT_COST = {'scrypt': 2 ** 14, 'pbkdf2_sha256': 600000}
+    SALT_BYTES = 16
+    HASH_BYTES = 32
+
+    scheme = 'scrypt'
+    cost = DEFAULT_COST['scrypt']
+    workers = min(4, os.cpu_count() or 1)
+    cache_size = 1024
+
+    _cache = collections.OrderedDict()
+    _cache_key = os.urandom(32)
+    _lock = threading.Lock()
+    _executor = None
+
+    @classmethod
+    def configure(self, scheme=None, cost=None, workers=None, cache_size=None) -> None:
+        '''
+        Change the settings. A new scheme without a cost uses its default
+        cost. Raises ValueError for an unknown scheme or a bad cost.
+        '''
+        if scheme != None:
+            if scheme not in self.SCHEMES:
+                raise ValueError(f'Unknown password scheme "{scheme}"; use one of {self.SCHEMES}')
+            if cost == None:
+                cost = self.DEFAULT_COST[scheme]
+        else:
+            scheme = self.scheme
+
+        if cost != None:
+            cost = int(cost)
+            if cost < 1 or (scheme == 'scrypt' and (cost < 2 or cost & (cost - 1))):
+                raise ValueError(f'Bad cost {cost} for {scheme}: scrypt needs a power of 2 '
+                                 'above 1, PBKDF2 a positive number of iterations')
+            self.scheme, self.cost = scheme, cost
+
+        with self._lock:
+            if workers != None and workers != self.workers:
+                self.workers = int(workers)
+                if self._executor != None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+            if cache_size != None:
+                self.cache_size = int(cache_size)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+
+    @classmethod
+    def hash(self, password: str) -> str:
+        '''
+        Return a salted hash of password, with the current settings
+        '''
+        salt = os.urandom(self.SALT_BYTES)
+        digest = self._derive(self.scheme, self.cost, password, salt)
+        return '$'.join([self.scheme, str(self.cost), self._b64(salt), self._b64(digest)])
+
+
+    @classmethod
+    def is_hash(self, stored: str) -> bool:
+        '''
+        Return True if stored is a hash made by hash()
+        '''
+        return self._parse(stored) != None
+
+
+    @classmethod
+    def verify(self, password: str, stored: str) -> bool:
+        '''
+        Return True if password matches stored (a hash, or an older plain
+        text password)
+        '''
+        parsed = self._parse(stored)
+        if parsed == None:
+            return hmac.compare_digest(password.encode(), str(stored).encode())
+
+        key = self._key(password, stored)
+        if self._remembered(key):
+            return True
+
+        scheme, cost, salt, digest = parsed
+        if not hmac.compare_digest(self._derive(scheme, cost, password, salt), digest):
+            return False
+
+        with self._lock:
+            if self.cache_size > 0:
+                self._cache[key] = True
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return True
+
+
+    @classmethod
+    def verify_async(self, password: str, stored: str):
+        '''
+        Run verify on the thread pool, returning a Future of its result. A
+        remembered verification completes at once, without the pool.
+        '''
+        if self._remembered(self._key(password, stored)):
+            future = concurrent.futures.Future()
+            future.set_result(True)
+            return future
+
+        with self._lock:
+            if self._executor == None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='password')
+            executor = self._executor
+
+        return executor.submit(self.verify, password, stored)
+
+
+    @classmethod
+    def needs_rehash(self, stored: str) -> bool:
+        '''
+        Return True if stored is plain text, or a hash with another scheme
+        or cost than the current settings
+        '''
+        parsed = self._parse(stored)
+        return parsed == None or parsed[:2] != (self.scheme, self.cost)
+
+
+    @classmethod
+    def clear_cache(self) -> None:
+        '''
+        Forget every remembered verification
+        '''
+        with self._lock:
+            self._cache.clear()
+
+
+    @classmethod
+    def _key(self, password: str, stored: str) -> bytes:
+        # Cache key of a verification: a keyed digest, never the password
+        return hmac.new(self._cache_key, f'{stored}\0{password}'.encode(), 'sha256').digest()
+
+
+    @classmethod
+    def _remembered(self, key: bytes) -> bool:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return True
+        return False
+
+
+    @classmethod
+    def _derive(self, scheme: str, cost: int, password: str, salt: bytes) -> bytes:
+        if scheme == 'scrypt':
+            # maxmem: scrypt needs 128 * r * n bytes, more than OpenSSL's
+            # default limit from n = 2 ** 15
+            return hashlib.scrypt(password.encode(), salt=salt, n=cost, r=8, p=1,
+                                  maxmem=256 * 8 * cost + 2 ** 20, dklen=self.HASH_BYTES)
+        else:
+            return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, cost,
+                                       dklen=self.HASH_BYTES)
+
+
+    @classmethod
+    def _parse(self, stored):
+        # (scheme, cost, salt, hash) of a hash string, or None
+        parts = stored.split('$') if isinstance(stored, str) else []
+        if len(parts) != 4 or parts[0] not in self.SCHEMES or not parts[1].isdigit():
+            return None
+
+        try:
+            return parts[0], int(parts[1]), self._unb64(parts[2]), self._unb64(parts[3])
+        except ValueError:
+            return None
+
+
+    @staticmethod
+    def _b64(data: bytes) -> str:
+        return base64.b64encode(data).decode().rstrip('=')
+
+
+    @staticmethod
+    def _unb64(text: str) -> bytes:
+        return base64.b64decode(text + '=' * (-len(text) % 4), validate=True)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Versioned record format of a reservation file, with a fast parser for it and
+a reader for the older text files.
+
+@author: tanne
+"""
+import json
+
+
+class ResFormat():
+    '''
+    Static class for the reservation file format. A file holds one JSON
+    object on one line:
+
+        {"v": 1, "ID": "Ab3", "owner": "bob", "day": 3, "start": 4.0,
+         "end": 8.0, "active": true}
+
+    Files from older versions hold Res.toString() instead (lines of
+    'Key: value'), and are told apart by not starting with '{'. They are
+    read as version 0, and rewritten in the current format when next saved.
+
+    Methods
+    -------
+    encode(c_res: Res) -> bytes
+
+    decode(data: bytes, filename) -> dict
+        The reservation record (ID, owner, day, start, end, active), from
+        either format
+
+    decode_text(text: str, filename) -> dict
+        The record of an older text file
+    '''
+
+    VERSION = 1
+    FIELDS = frozenset(('ID', 'owner', 'day', 'start', 'end', 'active'))
+
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    _decoder = json.JSONDecoder()
+
+    @classmethod
+    def encode(self, c_res) -> bytes:
+        '''
+        Return c_res as a one-line record
+        '''
+        record = {'v': self.VERSION,
+                  'ID': str(c_res.ID),
+                  'owner': str(c_res.owner),
+                  'day': int(c_res.day),
+                  'start': float(c_res.start),
+                  'end': float(c_res.end),
+                  'active': bool(c_res.active)}
+        return self._encoder.encode(record).encode()
+
+
+    @classmethod
+    def decode(self, data: bytes, filename) -> dict:
+        '''
+        Turn the contents of a reservation file (either format) into a
+        record. Raises ValueError if it is neither.
+        '''
+        text = data.decode()
+        if not text.startswith('{'):
+            return self.decode_text(text, filename)
+
+        record, end = self._decoder.raw_decode(text)
+        if record.pop('v', None) != self.VERSION or record.keys() != self.FIELDS:
+            raise ValueError(f'Reservation "{filename}" is not in a known format')
+
+        return record
+
+
+    @classmethod
+    def decode_text(self, text: str, filename) -> dict:
+        '''
+        Parse an older text file (Res.toString()) into a record. Keys are
+        matched in any case; the ID & owner keep theirs.
+        '''
+        fields = {}
+        for line in text.splitlines():
+            if line.strip():
+                key, _, value = line.partition(':')
+                fields[key.strip().lower()] = value.strip()
+
+        try:
+            start, end = fields['times'].strip('()').split(',')
+            return {'ID': fields['id'],
+                    'owner': fields['owner'],
+                    'day': int(fields['day']),
+                    'start': float(start),
+                    'end': float(end),
+                    'active': fields['active'].lower() == 'true'}
+        except (KeyError, ValueError):
+            raise ValueError(f'Reservation "{filename}" is not in a known format')
+
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio server exposing ReservationsAPI to many clients (e.g. booking
+kiosks) over TCP, with one JSON object per line each way.
+
+Usage: python ReservationServer.py [--host HOST] [--port N] [--storage SPEC]
+                                   [--workers N] [--repack]
+    where SPEC is 'files:<root directory>' (default 'files:.'), 'sqlite:<db path>',
+    'year:<root directory>' or 'journal:<root directory>'
+
+Requests name an operation and its arguments, plus an optional id that is
+echoed back (responses to requests sent without waiting may come back out of
+order):
+    {"id": 1, "op": "create", "ID": "ab", "owner": "bob", "day": 3, "start": 4, "end": 8}
+    {"id": 1, "ok": true, "result": true}
+    {"id": 2, "ok": false, "error": "Reservation \"zz\" not found"}
+
+Operations (optional arguments in brackets):
+    create  ID owner day start end -> bool (also added to owner's account)
+    get     ID -> reservation {ID, owner, day, start, end, active}
+    cancel  ID -> true
+    modify  ID day start end -> bool
+    find    duration [first_day last_day earliest latest n] -> [[day, start, lift]]
+    availability [first_day last_day] -> [[day, longest free hours, free hours]]
+    owner   owner [first_day last_day active] -> [reservation]
+    login   username password -> bool
+
+@author: tanne
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import signal
+from AccountModule import AccountManager
+from GarageModule import GarageManager
+from ImportReservations import ReservationImporter
+from MigrateStorage import StorageMigrator
+from ReservationsAPI import ReservationsAPI
+from TimeUtilities import TimeRange
+
+
+class ReservationNotFound(Exception):
+    '''
+    A get, cancel or modify request named a reservation that does not exist
+    '''
+
+
+class ReservationServer():
+    '''
+    Serves ReservationsAPI over TCP, one JSON request & response per line.
+    Runs on one asyncio event loop; each call into ReservationsAPI (which
+    reads & writes storage) runs on a thread pool, so the loop keeps
+    serving other clients meanwhile.
+
+    Requests that change a day wait for that day's asyncio lock, so
+    requests for the same day run one at a time (instead of tying up pool
+    threads waiting on the day's storage lock), while requests for other
+    days run in parallel. The storage locks taken by ReservationsAPI still
+    guard against double-booking, e.g. when a reservation moved days
+    between its lookup & its change, or other processes write too.
+
+    Attributes
+    ----------
+    host : str
+
+    port : int
+        0 picks a free port; the actual one is set once started
+
+    workers : int
+        Threads in the pool running ReservationsAPI calls
+
+    max_pending : int
+        Requests of one connection in progress at once. Further requests
+        wait, so a client can't queue unbounded work.
+
+    Methods
+    -------
+    start() -> None  (coroutine)
+        Start listening
+
+    serve_forever() -> None  (coroutine)
+        Start (if needed) and serve until cancelled
+
+    close() -> None  (coroutine)
+        Stop listening & shut the thread pool down
+
+    handle(request: dict) -> dict  (coroutine)
+        Run one request, returning its response
+    '''
+
+    OPERATIONS = ('create', 'get', 'cancel', 'modify', 'find', 'availability', 'owner',
+                  'login')
+
+    def __init__(self, host='127.0.0.1', port=8765, workers=8, max_pending=32):
+        '''
+        Parameters
+        ----------
+        host : str, optional
+
+        port : int, optional
+            0 picks a free port
+
+        workers : int, optional
+            Threads running ReservationsAPI calls
+
+        max_pending : int, optional
+            Requests of one connection in progress at once
+        '''
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='reservations')
+        self._day_locks = {}
+        self._server = None
+
+
+    async def start(self) -> None:
+        '''
+        Start listening on host & port
+        '''
+        self._server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+
+    async def serve_forever(self) -> None:
+        '''
+        Start listening if needed, and serve until cancelled
+        '''
+        if self._server == None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+
+    async def close(self) -> None:
+        '''
+        Stop accepting clients, and wait for running calls to finish
+        '''
+        if self._server != None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+
+
+    async def _serve_client(self, reader, writer) -> None:
+        # Read requests & start each as it arrives; responses are written as
+        # they finish
+        slots = asyncio.Semaphore(self.max_pending)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Over the stream limit. The rest of the line can't be
+                    # told apart from the next request, so answer & stop
+                    await self._send({'ok': False, 'error': 'Request line too long'},
+                                     writer, write_lock)
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+
+                await slots.acquire()
+                task = asyncio.ensure_future(self._respond(line, writer, write_lock))
+                task.add_done_callback(lambda task: slots.release())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass # Client went away
+        finally:
+            # Requests in progress still change storage: let them finish &
+            # answer (if the client is still there) before closing
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+    async def _respond(self, line: bytes, writer, write_lock) -> None:
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            response = {'ok': False, 'error': f'Malformed request: {error!r}'}
+        else:
+            response = await self.handle(request)
+
+        await self._send(response, writer, write_lock)
+
+
+    @staticmethod
+    async def _send(response: dict, writer, write_lock) -> None:
+        # Concurrent drain() calls aren't allowed before Python 3.10
+        async with write_lock:
+            with contextlib.suppress(ConnectionError):
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+
+
+    async def handle(self, request: dict) -> dict:
+        '''
+        Run one request {"op": ..., arguments, optional "id"}. Returns
+        {"id", "ok": True, "result"} or {"id", "ok": False, "error"}.
+        '''
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': 'A request must be a JSON object'}
+
+        response = {'id': request['id']} if 'id' in request else {}
+        op = request.get('op')
+        try:
+            if op not in self.OPERATIONS:
+                raise ValueError(f'Unknown op "{op}"; use one of {", ".join(self.OPERATIONS)}')
+            result = await getattr(self, f'_op_{op}')(request)
+        except (KeyError, TypeError, ValueError) as error:
+            response.update(ok=False, error=f'Bad request: {error!r}')
+        except ReservationNotFound as error:
+            response.update(ok=False, error=str(error))
+        except Exception as error:
+            response.update(ok=False, error=f'Internal error: {error!r}')
+        else:
+            response.update(ok=True, result=result)
+
+        return response
+
+
+    async def _call(self, func, *args):
+        # Run a blocking ReservationsAPI call on the thread pool
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+
+    async def _get_res(self, ID: str):
+        # The reservation named ID. Other storage errors are not "not found"
+        try:
+            return await self._call(ReservationsAPI.get_res_from_file, ID)
+        except FileNotFoundError:
+            raise ReservationNotFound(f'Reservation "{ID}" not found') from None
+
+
+    @contextlib.asynccontextmanager
+    async def _lock_days(self, *days):
+        # Hold the asyncio locks of days, taken in sorted order (no deadlocks)
+        locks = [self._day_locks.setdefault(day, asyncio.Lock()) for day in sorted(set(days))]
+        async with contextlib.AsyncExitStack() as stack:
+            for lock in locks:
+                await stack.enter_async_context(lock)
+            yield
+
+
+    @staticmethod
+    def _res_record(c_res) -> dict:
+        return {'ID': c_res.ID, 'owner': c_res.owner, 'day': int(c_res.day),
+                'start': float(c_res.start), 'end': float(c_res.end),
+                'active': bool(c_res.active)}
+
+
+    @staticmethod
+    def _days(request: dict) -> tuple:
+        # (first_day, last_day) of a request, 0-365 by default
+        first_day = int(request.get('first_day', 0))
+        last_day = int(request.get('last_day', 365))
+        if not 0 <= first_day <= last_day <= 365:
+            raise ValueError(f'Days {first_day}-{last_day} are not a range within 0-365')
+        return first_day, last_day
+
+
+    @staticmethod
+    def _time_range(request: dict) -> TimeRange:
+        start, end = float(request['start']), float(request['end'])
+        if not 0 <= start < end <= 24:
+            raise ValueError(f'Times {start:g}-{end:g} are not a range within 0-24')
+        return TimeRange(start=start, end=end)
+
+
+    async def _op_create(self, request: dict) -> bool:
+        ID, owner, day, tRange = ReservationImporter.parse_fields(request)
+        async with self._lock_days(day):
+            created = await self._call(ReservationsAPI.try_create_many, [(ID, owner, day, tRange)])
+        return created[0]
+
+
+    async def _op_get(self, request: dict) -> dict:
+        c_res = await self._get_res(str(request['ID']))
+        return self._res_record(c_res)
+
+
+    async def _op_cancel(self, request: dict) -> bool:
+        ID = str(request['ID'])
+        c_res = await self._get_res(ID)
+        async with self._lock_days(int(c_res.day)):
+            await self._call(ReservationsAPI.cancel_res, ID)
+        return True
+
+
+    async def _op_modify(self, request: dict) -> bool:
+        ID, day = str(request['ID']), int(request['day'])
+        if not 0 <= day <= 365:
+            raise ValueError(f'Day {day} is not in 0-365')
+        tRange = self._time_range(request)
+
+        c_res = await self._get_res(ID)
+        async with self._lock_days(int(c_res.day), day):
+            return await self._call(ReservationsAPI.try_modify_res, ID, day, tRange)
+
+
+    async def _op_find(self, request: dict) -> list:
+        first_day, last_day = self._days(request)
+        found = await self._call(ReservationsAPI.find_available, float(request['duration']),
+                                 first_day, last_day, float(request.get('earliest', 0)),
+                                 float(request.get('latest', 24)), int(request.get('n', 5)))
+        return [[day, start, lift] for day, start, lift in found]
+
+
+    async def _op_availability(self, request: dict) -> list:
+        summaries = await self._call(ReservationsAPI.list_availability, *self._days(request))
+        return [[day, summary.longest_hours(), summary.free_hours()]
+                for day, summary in summaries]
+
+
+    async def _op_owner(self, request: dict) -> list:
+        active = request.get('active')
+        if active not in (None, True, False):
+            raise ValueError(f'active should be true, false or null, not {active!r}')
+
+        reservations = await self._call(ReservationsAPI.list_res_of_owner,
+                                        str(request['owner']), *self._days(request), active)
+        return [self._res_record(c_res) for c_res in reservations]
+
+
+    async def _op_login(self, request: dict) -> bool:
+        c_account = await self._call(AccountManager.authenticate, str(request['username']),
+                                     str(request['password']))
+        return c_account != None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve ReservationsAPI as JSON lines over TCP')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on (default 8765)')
+    parser.add_argument('--storage', default='files:.',
+                        help="'files:<root>' (default 'files:.'), 'sqlite:<path>', "
+                             "'year:<root>' or 'journal:<root>'")
+    parser.add_argument('--workers', type=int, default=8,
+                        help='threads running storage calls (default 8)')
+    parser.add_argument('--repack', action='store_true',
+                        help='when a reservation fits no single lift, move others between '
+                             'lifts to make room')
+    args = parser.parse_args()
+
+    GarageManager.repack_when_full = args.repack
+
+    backend = StorageMigrator.open_backend(args.storage)
+    ReservationsAPI.use_storage(backend)
+    server = ReservationServer(args.host, args.port, args.workers)
+
+    async def main():
+        # Stop on Ctrl-C or SIGTERM, closing the storage backend after
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError): # Windows
+                asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+
+        await server.start()
+        print(f'Serving on {server.host}:{server.port}', flush=True)
+        try:
+            await stop.wait()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    backend.close()
@@ -1,7 +1,10 @@
-import os
+import contextlib
+from AccountModule import AccountManager
 from ReservationsModule import Res, ResManager
 from TimeUtilities import TimeRange
 from GarageModule import GarageManager, Day
+from StorageModule import Storage
+from TransactionModule import UnitOfWork
 
 class ReservationsAPI():
     '''
@@ -12,6 +15,10 @@ class ReservationsAPI():
     attempt_create_res(ID: str, owner: str, day: int, rRange: TimeRange) -> Res
         Create and save a new Res instance / file. Fill appropriate 
         timeslots in 'days'
+        
+    try_create_many(requests: list [(ID, owner, day, tRange)]) -> list [bool]
+        Create many reservations at once, loading & saving each day, 
+        reservation & account once. Returns whether each was created.
     
     query_res_exists(ID: str) -> bool:
         Query if the reservation exists.
@@ -46,6 +53,22 @@ class ReservationsAPI():
     
     query_if_available(day, tRange):
         Check if a time range is available on a certain day.
+        
+    find_available(duration, first_day, last_day, earliest, latest, n) -> list
+        The first n (day, start hour, lift) where duration hours are free.
+        
+    list_availability(first_day, last_day) -> list [(int, DayAvailability)]
+        Free-time summary of every day in a range, without loading the days.
+        
+    list_res_of_owner(owner, first_day=0, last_day=365, active=None) -> list [Res]
+        List the reservations belonging to owner, optionally only those on 
+        some days, or only active (or cancelled) ones.
+        
+    use_storage(backend) -> None
+        Switch all managers to a storage backend (see StorageModule).
+        
+    transaction() -> context manager
+        Commit every change made inside the block at once, or none of them.
     
     '''
     @staticmethod
@@ -77,19 +100,93 @@ class ReservationsAPI():
             A new reservation instance.
         
         '''
-        if GarageManager.check_if_available(day, tRange=tRange):
-            c_res = ResManager.create_res(ID, owner, day, tRange, filename=filename)
-            GarageManager.write_res(c_res)
-            return True
-        else:
-            return False
+        with ReservationsAPI.transaction():
+            GarageManager.lock_days(day)
+            if GarageManager.check_if_available(day, tRange=tRange):
+                c_res = ResManager.create_res(ID, owner, day, tRange, filename=filename)
+                GarageManager.write_res(c_res)
+                return True
+            else:
+                return False
+    
+    @staticmethod
+    def try_create_many(requests, add_to_accounts=True) -> list:
+        '''
+        Create many reservations in one transaction. Requests are grouped by 
+        day, so each day is loaded, filled (in request order) and saved 
+        once. A request fails if its time range is unavailable, or if its
+        ID already exists or appears earlier in the batch.
+        
+        Parameters
+        ----------
+        requests : iterable [(ID: str, owner: str, day: int, tRange: TimeRange)]
+        
+        add_to_accounts : bool
+            Also add each created reservation to its owner's account, if the
+            owner has one (each account is saved once).
+            
+        Returns
+        --------
+        list [bool]
+            Whether each request was created, in the order given
+        '''
+        requests = list(requests)
+        created = [False] * len(requests)
+        
+        with ReservationsAPI.transaction():
+            # Group new, unique requests by day
+            by_day = {}
+            seen = set()
+            for i, (ID, owner, day, tRange) in enumerate(requests):
+                # Reservation files are named by lower-cased ID
+                key = ID.lower()
+                if key in seen or ResManager.res_exists(key):
+                    continue
+                seen.add(key)
+                by_day.setdefault(day, []).append((i, Res(ID, owner, day, tRange)))
+            
+            GarageManager.lock_days(*by_day)
+            
+            for day, entries in by_day.items():
+                written = GarageManager.write_many(day, [c_res for i, c_res in entries])
+                for (i, c_res), ok in zip(entries, written):
+                    if ok:
+                        ResManager.save_res(c_res)
+                        created[i] = True
+            
+            if add_to_accounts:
+                ReservationsAPI._add_to_accounts\
+                    ([requests[i][:2] for i in range(len(requests)) if created[i]])
+        
+        return created
+    
+    
+    @staticmethod
+    def _add_to_accounts(res_owners: list) -> None:
+        '''
+        Append each (ID, owner) to the owner's account, if it exists. Every
+        account is locked (all at once), loaded (in one batch) and saved 
+        once.
+        '''
+        by_owner = {}
+        for ID, owner in res_owners:
+            if owner in by_owner or AccountManager.account_exists(owner):
+                by_owner.setdefault(owner, []).append(ID)
+        
+        accounts = AccountManager.load_accts(by_owner, for_update=True)
+        
+        for owner, IDs in by_owner.items():
+            c_account = accounts[owner]
+            c_account.reservations.extend(IDs)
+            AccountManager.save_acct(c_account)
+    
     
     @staticmethod
     def res_exists(ID: str) -> bool:
         '''
         Query if the reservation file exists.
         '''
-        if f'{ID}.txt' in os.listdir('./reservations'):
+        if ResManager.res_exists(ID):
             return True
         else:
             return False
@@ -99,7 +196,7 @@ class ReservationsAPI():
         '''
         Query if the reservation file exists.
         '''
-        if f'{day_ID}.txt' in os.listdir('./days'):
+        if GarageManager.day_exists(day_ID):
             return True
         else:
             return False
@@ -116,9 +213,11 @@ class ReservationsAPI():
         ID : str
             The unique identifier of the reservation being modified.
         '''
-        c_res = ResManager.load_res(filename=ID)
-        GarageManager.remove_res(c_res)
-        ResManager.cancel_res(c_res)
+        with ReservationsAPI.transaction():
+            c_res = ResManager.load_res(filename=ID, for_update=True)
+            GarageManager.lock_days(c_res.day)
+            GarageManager.remove_res(c_res)
+            ResManager.cancel_res(c_res)
         
     @staticmethod
     def findLift(ID: str) -> int:
@@ -187,19 +286,21 @@ class ReservationsAPI():
             
         Returns : bool (true = successfully modified)
         '''
-        # Check if the time range is open
-        c_res = ResManager.load_res(filename = res_ID)
-        can_modify = GarageManager.check_if_available\
-            (new_d, new_tRange, res_modifiying=c_res)
-        
-        # If possible, modify the Res files & day timeslots.
-        if can_modify:
-            GarageManager.remove_res(c_res)
-            ResManager.change_date_n_time(c_res, new_d, new_tRange)
-            GarageManager.write_res(c_res)
-            return True
-        else:
-            return False
+        with ReservationsAPI.transaction():
+            # Check if the time range is open
+            c_res = ResManager.load_res(filename = res_ID, for_update=True)
+            GarageManager.lock_days(c_res.day, new_d)
+            can_modify = GarageManager.check_if_available\
+                (new_d, new_tRange, res_modifiying=c_res)
+            
+            # If possible, modify the Res files & day timeslots.
+            if can_modify:
+                GarageManager.remove_res(c_res)
+                ResManager.change_date_n_time(c_res, new_d, new_tRange)
+                GarageManager.write_res(c_res)
+                return True
+            else:
+                return False
     
     @staticmethod
     def get_day_from_file(day_ID: str) -> Day:
@@ -213,12 +314,7 @@ class ReservationsAPI():
         '''
         List the day files that have been initialized.
         '''
-        # Create list of all file prefixes for files that end in '.txt'
-        all_files = os.listdir(f'./days')
-        txt_files = \
-            [filename[:-4] for filename in all_files if filename[-4:] == '.txt']
-        
-        return txt_files
+        return GarageManager.list_days()
         
     
     @staticmethod
@@ -233,7 +329,79 @@ class ReservationsAPI():
         tRange : TimeRange
             The contigous time segments in question
         '''
-        return GarageManager.check_if_available(day=day, tRange=tRange)
+        return GarageManager.check_if_available(day, tRange=tRange)
+    
+    
+    @staticmethod
+    def find_available(duration: float, first_day=0, last_day=365, earliest=0, 
+                       latest=24, n=5) -> list:
+        '''
+        Find the first n places where duration hours are free on one lift, 
+        searching days first_day to last_day, between the hours earliest and
+        latest. Uses each day's availability summary (see list_availability),
+        so days are not loaded.
+        
+        Returns
+        -------
+        list [(int, float, int)]
+            (day, start hour, lift), earliest first
+        '''
+        return GarageManager.find_free(duration, first_day, last_day, earliest, latest, n)
+    
+    
+    @staticmethod
+    def list_availability(first_day=0, last_day=365) -> list:
+        '''
+        Return [(day, DayAvailability)] for days first_day to last_day. Each
+        summary gives every lift's free runs & longest free run, and the free
+        slots in each hour. Summaries are saved with their day and cached, 
+        so no day is loaded.
+        '''
+        return GarageManager.list_availability(first_day, last_day)
+    
+    
+    @staticmethod
+    def list_res_of_owner(owner: str, first_day=0, last_day=365, active=None) -> list:
+        '''
+        List the reservations (Res) belonging to owner on days first_day to
+        last_day, sorted by day & start. If active is True (False), only 
+        active (cancelled) reservations are listed. Served by an owner 
+        index, so only the matching reservations are read.
+        '''
+        return ResManager.list_res_of_owner(owner, first_day, last_day, active)
+    
+    
+    @staticmethod
+    def use_storage(backend) -> None:
+        '''
+        Switch every manager to a storage backend, e.g. 
+        StorageModule.SQLiteStorage('carlotter.db'), and drop cached days,
+        accounts & the owner index.
+        '''
+        Storage.use(backend)
+        GarageManager.invalidate_day()
+        ResManager.owners.invalidate()
+        AccountManager.invalidate_acct()
+    
+    
+    @staticmethod
+    @contextlib.contextmanager
+    def transaction():
+        '''
+        Run the enclosed calls as one unit of work: every day, reservation &
+        account they change is saved once, in a single storage commit, when
+        the block ends. If an exception is raised nothing is saved, and 
+        cached days (which may hold the discarded changes) are dropped.
+        
+        Each create / modify / cancel call runs in its own transaction, or 
+        joins the enclosing one. The days (and reservation) a call changes
+        stay locked until the transaction ends, so calls from several 
+        threads or processes can't double-book a lift.
+        '''
+        # Cached days are dropped before the locks are released, so no other
+        # thread can load a day holding the discarded changes
+        with UnitOfWork.begin(on_abort=GarageManager.invalidate_day):
+            yield
     
     
 if __name__ == '__main__':
@@ -5,7 +5,9 @@ Created on Fri Jun 24 17:27:21 2022
 @author: tanne
 """
 from TimeUtilities import TimeRange
-import os
+from IndexModule import OwnerIndex
+from StorageModule import Storage
+from TransactionModule import UnitOfWork
 
 class Res():
     '''
@@ -83,12 +85,9 @@ class Res():
     
     def save(self):
         '''
-        save reservation object as text file.
+        save reservation object to storage (by default, as a text file).
         '''
-        filename = f'reservations/{self.filename}.txt'.lower()
-
-        with open(filename, mode='w') as file:
-            file.write(self.toString())
+        Storage.backend.save_res(self)
 
 
 
@@ -96,10 +95,17 @@ class ResManager():
     '''
     A static class for interfacing & managing Res instances (and objects).
     
+    Class Attributes
+    ----------------
+    owners : OwnerIndex
+        Every owner's reservations by day, updated as reservations are
+        saved. Built from storage on first use.
+    
     Methods
     --------
-    load_res(ID: str) -> Res
-        load the specified reservation from its file
+    load_res(ID: str, for_update=False) -> Res
+        load the specified reservation from its file. If for_update, lock
+        it (until the unit of work ends) first.
         
     create_res(ID, owner, day, tRange) -> Res
         Create a Res instance. Auto saves to file
@@ -112,18 +118,35 @@ class ResManager():
         
     smite_res(ID: str) -> None
         Deletes the file of an existing reservation. Only used for testing.
+        
+    res_exists(ID: str) -> bool
+        Check if a reservation has been saved
+        
+    list_res_of_owner(owner, first_day=0, last_day=365, active=None) -> list [Res]
+        The reservations belonging to owner on days first_day-last_day,
+        optionally only active (or cancelled) ones
+        
+    save_res(c_res: Res) -> None
+        Save a reservation now, or at the end of the active unit of work
     
     '''
     
-    @staticmethod
-    def load_res(filename: str) -> Res:
+    owners = OwnerIndex()
+    
+    @classmethod
+    def load_res(self, filename: str, for_update=False) -> Res:
         '''
-        Creates a reservation (Res) instance from file named {ID}.txt
+        Creates a reservation (Res) instance from storage (by default, the
+        file named {ID}.txt)
 
         Parameters
         ----------
         filename : string
             The file name (default ID) of reservation file to be read.
+            
+        for_update : bool
+            Lock the reservation until the active unit of work ends, before
+            reading it. Use when the reservation will be changed.
 
         Returns
         -------
@@ -131,43 +154,69 @@ class ResManager():
             Reservation instance from file {ID}.txt
 
         '''
+        if for_update:
+            UnitOfWork.lock(('res', filename.lower()))
         
-        # Read file
-        with open(f'reservations/{filename}.txt'.lower()) as file:
-            lines = file.read().split('\n')
-
-        # Go through each line and split key from values.
-        # Clean up data for conversion. Gives 2d list of strings: 
-        # [[key, val], ...]
-        for i in range(len(lines)):
-            lines[i] = lines[i].split(':')
-            for j in range(len(lines[i])):
-                lines[i][j] = lines[i][j].strip().lower()
+        # A reservation changed in the current unit of work, not yet saved
+        pending = UnitOfWork.lookup(('res', filename.lower()))
+        if pending != None:
+            return pending
         
-
-        # Create dictionary of classes/constructors to clean up data.
-        # 1) converts each value to correct type
-        # 2) places each value in a new list, in ordered positions
-        
-        constructor = {'id': str,
-                 'day': int,
-                 'times': TimeRange,
-                 'owner': str,
-                 'active': bool}
-
-        positions = {'id': 0,
-                 'day': 2,
-                 'times': 3,
-                 'owner': 1,
-                 'active': 4}
-
-        d = [None] * 5
+        return self.res_from_record(Storage.backend.load_res(filename))
+    
+    @staticmethod
+    def res_from_record(record: dict) -> Res:
+        '''
+        Build a Res from a record loaded by a storage backend
+        '''
+        return Res(record['ID'], record['owner'], record['day'], 
+                   active=record['active'], start_time=record['start'], 
+                   end_time=record['end'])
+    
+    @staticmethod
+    def res_exists(ID: str) -> bool:
+        '''
+        Check if a reservation has been saved to storage (or will be, at the
+        end of the current unit of work)
+        '''
+        if UnitOfWork.lookup(('res', ID)) != None:
+            return True
         
-        for line in lines:
-            key = line[0]
-            d[positions[key]] = constructor[key](line[1])
+        return Storage.backend.res_exists(ID)
+    
+    @staticmethod
+    def save_res(c_res: Res) -> None:
+        '''
+        Save a reservation now, or at the end of the active unit of work
+        '''
+        UnitOfWork.save(c_res, ('res', c_res.filename.lower()), after=ResManager._index_res)
+    
+    @staticmethod
+    def _index_res(c_res: Res) -> None:
+        # Runs once c_res is saved
+        ResManager.owners.update(c_res.filename.lower(), c_res.owner, int(c_res.day),
+                                 bool(c_res.active))
+    
+    @classmethod
+    def list_res_of_owner(self, owner: str, first_day=0, last_day=365, active=None) -> list:
+        '''
+        Return the reservations (Res) of owner on days first_day to last_day
+        (inclusive), sorted by day & start time. Only the matching 
+        reservations are loaded, found through the owner index.
+        
+        Parameters
+        ----------
+        owner : str
+        first_day, last_day : int, optional
+        active : bool, optional
+            True lists only active reservations, False only cancelled ones.
+            Default (None) lists both.
+        '''
+        self.owners.ensure_built(Storage.backend.iter_res)
+        filenames = self.owners.query(owner, first_day, last_day, active)
+        found = [self.load_res(filename) for filename in filenames]
         
-        return Res(d[0], d[1], d[2], d[3], d[4])
+        return sorted(found, key=lambda c_res: (c_res.day, c_res.start))
     
     @staticmethod
     def create_res(ID: str, owner: str, day: int, tRange: TimeRange, filename=None) -> Res:
@@ -190,7 +239,7 @@ class ResManager():
         '''
         
         c_res = Res(ID=ID, owner=owner, day=day, time_range=tRange, filename=filename)
-        c_res.save()
+        ResManager.save_res(c_res)
         return c_res
     
     @staticmethod
@@ -214,13 +263,13 @@ class ResManager():
         c_res.start = c_res.tRange.start
         c_res.end = c_res.tRange.end
         
-        c_res.save()
+        ResManager.save_res(c_res)
     
     @staticmethod
     def cancel_res(c_res: Res) -> None:
         
         c_res.active = False
-        c_res.save()
+        ResManager.save_res(c_res)
         
     
     @staticmethod
@@ -228,8 +277,8 @@ class ResManager():
         '''
         Delete the file of an existing reservation.
         '''
-        filename = f'reservations/{ID}.txt'
-        os.remove(filename)
+        Storage.backend.delete_res(ID)
+        ResManager.owners.discard(ID.lower())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Summary statistics of timings, shared by the load generator & the admin
+script mode.
+
+@author: tanne
+"""
+import math
+
+
+class StatTools():
+    '''
+    Static class for summarising measured values
+
+    Methods
+    -------
+    percentile(values: list, p: float) -> float
+        The p-th percentile (nearest rank) of values
+    '''
+
+    @staticmethod
+    def percentile(values: list, p: float) -> float:
+        '''
+        Return the p-th percentile (0-100, nearest rank) of values, or nan
+        if there are none
+        '''
+        if not values:
+            return math.nan
+
+        ordered = sorted(values)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
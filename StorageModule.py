@@ -0,0 +1,1470 @@
+# -*- coding: utf-8 -*-
+"""
+Storage backends for days, reservations and accounts.
+
+Backends load plain records (dicts) and save model instances (Day, Res,
+Acct), so this module does not import the model classes. The managers turn
+records back into instances.
+
+@author: tanne
+"""
+import ast
+import contextlib
+import io
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import numpy as np
+from DayFormatModule import DayFormat
+from IndexModule import DirectoryIndex
+from JournalModule import Journal
+from LockModule import LockManager
+from AccountFormatModule import AccountFormat
+from AvailabilityModule import DayAvailability
+from OccupancyModule import SlotGrid
+from ResFormatModule import ResFormat
+
+try:
+    import fcntl
+except ImportError: # Windows: only one process may use a root
+    fcntl = None
+
+
+class Append():
+    '''
+    A staged write adding data to a file at offset (its size when staged)
+
+    Attributes
+    ----------
+    offset : int
+    data : bytes
+    '''
+
+    __slots__ = ('offset', 'data')
+
+    def __init__(self, offset: int, data: bytes):
+        self.offset = offset
+        self.data = data
+
+
+class FileStorage():
+    '''
+    The original file layout, relative to root:
+        days/{filename}.day (binary, see DayFormat), or the older text 
+            days/{filename}.txt & days/{filename}.npy
+        days/{filename}.json (the day's availability summary)
+        reservations/{filename}.txt (one JSON record, see ResFormat; older
+            text files are still read)
+        accounts/{filename}.acct (see AccountFormat), or the older
+            accounts/{filename}.pickle & accounts/{filename}.txt
+
+    Days in either format are read. Saving a day replaces its files with
+    the format chosen by binary_days. Older accounts are read, and replaced
+    by .acct files when next saved. Saving an account whose stored state 
+    (Acct.stored) is known only appends its new reservations.
+
+    Attributes
+    ----------
+    root : str
+        Directory holding the days, reservations & accounts folders
+
+    binary_days : bool
+        Save days in the binary format (the default), or as text & numpy
+        files
+
+    day_index, res_index, account_index : DirectoryIndex
+        The files in each folder, for O(1) existence checks
+
+    locks : LockManager
+        Locks shared with other processes through root/.locks/
+
+    Methods
+    -------
+    day_exists(day_ID) -> bool
+    list_days() -> list [str]
+    load_day(filename) -> dict
+    save_day(c_day: Day) -> None
+    load_day_availability(filename) -> dict
+        The summary saved with the day (see DayAvailability.to_record)
+    day_stamp(filename) -> tuple | None
+        Changes whenever the day's files change. None if there is no file
+
+    res_exists(ID) -> bool
+    list_res() -> list [str]
+    load_res(filename) -> dict
+    save_res(c_res: Res) -> None
+    delete_res(ID) -> None
+    list_res_of_owner(owner) -> list [dict]
+        Reads every reservation file
+    iter_res() -> generator [(str, dict)]
+        (filename, record) of every reservation
+
+    account_exists(filename) -> bool
+    list_accounts() -> list [str]
+    load_acct(filename) -> dict
+    load_accts(filenames) -> dict {str : dict}
+        The records of every account in filenames that exists
+    save_acct(c_account: Acct) -> None
+    delete_acct(filename) -> None
+
+    transaction() -> context manager
+        Stage every write made inside the block, and commit them together
+
+    recover() -> None
+        Finish a commit interrupted by a crash. Run on construction.
+
+    close() -> None
+
+    Every file is written to a temporary file first and renamed into place,
+    so a file is never left half-written. A transaction's renames are listed
+    in a commit manifest (root/.commit-{process}-{thread}) before any of
+    them happen. If the process dies mid-commit, recover() completes the
+    listed renames, so either all of the transaction's files change or none
+    do. A writer flocks its manifest until it is done with it, so other 
+    processes only recover manifests whose writer died. Reads made inside a transaction do not see its staged writes. 
+    Appends are staged as the bytes to write at the file's current end (less
+    any torn last line), and replayed from that offset, so they too are 
+    all-or-nothing; a replay keeps lines appended since by others.
+    
+    Each thread has its own transaction, and temporary files & manifests
+    are named per process & thread, so threads can commit concurrently.
+    '''
+
+    MANIFEST = '.commit'
+
+    def __init__(self, root='.', check_mtime=True, fsync=False, binary_days=True):
+        '''
+        Parameters
+        ----------
+        root : str, optional
+            Directory holding the days, reservations & accounts folders.
+
+        check_mtime : bool, optional
+            Passed on to the directory indexes
+
+        fsync : bool, optional
+            fsync files before renaming them. Slower, but commits also
+            survive a power loss, not just a crash of the process.
+
+        binary_days : bool, optional
+            False saves days as readable text & numpy files, as older 
+            versions did. Slower to load & save.
+        '''
+        self.root = root
+        self.fsync = fsync
+        self.binary_days = binary_days
+        self.day_index = DirectoryIndex(self._path('days'), ('.day', '.txt'), check_mtime)
+        self.res_index = DirectoryIndex(self._path('reservations'), '.txt', check_mtime)
+        self.account_index = DirectoryIndex(self._path('accounts'), ('.acct', '.txt'),
+                                            check_mtime)
+        self.locks = LockManager(os.path.join(root, '.locks'))
+        self._local = threading.local()
+        self.recover()
+
+
+    # Staged writes & index updates of the calling thread's transaction
+    @property
+    def _pending(self):
+        return getattr(self._local, 'pending', None)
+
+    @_pending.setter
+    def _pending(self, pending):
+        self._local.pending = pending
+
+    @property
+    def _index_ops(self) -> list:
+        if not hasattr(self._local, 'index_ops'):
+            self._local.index_ops = []
+        return self._local.index_ops
+
+    @_index_ops.setter
+    def _index_ops(self, index_ops):
+        self._local.index_ops = index_ops
+
+
+    def _path(self, folder: str, name='') -> str:
+        return os.path.join(self.root, folder, name)
+
+
+    def _write(self, path: str, data) -> None:
+        '''
+        Write data (bytes, or None to delete) to path now, or stage it if a
+        transaction is open
+        '''
+        if self._pending != None:
+            self._pending[path] = data
+        elif data == None:
+            os.remove(path)
+        else:
+            os.replace(self._write_temp(path, data), path)
+
+
+    def _append(self, path: str, data: bytes) -> None:
+        '''
+        Add data to the end of the file at path, in the open transaction (or
+        a transaction of its own). Appends to a file already staged are 
+        merged into its staged write.
+        '''
+        if self._pending == None:
+            with self.transaction():
+                return self._append(path, data)
+
+        staged = self._pending.get(path, Append)
+        if staged is Append:
+            self._pending[path] = Append(self._end_of_lines(path), data)
+        elif isinstance(staged, Append):
+            self._pending[path] = Append(staged.offset, staged.data + data)
+        else:
+            self._pending[path] = (staged or b'') + data
+
+
+    def _end_of_lines(self, path: str) -> int:
+        # Size of the file at path without a torn last line (left by a 
+        # writer that died mid-append), which the next append writes over
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+
+        try:
+            end = os.fstat(fd).st_size
+            while end > 0:
+                start = max(0, end - 4096)
+                os.lseek(fd, start, os.SEEK_SET)
+                newline = os.read(fd, end - start).rfind(b'\n')
+                if newline >= 0:
+                    return start + newline + 1
+                end = start
+            return 0
+        finally:
+            os.close(fd)
+
+
+    def _read(self, path: str) -> bytes:
+        '''
+        Return the contents of the file at path. Raises FileNotFoundError.
+        '''
+        # os.read skips building a buffered file object, which costs more
+        # than parsing a small file. Most files are replaced, never grown;
+        # .acct files are appended to in place (see _apply), so a read 
+        # racing an append gets a prefix of the file, which may end in a
+        # torn line. AccountFormat.decode ignores an unterminated last line.
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            chunks = [os.read(fd, size)]
+            while sum(map(len, chunks)) < size and chunks[-1]:
+                chunks.append(os.read(fd, size))
+        finally:
+            os.close(fd)
+
+        return b''.join(chunks)
+
+
+    def _exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+
+    def _write_temp(self, path: str, data: bytes) -> str:
+        temp_path = f'{path}.{self._writer()}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+            if self.fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        return temp_path
+
+
+    def _index(self, index: DirectoryIndex, name, exists: bool) -> None:
+        '''
+        Record a file creation/deletion in index, once it is committed
+        '''
+        if self._pending != None:
+            self._index_ops.append((index, name, exists))
+        elif exists:
+            index.add(name)
+        else:
+            index.discard(name)
+
+    # ------------------------------------------------------------------ days
+
+    def day_exists(self, day_ID) -> bool:
+        return day_ID in self.day_index
+
+
+    def list_days(self) -> list:
+        return self.day_index.names()
+
+
+    def load_day(self, filename) -> dict:
+        '''
+        Read days/{filename}.day into a day record, or parse the text format
+        (days/{filename}.txt & days/{filename}.npy) if there is no .day file
+        '''
+        try:
+            data = self._read(self._path('days', f'{filename}.day'))
+        except FileNotFoundError:
+            return self._load_text_day(filename)
+
+        return DayFormat.decode(data, filename)
+
+
+    def _load_text_day(self, filename) -> dict:
+        # Open the file, and parse out each attribute
+        raw = self._read(self._path('days', f'{filename}.txt')).decode().split('\n') #split by line
+
+        # Find the number of lifts (2nd line, all chars before first space)
+        # Find the handle table by using handy-dandy eval function. Older 
+        # files have a blank line instead of handles. res_locs (3rd line) is
+        # left for Day to rebuild from the grid, which is ~10x faster than
+        # evaluating it
+        record = {'day': int(raw[0].split(' ')[-1]),
+                  'n_lifts': int(raw[1].split(' ')[0]),
+                  'res_locs': None,
+                  'ids': ast.literal_eval(raw[3]) if raw[3] else None,
+                  'filename': str(filename)}
+
+        # Older files pickled an object array of IDs. Day converts those.
+        np_data = self._read(self._path('days', f'{filename}.npy'))
+        try:
+            record['slots'] = np.load(io.BytesIO(np_data))
+        except ValueError:
+            record['slots'] = np.load(io.BytesIO(np_data), allow_pickle=True)
+
+        return record
+
+
+    def save_day(self, c_day) -> None:
+        '''
+        Write c_day to its binary file (or, if not binary_days, str(c_day) to
+        the text file & its integer grid to the numpy file), and its 
+        availability summary to the json file. Files of the other format 
+        are deleted.
+        '''
+        summary = json.dumps(c_day.availability.to_record())
+        day_path = self._path('days', f'{c_day.filename}.day')
+        text_path = self._path('days', f'{c_day.filename}.txt')
+        np_path = self._path('days', f'{c_day.filename}.npy')
+
+        # The day file is renamed last: once its stamp (see day_stamp) has
+        # changed, the summary (& grid) are already in place. The old 
+        # format's files go after, as the new file is read first.
+        self._write(self._path('days', f'{c_day.filename}.json'), summary.encode())
+        if self.binary_days:
+            self._write(day_path, DayFormat.encode(c_day))
+            for path in (np_path, text_path):
+                if self._exists(path):
+                    self._write(path, None)
+        else:
+            buffer = io.BytesIO()
+            np.save(buffer, c_day.grid.slots)
+            self._write(np_path, buffer.getvalue())
+            self._write(text_path, str(c_day).encode())
+            if self._exists(day_path):
+                self._write(day_path, None)
+
+        self._index(self.day_index, c_day.filename, True)
+
+
+    def load_day_availability(self, filename) -> dict:
+        '''
+        Read the availability summary saved with a day. Raises 
+        FileNotFoundError for days saved before summaries were kept.
+        '''
+        return json.loads(self._read(self._path('days', f'{filename}.json')))
+
+
+    def day_stamp(self, filename):
+        '''
+        Return (inode, modification time, size) of a day's binary (or text)
+        file, or None if it does not exist. Every save renames a new file 
+        into place, so the inode changes even if two saves fall within one
+        mtime tick.
+        '''
+        try:
+            stat = os.stat(self._path('days', f'{filename}.day'))
+        except FileNotFoundError:
+            try:
+                stat = os.stat(self._path('days', f'{filename}.txt'))
+            except FileNotFoundError:
+                return None
+
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    # ---------------------------------------------------------- reservations
+
+    def res_exists(self, ID) -> bool:
+        return ID in self.res_index
+
+
+    def list_res(self) -> list:
+        return self.res_index.names()
+
+
+    def load_res(self, filename) -> dict:
+        '''
+        Read reservations/{filename}.txt (see ResFormat) into a reservation
+        record
+        '''
+        data = self._read(self._path('reservations', f'{filename}.txt'.lower()))
+        return ResFormat.decode(data, filename)
+
+
+    def save_res(self, c_res) -> None:
+        '''
+        Write c_res to its file, in the current ResFormat
+        '''
+        filename = f'{c_res.filename}.txt'.lower()
+
+        self._write(self._path('reservations', filename), ResFormat.encode(c_res))
+        self._index(self.res_index, c_res.filename.lower(), True)
+
+
+    def delete_res(self, ID) -> None:
+        self._write(self._path('reservations', f'{ID}.txt'), None)
+        self._index(self.res_index, ID, False)
+
+
+    def list_res_of_owner(self, owner) -> list:
+        '''
+        Return the records of every reservation owned by owner. Reads every
+        reservation file.
+        '''
+        records = [self.load_res(filename) for filename in self.list_res()]
+        return [record for record in records if record['owner'] == owner]
+
+
+    def iter_res(self):
+        '''
+        Yield (filename, record) for every reservation
+        '''
+        for filename in self.list_res():
+            yield filename, self.load_res(filename)
+
+    # -------------------------------------------------------------- accounts
+
+    def account_exists(self, filename) -> bool:
+        return filename in self.account_index
+
+
+    def list_accounts(self) -> list:
+        return self.account_index.names()
+
+
+    def load_acct(self, filename) -> dict:
+        '''
+        Read accounts/{filename}.acct into an account record, or unpickle
+        accounts/{filename}.pickle if there is no .acct file
+        '''
+        try:
+            data = self._read(self._path('accounts', f'{filename}.acct'))
+        except FileNotFoundError:
+            return self._load_pickled_acct(filename)
+
+        return AccountFormat.decode(data, filename)
+
+
+    def _load_pickled_acct(self, filename) -> dict:
+        c_account = pickle.loads(self._read(self._path('accounts', f'{filename}.pickle')))
+
+        return {'username': c_account.username,
+                'password': c_account.password,
+                'filename': c_account.filename,
+                'reservations': list(c_account.reservations)}
+
+
+    def load_accts(self, filenames) -> dict:
+        '''
+        Return {filename: record} for every account in filenames that exists
+        '''
+        records = {}
+        for filename in filenames:
+            try:
+                records[filename] = self.load_acct(filename)
+            except FileNotFoundError:
+                pass
+
+        return records
+
+
+    def save_acct(self, c_account) -> None:
+        '''
+        Append c_account's new reservations to its .acct file, if only 
+        reservations were added since it was stored (see Acct.stored). 
+        Otherwise write the whole file, replacing any older pickle & text 
+        files.
+        '''
+        filename = c_account.filename
+        path = self._path('accounts', f'{filename}.acct')
+        stored = c_account.stored
+
+        if stored != None and stored[:2] == (c_account.username, c_account.password) \
+                and stored[2] <= len(c_account.reservations) and self._exists(path):
+            added = c_account.reservations[stored[2]:]
+            if added:
+                self._append(path, AccountFormat.encode_reservations(added))
+        else:
+            self._write(path, AccountFormat.encode(c_account))
+            for suffix in ('.pickle', '.txt'):
+                old_path = self._path('accounts', f'{filename}{suffix}')
+                if self._exists(old_path):
+                    self._write(old_path, None)
+
+        self._index(self.account_index, filename, True)
+
+
+    def delete_acct(self, filename) -> None:
+        for suffix in ('.acct', '.pickle', '.txt'):
+            path = self._path('accounts', f'{filename}{suffix}')
+            if self._exists(path):
+                self._write(path, None)
+        self._index(self.account_index, filename, False)
+
+    # ---------------------------------------------------------------- other
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        Stage every write made inside the block, then commit them all at
+        once. If an exception is raised, nothing is written. Nested blocks
+        join the outer transaction.
+        '''
+        if self._pending != None:
+            yield
+            return
+
+        self._pending = {}
+        try:
+            yield
+        except BaseException:
+            self._pending = None
+            self._index_ops = []
+            raise
+
+        pending, self._pending = self._pending, None
+        index_ops, self._index_ops = self._index_ops, []
+        self._commit(pending)
+
+        for index, name, exists in index_ops:
+            self._index(index, name, exists)
+
+
+    def _commit(self, pending: dict) -> None:
+        '''
+        Write staged files to temporary files, list the renames in the
+        manifest, then perform them
+        '''
+        if not pending:
+            return
+
+        # [path, temporary file] to rename, [path, None] to delete, or
+        # [path, temporary file, offset] to append at offset
+        writes = []
+        for path, data in pending.items():
+            if isinstance(data, Append):
+                writes.append([path, self._write_temp(path, data.data), data.offset])
+            else:
+                writes.append([path, None if data == None else self._write_temp(path, data)])
+
+        # Once the manifest is in place, the transaction is committed. It is
+        # flocked until applied & removed, so recover() run by another 
+        # process leaves it alone while this one is still applying it
+        manifest = os.path.join(self.root, f'{self.MANIFEST}-{self._writer()}')
+        temp_path = self._write_temp(manifest, json.dumps(writes).encode())
+        fd = os.open(temp_path, os.O_RDONLY)
+        try:
+            if fcntl != None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.replace(temp_path, manifest)
+            self.recover(manifest)
+        finally:
+            os.close(fd)
+
+
+    def recover(self, manifest=None) -> None:
+        '''
+        Complete the renames & deletions listed in a commit manifest, then
+        remove it. Without a manifest path, every manifest in root whose 
+        writer is gone (crashed mid-commit) is recovered; manifests still 
+        being applied by their writer are skipped.
+        '''
+        if manifest == None:
+            for entry in os.scandir(self.root or '.'):
+                if entry.name.startswith(self.MANIFEST) and not entry.name.endswith('.tmp'):
+                    self._recover_abandoned(entry.path)
+            return
+
+        try:
+            with open(manifest) as file:
+                writes = json.load(file)
+        except FileNotFoundError:
+            return
+
+        for write in writes:
+            self._apply(*write)
+
+        try:
+            os.remove(manifest)
+        except FileNotFoundError:
+            pass
+
+
+    def _recover_abandoned(self, manifest: str) -> None:
+        # Recover manifest if no writer holds its flock (see _commit)
+        try:
+            fd = os.open(manifest, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+
+        try:
+            if fcntl != None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return
+            # Its writer may have applied & removed it before unlocking
+            if os.fstat(fd).st_nlink == 0:
+                return
+
+            # Replay appends holding their account's lock (as AccountManager
+            # takes it), so they can't interleave with a live append
+            with open(manifest) as file:
+                keys = sorted({('acct', os.path.basename(write[0])[:-len('.acct')])
+                               for write in json.load(file) if len(write) == 3})
+            for n_locked, key in enumerate(keys):
+                try:
+                    self.locks.acquire(key)
+                except BaseException:
+                    for locked in keys[:n_locked]:
+                        self.locks.release(locked)
+                    raise
+            try:
+                self.recover(manifest)
+            finally:
+                for key in keys:
+                    self.locks.release(key)
+        finally:
+            os.close(fd)
+
+
+    def _apply(self, path: str, temp_path, offset=None) -> None:
+        # Perform one committed write: rename the temporary file into place,
+        # append its contents at offset (see _apply_append), or delete path
+        # if temp_path is None. Safe to repeat: a temporary file that is 
+        # gone was already applied.
+        if offset != None:
+            try:
+                with open(temp_path, 'rb') as file:
+                    data = file.read()
+            except FileNotFoundError:
+                return
+            self._apply_append(path, data, offset)
+            os.remove(temp_path)
+        else:
+            with contextlib.suppress(FileNotFoundError):
+                if temp_path != None:
+                    os.replace(temp_path, path)
+                else:
+                    os.remove(path)
+
+
+    def _apply_append(self, path: str, data: bytes, offset: int) -> None:
+        # Write data (whole lines) at offset, over anything after it but 
+        # never over complete lines written since: when a dead writer's
+        # commit is replayed, others may have appended to (or rewritten) 
+        # the file after it died. Then data's lines that are missing go 
+        # after the file's last complete line.
+        fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        try:
+            size = os.fstat(fd).st_size
+            os.lseek(fd, min(offset, size), os.SEEK_SET)
+            after = b''.join(iter(lambda: os.read(fd, 2 ** 16), b''))
+
+            if size >= offset and after.startswith(data):
+                return # Already applied, maybe followed by later appends
+            elif size >= offset and data.startswith(after):
+                position = offset
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                text = b''.join(iter(lambda: os.read(fd, 2 ** 16), b''))
+                position = text.rfind(b'\n') + 1
+                lines = set(text[:position].split(b'\n'))
+                data = b''.join(line + b'\n' for line in data.split(b'\n')[:-1]
+                                if line not in lines)
+
+            os.lseek(fd, position, os.SEEK_SET)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.ftruncate(fd, position + len(data))
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+    @staticmethod
+    def _writer() -> str:
+        # Names temporary files & manifests, so concurrent writers don't
+        # clash
+        return f'{os.getpid()}-{threading.get_ident()}'
+
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteStorage():
+    '''
+    All days, reservations and accounts in a single SQLite database (WAL
+    mode). Reservations are indexed by ID, day & owner. Saves made inside
+    transaction() are committed together.
+
+    Attributes
+    ----------
+    path : str
+        Location of the database file
+
+    conn : sqlite3.Connection
+        The calling thread's connection. Each thread gets its own, so each
+        has its own transactions.
+
+    locks : LockManager
+        Locks shared with other processes through {path}.locks/
+
+    Methods
+    -------
+    Same as FileStorage. day_stamp returns a version number that goes up on
+    every save_day.
+    '''
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS days (
+            filename TEXT PRIMARY KEY,
+            day INTEGER NOT NULL,
+            n_lifts INTEGER NOT NULL,
+            n_slots INTEGER NOT NULL,
+            slots BLOB NOT NULL,
+            ids TEXT NOT NULL,
+            res_locs TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE TABLE IF NOT EXISTS day_availability (
+            filename TEXT PRIMARY KEY,
+            summary TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS reservations (
+            filename TEXT PRIMARY KEY,
+            ID TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            start_time REAL NOT NULL,
+            end_time REAL NOT NULL,
+            active INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS reservations_ID ON reservations (ID);
+        CREATE INDEX IF NOT EXISTS reservations_day ON reservations (day);
+        CREATE INDEX IF NOT EXISTS reservations_owner ON reservations (owner);
+        CREATE TABLE IF NOT EXISTS accounts (
+            filename TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS account_reservations (
+            filename TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            res_ID TEXT NOT NULL,
+            PRIMARY KEY (filename, position)
+        );
+    '''
+
+    def __init__(self, path='carlotter.db'):
+        '''
+        Parameters
+        ----------
+        path : str, optional
+            Location of the database file. Created if missing.
+        '''
+        self.path = path
+        self.locks = LockManager(f'{path}.locks')
+        self._local = threading.local()
+        self._connections = []
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(self.SCHEMA)
+
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn == None:
+            # Writers queue for up to 30s (BEGIN IMMEDIATE) instead of failing
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.depth = 0
+            self._connections.append(conn)
+        return conn
+
+
+    # Savepoint nesting of the calling thread's transaction
+    @property
+    def _depth(self) -> int:
+        return getattr(self._local, 'depth', 0)
+
+    @_depth.setter
+    def _depth(self, depth: int):
+        self._local.depth = depth
+
+
+    def _one(self, sql: str, *params):
+        return self.conn.execute(sql, params).fetchone()
+
+
+    def _column(self, sql: str, *params) -> list:
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    # ------------------------------------------------------------------ days
+
+    def day_exists(self, day_ID) -> bool:
+        return self._one('SELECT 1 FROM days WHERE filename = ?', str(day_ID)) != None
+
+
+    def list_days(self) -> list:
+        return self._column('SELECT filename FROM days ORDER BY filename')
+
+
+    def load_day(self, filename) -> dict:
+        row = self._one('SELECT day, n_lifts, n_slots, slots, ids, res_locs '
+                        'FROM days WHERE filename = ?', str(filename))
+        if row == None:
+            raise FileNotFoundError(f'Day "{filename}" is not in {self.path}')
+
+        day, n_lifts, n_slots, slots, ids, res_locs = row
+        slots = np.frombuffer(slots, dtype=np.int32).reshape(n_lifts, n_slots)
+
+        return {'day': day,
+                'n_lifts': n_lifts,
+                'slots': slots.copy(),
+                'ids': {int(h): ID for h, ID in json.loads(ids)},
+                'res_locs': json.loads(res_locs),
+                'filename': str(filename)}
+
+
+    def save_day(self, c_day) -> None:
+        grid = c_day.grid
+        with self.transaction():
+            self.conn.execute(
+                'INSERT INTO days (filename, day, n_lifts, n_slots, slots, ids, res_locs) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (filename) DO UPDATE SET day = excluded.day, '
+                'n_lifts = excluded.n_lifts, n_slots = excluded.n_slots, '
+                'slots = excluded.slots, ids = excluded.ids, '
+                'res_locs = excluded.res_locs, version = version + 1',
+                (str(c_day.filename), int(c_day.day), grid.n_lifts, grid.n_slots,
+                 grid.slots.astype(np.int32).tobytes(),
+                 json.dumps(list(grid.ids.items())), json.dumps(c_day.res_locs)))
+            self.conn.execute('INSERT OR REPLACE INTO day_availability VALUES (?, ?)',
+                              (str(c_day.filename), json.dumps(c_day.availability.to_record())))
+
+
+    def load_day_availability(self, filename) -> dict:
+        row = self._one('SELECT summary FROM day_availability WHERE filename = ?',
+                        str(filename))
+        if row == None:
+            raise FileNotFoundError(f'Day "{filename}" has no availability summary in {self.path}')
+
+        return json.loads(row[0])
+
+
+    def day_stamp(self, filename):
+        row = self._one('SELECT version FROM days WHERE filename = ?', str(filename))
+        return None if row == None else row[0]
+
+    # ---------------------------------------------------------- reservations
+
+    def res_exists(self, ID) -> bool:
+        return self._one('SELECT 1 FROM reservations WHERE filename = ?', ID) != None
+
+
+    def list_res(self) -> list:
+        return self._column('SELECT filename FROM reservations ORDER BY filename')
+
+
+    @staticmethod
+    def _res_record(row) -> dict:
+        ID, owner, day, start, end, active = row
+        return {'ID': ID, 'owner': owner, 'day': day,
+                'start': start, 'end': end, 'active': bool(active)}
+
+
+    def load_res(self, filename) -> dict:
+        row = self._one('SELECT ID, owner, day, start_time, end_time, active '
+                        'FROM reservations WHERE filename = ?', filename.lower())
+        if row == None:
+            raise FileNotFoundError(f'Reservation "{filename}" is not in {self.path}')
+
+        return self._res_record(row)
+
+
+    def save_res(self, c_res) -> None:
+        self.conn.execute(
+            'INSERT OR REPLACE INTO reservations '
+            '(filename, ID, owner, day, start_time, end_time, active) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (c_res.filename.lower(), c_res.ID, c_res.owner, int(c_res.day),
+             c_res.start, c_res.end, int(bool(c_res.active))))
+
+
+    def delete_res(self, ID) -> None:
+        self.conn.execute('DELETE FROM reservations WHERE filename = ?', (ID,))
+
+
+    def list_res_of_owner(self, owner) -> list:
+        rows = self.conn.execute(
+            'SELECT ID, owner, day, start_time, end_time, active '
+            'FROM reservations WHERE owner = ? ORDER BY day, start_time', (owner,))
+        return [self._res_record(row) for row in rows]
+
+
+    def iter_res(self):
+        rows = self.conn.execute('SELECT filename, ID, owner, day, start_time, end_time, '
+                                 'active FROM reservations')
+        for row in rows:
+            yield row[0], self._res_record(row[1:])
+
+    # -------------------------------------------------------------- accounts
+
+    def account_exists(self, filename) -> bool:
+        return self._one('SELECT 1 FROM accounts WHERE filename = ?', filename) != None
+
+
+    def list_accounts(self) -> list:
+        return self._column('SELECT filename FROM accounts ORDER BY filename')
+
+
+    def load_acct(self, filename) -> dict:
+        row = self._one('SELECT username, password FROM accounts WHERE filename = ?',
+                        filename)
+        if row == None:
+            raise FileNotFoundError(f'Account "{filename}" is not in {self.path}')
+
+        reservations = self._column('SELECT res_ID FROM account_reservations '
+                                    'WHERE filename = ? ORDER BY position', filename)
+        return {'username': row[0], 'password': row[1], 'filename': filename,
+                'reservations': reservations}
+
+
+    def load_accts(self, filenames) -> dict:
+        # SQLite allows 999 parameters per statement
+        filenames = list(filenames)
+        records = {}
+        for i in range(0, len(filenames), 900):
+            chunk = filenames[i:i + 900]
+            marks = ','.join('?' * len(chunk))
+            for filename, username, password in self.conn.execute(
+                    f'SELECT filename, username, password FROM accounts '
+                    f'WHERE filename IN ({marks})', chunk):
+                records[filename] = {'username': username, 'password': password,
+                                     'filename': filename, 'reservations': []}
+            for filename, ID in self.conn.execute(
+                    f'SELECT filename, res_ID FROM account_reservations '
+                    f'WHERE filename IN ({marks}) ORDER BY filename, position', chunk):
+                records[filename]['reservations'].append(ID)
+
+        return records
+
+
+    def save_acct(self, c_account) -> None:
+        '''
+        Insert c_account's new reservations, if only reservations were added
+        since it was stored (see Acct.stored). Otherwise rewrite its rows.
+        '''
+        filename = c_account.filename
+        stored = c_account.stored
+        appending = stored != None and stored[2] <= len(c_account.reservations)
+        first = stored[2] if appending else 0
+
+        with self.transaction():
+            if stored == None or stored[:2] != (c_account.username, c_account.password):
+                self.conn.execute('INSERT OR REPLACE INTO accounts (filename, username, '
+                                  'password) VALUES (?, ?, ?)',
+                                  (filename, c_account.username, c_account.password))
+            if not appending:
+                self.conn.execute('DELETE FROM account_reservations WHERE filename = ?',
+                                  (filename,))
+            self.conn.executemany('INSERT OR REPLACE INTO account_reservations '
+                                  'VALUES (?, ?, ?)',
+                                  [(filename, i, c_account.reservations[i]) for i
+                                   in range(first, len(c_account.reservations))])
+
+
+    def delete_acct(self, filename) -> None:
+        with self.transaction():
+            self.conn.execute('DELETE FROM accounts WHERE filename = ?', (filename,))
+            self.conn.execute('DELETE FROM account_reservations WHERE filename = ?',
+                              (filename,))
+
+    # ---------------------------------------------------------------- other
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        Commit every save made inside the block together, or none of them if
+        an exception is raised. Nested blocks use savepoints.
+        '''
+        if self._depth == 0:
+            self.conn.execute('BEGIN IMMEDIATE')
+        else:
+            self.conn.execute(f'SAVEPOINT sp{self._depth}')
+        self._depth += 1
+
+        try:
+            yield
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self.conn.execute('ROLLBACK')
+            else:
+                self.conn.execute(f'ROLLBACK TO sp{self._depth}')
+                self.conn.execute(f'RELEASE sp{self._depth}')
+            raise
+        else:
+            self._depth -= 1
+            if self._depth == 0:
+                self.conn.execute('COMMIT')
+            else:
+                self.conn.execute(f'RELEASE sp{self._depth}')
+
+
+    def close(self) -> None:
+        '''
+        Close every thread's connection
+        '''
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+        self._local = threading.local()
+
+
+class YearStorage(FileStorage):
+    '''
+    FileStorage keeping every day of the year in one memory-mapped grid 
+    instead of a file per day. Reservations & accounts are files, as in 
+    FileStorage. Relative to root:
+        days/year.npy       int32 [366 x n_lifts x n_slots] handles
+        days/year-ids.npy   the IDs of each day's handles [366 x n_lifts*n_slots]
+        days/year-spans.npy int32 (lift, start, end) of each handle [366 x n_lifts*n_slots x 3]
+        days/year-meta.npy  int64 [366 x 2] (version, number of IDs) per day
+
+    load_day copies a day's slots out of the mapping, which parses nothing
+    (the mapped pages are rewritten in place by commits, so a Day must not
+    keep a view of them), and reports over many days only touch the pages
+    they read. save_day writes a day straight into the mapping when its
+    transaction commits. Like
+    any file, the change is listed in the commit manifest first, so a 
+    crash mid-commit is completed by recover().
+
+    Every day has the same number of lifts & slots, set when the year file
+    is created. Days are named by their number (0-365), and IDs are at 
+    most ID_BYTES bytes of UTF-8.
+
+    Attributes
+    ----------
+    grid, ids, spans, meta : np.memmap
+        The mapped arrays
+
+    Methods
+    -------
+    Same as FileStorage. day_stamp returns a version number that goes up on
+    every save_day, and load_day_availability summarizes the mapped grid.
+    '''
+
+    N_DAYS = 366
+    ID_BYTES = 32
+
+    def __init__(self, root='.', n_lifts=2, slots_per_hour=1, check_mtime=True, fsync=False):
+        '''
+        Parameters
+        ----------
+        root : str, optional
+            Directory holding the days, reservations & accounts folders.
+
+        n_lifts, slots_per_hour : int, optional
+            Shape of a new year file. An existing one keeps its shape.
+
+        check_mtime, fsync : bool, optional
+            As for FileStorage. fsync also flushes the mapping on commit.
+        '''
+        self.root = root
+        self.locks = LockManager(os.path.join(root, '.locks'))
+        self._year_path = self._path('days', 'year.npy')
+
+        # Only one process creates the files
+        self.locks.acquire(('year',))
+        try:
+            if not os.path.exists(self._year_path):
+                self._create(n_lifts, 24 * slots_per_hour)
+        finally:
+            self.locks.release(('year',))
+
+        self.grid = np.load(self._year_path, mmap_mode='r+')
+        self.ids = np.load(self._path('days', 'year-ids.npy'), mmap_mode='r+')
+        self.spans = np.load(self._path('days', 'year-spans.npy'), mmap_mode='r+')
+        self.meta = np.load(self._path('days', 'year-meta.npy'), mmap_mode='r+')
+        super().__init__(root, check_mtime, fsync)
+
+
+    def _create(self, n_lifts: int, n_slots: int) -> None:
+        # Create the mapped files (sparse where the OS allows), year.npy last
+        # as it marks the year as created
+        shapes = [('year-meta.npy', (self.N_DAYS, 2), np.int64),
+                  ('year-ids.npy', (self.N_DAYS, n_lifts * n_slots), f'S{self.ID_BYTES}'),
+                  ('year-spans.npy', (self.N_DAYS, n_lifts * n_slots, 3), np.int32),
+                  ('year.npy', (self.N_DAYS, n_lifts, n_slots), np.int32)]
+
+        for name, shape, dtype in shapes:
+            path = self._path('days', name)
+            temp_path = f'{path}.{self._writer()}.tmp'
+            np.lib.format.open_memmap(temp_path, mode='w+', dtype=dtype, shape=shape).flush()
+            os.replace(temp_path, path)
+
+
+    def _day(self, filename) -> int:
+        # The day number of filename, or None if it is not a day of the year
+        try:
+            day = int(filename)
+        except ValueError:
+            return None
+        return day if 0 <= day < self.N_DAYS else None
+
+    # ------------------------------------------------------------------ days
+
+    def day_exists(self, day_ID) -> bool:
+        return self.day_stamp(day_ID) != None
+
+
+    def list_days(self) -> list:
+        return sorted(str(day) for day in np.nonzero(self.meta[:, 0])[0].tolist())
+
+
+    def load_day(self, filename) -> dict:
+        '''
+        Return a day record with a copy of the day's slots & handle table
+        '''
+        day = self._day(filename)
+        if self.day_stamp(filename) == None:
+            raise FileNotFoundError(f'Day "{filename}" is not in {self._year_path}')
+
+        # A copy, as commits renumber the handles of the mapped slots
+        n_ids = int(self.meta[day, 1])
+        slots = np.array(self.grid[day])
+        IDs = [ID.decode() for ID in self.ids[day, :n_ids].tolist()]
+
+        return {'day': day,
+                'n_lifts': slots.shape[0],
+                'slots': slots,
+                'ids': dict(enumerate(IDs, start=1)),
+                'res_locs': dict(zip(IDs, map(tuple, self.spans[day, :n_ids].tolist()))),
+                'filename': str(filename)}
+
+
+    def save_day(self, c_day) -> None:
+        '''
+        Write c_day into the year, with its handles renumbered 1..n
+        '''
+        day = self._day(c_day.filename)
+        grid = c_day.grid
+        if day == None:
+            raise ValueError(f'{self._year_path} only holds days 0-{self.N_DAYS - 1}, '
+                             f'not "{c_day.filename}"')
+        if grid.slots.shape != self.grid.shape[1:]:
+            raise ValueError(f'Day {day} has {grid.n_lifts} lifts x {grid.n_slots} slots, but '
+                             f'{self._year_path} holds {self.grid.shape[1]} x {self.grid.shape[2]}')
+
+        handles = sorted(grid.ids)
+        IDs = [grid.ids[h].encode() for h in handles]
+        if any(len(ID) > self.ID_BYTES for ID in IDs):
+            raise ValueError(f'Reservation IDs in {self._year_path} are at most '
+                             f'{self.ID_BYTES} bytes')
+
+        renumber = np.zeros(max(handles, default=0) + 1, dtype=np.int32)
+        renumber[handles] = np.arange(1, len(handles) + 1)
+        spans = [c_day.res_locs[grid.ids[h]] for h in handles]
+        data = b''.join([renumber[grid.slots].tobytes(),
+                         np.int64(len(IDs)).tobytes(),
+                         np.array(spans, dtype=np.int32).reshape(-1, 3).tobytes(),
+                         np.array(IDs, dtype=f'S{self.ID_BYTES}').tobytes()])
+
+        # Staged & committed like a file, then copied in by _apply
+        with self.transaction():
+            self._write(f'{self._year_path}#{day}', data)
+
+
+    def _apply(self, path: str, temp_path, offset=None) -> None:
+        year_path, _, day = path.rpartition('#')
+        if year_path != self._year_path:
+            return super()._apply(path, temp_path, offset)
+        if temp_path == None:
+            return
+
+        day = int(day)
+        try:
+            data = np.fromfile(temp_path, dtype=np.uint8)
+        except FileNotFoundError:
+            return
+        n = self.grid[day].nbytes
+        n_ids = int(data[n:n + 8].view(np.int64)[0])
+        spans_end = n + 8 + 12 * n_ids
+
+        self.grid[day] = data[:n].view(np.int32).reshape(self.grid.shape[1:])
+        self.spans[day, :n_ids] = data[n + 8:spans_end].view(np.int32).reshape(-1, 3)
+        self.ids[day, :n_ids] = data[spans_end:].view(f'S{self.ID_BYTES}')
+        self.ids[day, n_ids:int(self.meta[day, 1])] = b''
+        self.meta[day, 1] = n_ids
+        # The version goes up last: once the stamp changes, the day is in place
+        self.meta[day, 0] += 1
+        if self.fsync:
+            for array in (self.grid, self.ids, self.spans, self.meta):
+                array.flush()
+
+        os.remove(temp_path)
+
+
+    def load_day_availability(self, filename) -> dict:
+        '''
+        Summarize the day's free time from the mapped grid
+        '''
+        if self.day_stamp(filename) == None:
+            raise FileNotFoundError(f'Day "{filename}" is not in {self._year_path}')
+
+        slots = self.grid[self._day(filename)]
+        return DayAvailability.from_grid(SlotGrid(slots.shape[0], slots=slots)).to_record()
+
+
+    def day_stamp(self, filename):
+        day = self._day(filename)
+        if day == None or self.meta[day, 0] == 0:
+            return None
+        return int(self.meta[day, 0])
+
+
+    def close(self) -> None:
+        for array in (self.grid, self.ids, self.spans, self.meta):
+            array.flush()
+
+
+class JournalStorage(FileStorage):
+    '''
+    FileStorage that appends every commit to a journal (root/journal.log)
+    instead of rewriting files. A booking costs one sequential append, not
+    a temporary file & rename per day, reservation & account it changes.
+
+    Journaled writes are kept in memory (overlay) and read from there until
+    compact() writes them all to the files in one FileStorage commit and
+    empties the journal. Appends (new account lines) are journaled & kept
+    as the added bytes only, and compacted as appends. That happens once the journal reaches 
+    compact_bytes, and on close(). On construction the journal is replayed
+    into the overlay, so commits survive a crash whether or not they were
+    compacted. Compacted files are fsynced before the journal is emptied.
+
+    Entries hold the files each commit wrote (not the API calls that made
+    them), so replaying is idempotent & needs no garage logic. Only one
+    process can open a journal; use FileStorage or SQLiteStorage for
+    several processes.
+
+    Attributes
+    ----------
+    journal : Journal
+
+    overlay : dict {str : (int, bytes | None | Append)}
+        {path: (sequence number, data, None if deleted, or an Append to 
+        the file as last compacted)} of the writes not yet compacted
+
+    compact_bytes : int
+
+    Methods
+    -------
+    compact() -> None
+        Write the overlay to the files & empty the journal
+    '''
+
+    JOURNAL = 'journal.log'
+
+    def __init__(self, root='.', check_mtime=True, sync_every=1, compact_bytes=64 * 2**20):
+        '''
+        Parameters
+        ----------
+        root : str, optional
+            Directory holding the days, reservations & accounts folders.
+
+        check_mtime : bool, optional
+            Passed on to the directory indexes
+
+        sync_every : int, optional
+            fsync the journal every sync_every commits (see Journal). 0 
+            leaves it to the OS.
+
+        compact_bytes : int, optional
+            Compact once the journal is this large
+        '''
+        self.overlay = {}
+        self.compact_bytes = compact_bytes
+        self._sequence = 0
+        self._journal_lock = threading.RLock()
+        self.journal = Journal(os.path.join(root, self.JOURNAL), sync_every)
+        super().__init__(root, check_mtime, fsync=True)
+        self._replay()
+
+
+    def _replay(self) -> None:
+        # Rebuild the overlay from the journal, then bring the directory
+        # indexes up to date with it (journaled files aren't on disk)
+        for writes in self.journal.replay():
+            self._apply_to_overlay({os.path.join(self.root, name):
+                                    Append(*data) if isinstance(data, tuple) else data
+                                    for name, data in writes.items()})
+
+        for index in (self.day_index, self.res_index, self.account_index):
+            index.refresh(force=True)
+            suffixes = (index.suffix,) if isinstance(index.suffix, str) else index.suffix
+            for path in list(self.overlay):
+                directory, name = os.path.split(path)
+                names = [name[:-len(suffix)] for suffix in suffixes if name.endswith(suffix)]
+                if not names or os.path.join(directory, '') != os.path.join(index.directory, ''):
+                    continue
+                if any(self._exists(os.path.join(directory, names[0] + suffix))
+                       for suffix in suffixes):
+                    index.add(names[0])
+                else:
+                    index.discard(names[0])
+
+
+    def _apply_to_overlay(self, writes: dict) -> None:
+        for path, data in writes.items():
+            if isinstance(data, Append) and path in self.overlay:
+                # Kept as an append while it follows the file as compacted
+                # (and earlier appends to it), else as the whole file
+                entry = self.overlay[path][1]
+                if isinstance(entry, Append) and data.offset == entry.offset + len(entry.data):
+                    data = Append(entry.offset, entry.data + data.data)
+                else:
+                    data = (self._read(path) if self._exists(path) else b'')[:data.offset] \
+                        + data.data
+
+            self._sequence += 1
+            self.overlay[path] = (self._sequence, data)
+
+
+    def _read(self, path: str) -> bytes:
+        entry = self.overlay.get(path)
+        if entry == None:
+            return super()._read(path)
+        if entry[1] == None:
+            raise FileNotFoundError(path)
+        if isinstance(entry[1], Append):
+            try:
+                data = super()._read(path)
+            except FileNotFoundError:
+                data = b''
+            return data[:entry[1].offset] + entry[1].data
+        return entry[1]
+
+
+    def _exists(self, path: str) -> bool:
+        entry = self.overlay.get(path)
+        if entry == None:
+            return super()._exists(path)
+        return entry[1] != None
+
+
+    def _write(self, path: str, data) -> None:
+        # Writes outside a transaction are journaled on their own
+        if self._pending != None:
+            super()._write(path, data)
+        else:
+            self._commit({path: data})
+
+
+    def _end_of_lines(self, path: str) -> int:
+        entry = self.overlay.get(path)
+        if entry == None:
+            return super()._end_of_lines(path)
+        if isinstance(entry[1], Append):
+            # Appends are whole lines
+            return entry[1].offset + len(entry[1].data)
+        return 0 if entry[1] == None else entry[1].rfind(b'\n') + 1
+
+
+    def _commit(self, pending: dict) -> None:
+        '''
+        Append the staged writes to the journal as one entry, then make them
+        visible through the overlay
+        '''
+        if not pending:
+            return
+
+        with self._journal_lock:
+            self.journal.append({os.path.relpath(path, self.root):
+                                 (data.offset, data.data) if isinstance(data, Append) else data
+                                 for path, data in pending.items()})
+            self._apply_to_overlay(pending)
+            full = self.journal.size >= self.compact_bytes
+
+        if full:
+            self.compact()
+
+
+    def compact(self) -> None:
+        '''
+        Write every journaled change to the files, in one (fsynced) 
+        FileStorage commit, then empty the journal. Commits wait meanwhile;
+        reads don't.
+        '''
+        with self._journal_lock:
+            writes = {path: data for path, (sequence, data) in self.overlay.items()}
+            super()._commit(writes)
+            self.journal.truncate()
+            self.overlay = {}
+
+
+    def day_stamp(self, filename):
+        '''
+        Return ('journal', sequence number) for a day changed since the last
+        compaction, else the stamp of its file (see FileStorage.day_stamp)
+        '''
+        entry = self.overlay.get(self._path('days', f'{filename}.day'))
+        if entry != None:
+            return ('journal', entry[0])
+        return super().day_stamp(filename)
+
+
+    def close(self) -> None:
+        self.compact()
+        self.journal.close()
+
+
+class Storage():
+    '''
+    Static class holding the storage backend shared by GarageManager,
+    ResManager and AccountManager.
+
+    Class Attributes
+    ----------------
+    backend : FileStorage | SQLiteStorage | YearStorage | JournalStorage
+        The backend every manager reads from & writes to
+
+    Methods
+    -------
+    use(backend) -> None
+        Switch every manager to backend. See ReservationsAPI.use_storage,
+        which also clears the managers' caches.
+    '''
+
+    backend = FileStorage()
+
+    @classmethod
+    def use(self, backend) -> None:
+        self.backend = backend
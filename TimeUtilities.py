@@ -15,9 +15,9 @@ class TimeTools():
         '''
         Converts the float to standard time (string, eg '12.0'' to 12:00')
         '''
-        hours = int(time//1)
-        minutes = str(int((time % 1) * 60)).rjust(2, '0')
-        return f'{hours}:{minutes}'
+        # Round to the minute first, so e.g. 5/12 h is 0:25, not 0:24
+        hours, minutes = divmod(round(time * 60), 60)
+        return f'{hours}:{str(minutes).rjust(2, "0")}'
     
     
 class TimeRange():
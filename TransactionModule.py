@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Unit of work spanning GarageManager, ResManager and AccountManager.
+
+@author: tanne
+"""
+import contextlib
+import threading
+from StorageModule import Storage
+
+
+class UnitOfWork():
+    '''
+    Collects the days, reservations & accounts changed during one API call
+    and saves each of them once, in a single storage transaction. Outside
+    of a unit of work, saves happen immediately.
+
+    Each thread has its own unit of work. A unit of work also holds the
+    locks taken with lock() until it has committed (or been discarded), so
+    a check and the write that depends on it can't be interleaved with
+    another thread's or process's. To avoid deadlocks, locks are always
+    taken in the order: reservation, then days (in one lock() call), then
+    account.
+
+    Instance Attributes
+    -------------------
+    pending : dict {(str, str) : (object, callable | None)}
+        Objects waiting to be saved, keyed by (kind, filename), with an
+        optional callback to run once they are committed
+
+    locks : list [(str, str)]
+        Keys locked by this unit of work, in the order they were taken
+
+    Methods
+    -------
+    @classmethod
+    begin(on_abort=None) -> context manager
+        Start a unit of work, or join the calling thread's active one.
+        Commits on success, discards every pending save (and calls
+        on_abort) if an exception is raised. Releases the unit's locks when
+        done.
+
+    @classmethod
+    current() -> UnitOfWork | None
+        The calling thread's active unit of work, if any
+
+    @classmethod
+    lock(*keys) -> None
+        Lock keys (e.g, ('day', '3')) until the active unit of work ends
+
+    @classmethod
+    save(obj, key, after=None) -> None
+        Save obj now, or when the active unit of work commits
+
+    @classmethod
+    lookup(key) -> object | None
+        Return the pending (unsaved) object for key, if any
+
+    commit() -> None
+        Save every pending object in one storage transaction
+
+    release() -> None
+        Release the unit's locks
+    '''
+
+    _local = threading.local()
+
+    def __init__(self):
+        self.pending = {}
+        self.locks = []
+        self._lock_manager = Storage.backend.locks
+
+
+    @classmethod
+    @contextlib.contextmanager
+    def begin(self, on_abort=None):
+        '''
+        Start a unit of work, or join the calling thread's active one. The
+        outermost block commits on success. If an exception is raised (in
+        the block or by the commit), pending saves are discarded and
+        on_abort() is called: objects already changed in memory are not
+        restored, so on_abort should drop them from any cache. Locks are
+        released last.
+        '''
+        if self.current() != None:
+            yield self.current()
+            return
+
+        unit = self()
+        self._local.unit = unit
+        try:
+            try:
+                yield unit
+            finally:
+                self._local.unit = None
+            unit.commit()
+        except BaseException:
+            if on_abort != None:
+                on_abort()
+            raise
+        finally:
+            unit.release()
+
+
+    @classmethod
+    def current(self):
+        '''
+        Return the calling thread's active unit of work, or None
+        '''
+        return getattr(self._local, 'unit', None)
+
+
+    @classmethod
+    def lock(self, *keys) -> None:
+        '''
+        Lock keys until the active unit of work has committed or been
+        discarded. Keys passed together are locked in sorted order. Keys
+        the unit already holds are skipped.
+
+        Parameters
+        ----------
+        *keys : (str, str)
+            (kind, name), e.g. ('day', '3') or ('acct', 'tanner')
+        '''
+        unit = self.current()
+        if unit == None:
+            raise RuntimeError('Locks can only be taken inside a unit of work')
+
+        for key in sorted(set(keys)):
+            if key not in unit.locks:
+                unit._lock_manager.acquire(key)
+                unit.locks.append(key)
+
+
+    @classmethod
+    def save(self, obj, key: tuple, after=None) -> None:
+        '''
+        Save obj (calls obj.save()) now, or when the active unit of work
+        commits. Saving the same key twice in one unit writes it once.
+
+        Parameters
+        ----------
+        obj : Day | Res | Acct
+        key : (str, str)
+            (kind, filename) identifying obj, e.g. ('res', 'ab')
+        after : callable(obj), optional
+            Called once obj has been written
+        '''
+        unit = self.current()
+        if unit == None:
+            obj.save()
+            if after != None:
+                after(obj)
+        else:
+            unit.pending[key] = (obj, after)
+
+
+    @classmethod
+    def lookup(self, key: tuple):
+        '''
+        Return the object saved under key in the active unit of work but not
+        yet committed, or None
+        '''
+        unit = self.current()
+        if unit == None or key not in unit.pending:
+            return None
+
+        return unit.pending[key][0]
+
+
+    def commit(self) -> None:
+        '''
+        Save every pending object in one storage transaction, then run the
+        'after' callbacks
+        '''
+        with Storage.backend.transaction():
+            for obj, after in self.pending.values():
+                obj.save()
+
+        for obj, after in self.pending.values():
+            if after != None:
+                after(obj)
+
+        self.pending = {}
+
+
+    def release(self) -> None:
+        '''
+        Release every lock held by this unit of work
+        '''
+        while self.locks:
+            self._lock_manager.release(self.locks.pop())
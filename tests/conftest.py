@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures shared by the tests. Every test that touches storage runs in a
+scratch directory, so the real days/, reservations/ and accounts/ folders
+are never used.
+
+@author: tanne
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from MigrateStorage import StorageMigrator
+from PasswordModule import PasswordHasher
+from ReservationsAPI import ReservationsAPI
+from StorageModule import Storage
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    '''
+    A temporary working directory with empty days/, reservations/ and
+    accounts/ folders. The storage backend in use is restored after.
+    '''
+    for folder in ('days', 'reservations', 'accounts'):
+        (tmp_path / folder).mkdir()
+    monkeypatch.chdir(tmp_path)
+
+    old_backend = Storage.backend
+    yield tmp_path
+    ReservationsAPI.use_storage(old_backend)
+
+
+@pytest.fixture(params=['files', 'sqlite'])
+def spec(request, workspace) -> str:
+    '''
+    Storage spec (see StorageMigrator.open_backend) of each multi-process
+    backend, in the workspace
+    '''
+    return 'files:.' if request.param == 'files' else 'sqlite:test.db'
+
+
+@pytest.fixture
+def backend(spec):
+    '''
+    The backend opened from spec, used by ReservationsAPI, and closed after
+    '''
+    backend = StorageMigrator.open_backend(spec)
+    ReservationsAPI.use_storage(backend)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def files_backend(workspace):
+    '''
+    A FileStorage in the workspace, used by ReservationsAPI
+    '''
+    backend = StorageMigrator.open_backend('files:.')
+    ReservationsAPI.use_storage(backend)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture(autouse=True)
+def cheap_passwords():
+    '''
+    Hash passwords with a cheap cost, so tests creating accounts are fast
+    '''
+    old = {'scheme': PasswordHasher.scheme, 'cost': PasswordHasher.cost}
+    PasswordHasher.configure(scheme='pbkdf2_sha256', cost=1)
+    yield
+    PasswordHasher.configure(**old)
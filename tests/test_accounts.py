@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of accounts (AccountModule, AccountFormatModule, PasswordModule) and
+the admin commands that use them.
+
+@author: tanne
+"""
+import multiprocessing
+import pytest
+from AccountModule import AccountManager
+from AdminUI import AccountCommands, ReservationCommands
+from MigrateStorage import StorageMigrator
+from PasswordModule import PasswordHasher
+from ReservationsAPI import ReservationsAPI
+from StorageModule import Storage
+from TimeUtilities import TimeRange
+
+
+def book_for_account_in_process(spec: str, request: tuple) -> bool:
+    '''
+    Book one (ID, owner, day, tRange) request & add it to the owner's
+    account, in a worker process with its own connection to the backend
+    '''
+    ReservationsAPI.use_storage(StorageMigrator.open_backend(spec))
+    created = ReservationsAPI.try_create_many([request])[0]
+    Storage.backend.close()
+    return created
+
+
+@pytest.fixture
+def account_cache(request):
+    '''
+    The account cache with the capacity given by the test's parameter,
+    restored after
+    '''
+    old = AccountManager.acct_cache.capacity
+    AccountManager.configure_cache(capacity=request.param)
+    yield request.param
+    AccountManager.configure_cache(capacity=old)
+
+
+def test_appended_reservations_load_back(backend):
+    c_account = AccountManager.create_acct('bob', 'pw')
+    c_account.reservations = [f'r{i}' for i in range(100)]
+    AccountManager.save_acct(c_account)
+    for i in range(20):
+        c_account.reservations.append(f'n{i}')
+        AccountManager.save_acct(c_account)
+
+    assert backend.load_acct('bob')['reservations'] == c_account.reservations
+    # Rewritten, e.g. after a cancellation
+    c_account.reservations.remove('r5')
+    AccountManager.save_acct(c_account)
+    assert backend.load_acct('bob')['reservations'] == c_account.reservations
+
+
+def test_load_accts_skips_missing_accounts(backend):
+    usernames = [f'user{i}' for i in range(30)]
+    with backend.transaction():
+        for username in usernames:
+            c_account = AccountManager.create_acct(username, 'pw')
+            c_account.reservations = [f'{username}r0']
+            AccountManager.save_acct(c_account)
+    AccountManager.invalidate_acct()
+
+    loaded = AccountManager.load_accts(usernames + ['nobody'])
+    assert sorted(loaded) == sorted(usernames)
+    assert all(c_account.reservations == [f'{username}r0']
+               for username, c_account in loaded.items())
+
+
+@pytest.mark.parametrize('scheme, cost', [('scrypt', 2 ** 10), ('pbkdf2_sha256', 1000)])
+def test_passwords_verify(files_backend, scheme, cost):
+    PasswordHasher.configure(scheme=scheme, cost=cost)
+    stored = PasswordHasher.hash('hunter2')
+    assert not PasswordHasher.verify('hunter3', stored)
+    assert PasswordHasher.verify('hunter2', stored)
+    # Again, from the verification cache
+    assert PasswordHasher.verify('hunter2', stored)
+    assert not PasswordHasher.verify_async('hunter3', stored).result()
+
+    hashes = [PasswordHasher.hash('hunter2') for _ in range(4)]
+    assert all(future.result() for future in
+               [PasswordHasher.verify_async('hunter2', hashed) for hashed in hashes])
+
+    AccountManager.create_acct('bob', 'hunter2')
+    assert AccountManager.authenticate('bob', 'hunter3') == None
+    assert AccountManager.authenticate('bob', 'hunter2') != None
+    assert AccountManager.authenticate('nobody', 'hunter2') == None
+
+
+@pytest.mark.parametrize('account_cache', [0, 256], indirect=True)
+def test_commands_with_and_without_account_cache(backend, account_cache):
+    usernames = [f'user{i}' for i in range(5)]
+    for username in usernames:
+        AccountManager.create_acct(username, 'pw')
+    AccountManager.invalidate_acct()
+
+    IDs = iter(f'{i:02x}' for i in range(256))
+    booked = {username: [] for username in usernames}
+    for r in range(3):
+        for i, username in enumerate(usernames):
+            AccountCommands.view_account(username)
+            assert AccountCommands.login(username, 'pw').startswith('Logged')
+            booked[username].append(next(IDs))
+            assert ReservationCommands.create_reservation(
+                username, booked[username][-1], str(r), str(i), str(i + 1)).startswith('Success')
+            assert booked[username][-1] in \
+                AccountCommands.account_reservations(username, '0', '10')
+
+    AccountManager.invalidate_acct()
+    assert all(AccountManager.load_acct_from_file(username).reservations == IDs
+               for username, IDs in booked.items())
+
+
+@pytest.mark.parametrize('account_cache', [256], indirect=True)
+def test_password_change_keeps_another_process_booking(spec, backend, account_cache):
+    AccountManager.create_acct('bob', 'pw')
+    # Cache bob, book for him in another process, then change his password
+    # here (which rewrites the account)
+    AccountCommands.view_account('bob')
+    with multiprocessing.Pool(1) as pool:
+        assert pool.apply(book_for_account_in_process,
+                          (spec, ('zz', 'bob', 200, TimeRange(start=1, end=2))))
+    assert AccountCommands.change_account_password('bob', 'pw', 'pw2') \
+        == 'Password successfully changed!'
+
+    AccountManager.invalidate_acct()
+    assert 'zz' in AccountManager.load_acct_from_file('bob').reservations
+    assert AccountManager.authenticate('bob', 'pw2') != None
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the admin UI's script mode (AdminUI.run_script).
+
+@author: tanne
+"""
+from AdminUI import AdminUI
+from Benchmarks import admin_script
+
+
+def test_admin_script_runs_without_errors(backend):
+    script = admin_script(n_accounts=5, n_reservations=60)
+    summary = AdminUI.run_script(script, output='quiet')
+    assert summary['commands'] == len(script)
+    assert summary['errors'] == 0
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of ReservationsAPI on the multi-process backends: bulk booking, the
+availability search, the owner index and concurrent bookings.
+
+@author: tanne
+"""
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from Benchmarks import book_all, book_in_process, naive_find_free, random_requests
+from GarageModule import Day, GarageManager
+from IndexModule import OwnerIndex
+from MigrateStorage import StorageMigrator
+from ReservationsAPI import ReservationsAPI
+from ReservationsModule import Res
+from StorageModule import Storage
+from TimeUtilities import TimeRange
+
+
+def find_double_bookings(requests: list, booked: list) -> list:
+    '''
+    Reload every day from storage and return the IDs of booked requests that
+    do not own exactly their slots on one lift (i.e, were overwritten by
+    another booking), plus any ID in a grid that was never booked.
+    '''
+    GarageManager.invalidate_day()
+    wanted = {request[0]: request for request in requests}
+    booked = set(booked)
+    problems = []
+    seen = set()
+
+    for day in sorted({wanted[ID][2] for ID in booked}):
+        slots = GarageManager.load_day(day).reservedSlots
+        for ID in set(slots.flatten()) - {None}:
+            seen.add(ID)
+            lifts = np.nonzero((slots == ID).any(1))[0]
+            s, e = wanted[ID][3:] if ID in wanted else (0, 0)
+            if ID not in booked or len(lifts) != 1 \
+                    or list(np.nonzero(slots[lifts[0]] == ID)[0]) != list(range(s, e)):
+                problems.append(ID)
+
+    return problems + sorted(booked - seen)
+
+
+def shared_chunks(n_workers: int, per_worker: int) -> list:
+    '''
+    per_worker requests for each worker, all on the same 8 days so most
+    of them collide
+    '''
+    return [random_requests(per_worker, list(range(1, 9)), seed=w, prefix=f'w{w}r')
+            for w in range(n_workers)]
+
+
+@pytest.mark.parametrize('template', ['files:{}', 'sqlite:{}.db'])
+def test_bulk_booking_matches_one_at_a_time(workspace, template):
+    requests = [(ID, owner, day, TimeRange(start=s, end=e)) for ID, owner, day, s, e
+                in random_requests(400, list(range(1, 21)))]
+    results = []
+    for method in ('try_create_res', 'try_create_many'):
+        for folder in ('days', 'reservations', 'accounts'):
+            (workspace / method / folder).mkdir(parents=True)
+        ReservationsAPI.use_storage(StorageMigrator.open_backend(template.format(method)))
+        if method == 'try_create_res':
+            created = [ReservationsAPI.try_create_res(*request) for request in requests]
+        else:
+            created = ReservationsAPI.try_create_many(requests)
+
+        GarageManager.invalidate_day()
+        results.append((created, [GarageManager.load_day(day).reservedSlots.tolist()
+                                  for day in range(1, 21)]))
+        Storage.backend.close()
+
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize('n_lifts', [2, 5])
+def test_find_available_matches_probing_every_day(backend, monkeypatch, n_lifts):
+    monkeypatch.setattr(GarageManager, 'default_num_lifts', n_lifts)
+    rng = np.random.default_rng(n_lifts)
+    with backend.transaction():
+        for day in range(40):
+            c_day = Day(day, n_lifts)
+            for lift in range(n_lifts):
+                end = int(rng.integers(17, 24))
+                c_day.write_res(Res(f'r{day}x{lift}', 'test', day, TimeRange(start=0, end=end)))
+            c_day.save()
+    GarageManager.invalidate_day()
+
+    # Places are the starts of free runs: the first is the first probing
+    # finds, and each is free
+    found = ReservationsAPI.find_available(6, n=5)
+    assert found[0][:2] == naive_find_free(6, n=1)[0]
+    for day, start, lift in found:
+        assert ReservationsAPI.try_if_available(day, TimeRange(start=start, end=start + 6))
+        slots = GarageManager.load_day(day).reservedSlots
+        assert all(ID == None for ID in slots[lift, int(start):int(start) + 6])
+
+
+def test_owner_index_matches_a_scan(files_backend):
+    rng = np.random.default_rng(9)
+    records = [(f'r{i}', {'owner': f'owner{i % 20}', 'day': int(rng.integers(0, 366)),
+                          'active': bool(rng.random() < 0.9)}) for i in range(2000)]
+    def scan(owner):
+        return sorted(filename for filename, record in records
+                      if record['owner'] == owner and 100 <= record['day'] <= 200
+                      and record['active'])
+
+    index = OwnerIndex()
+    index.build(records)
+    assert sorted(index.query('owner7', 100, 200, True)) == scan('owner7')
+
+    with files_backend.transaction():
+        for filename, record in records:
+            files_backend.save_res(Res(filename, record['owner'], record['day'],
+                                       TimeRange(start=1, end=2), record['active']))
+    found = ReservationsAPI.list_res_of_owner('owner7', 100, 200, True)
+    assert sorted(c_res.ID for c_res in found) == scan('owner7')
+
+
+def test_threads_never_double_book(backend):
+    chunks = shared_chunks(4, 150)
+    with ThreadPoolExecutor(len(chunks)) as pool:
+        booked = [ID for IDs in pool.map(book_all, chunks) for ID in IDs]
+
+    requests = [request for chunk in chunks for request in chunk]
+    assert booked
+    assert find_double_bookings(requests, booked) == []
+
+
+def test_processes_never_double_book(files_backend):
+    # Each process opens its own FileStorage on the shared folders
+    chunks = shared_chunks(4, 150)
+    with multiprocessing.Pool(len(chunks)) as pool:
+        results = pool.starmap(book_in_process, [('files:.', chunk) for chunk in chunks])
+    booked = [ID for IDs in results for ID in IDs]
+
+    requests = [request for chunk in chunks for request in chunk]
+    assert booked
+    assert find_double_bookings(requests, booked) == []
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Property tests of the day engine (GarageModule & OccupancyModule) on random
+days, against the reference implementations the benchmarks time.
+
+@author: tanne
+"""
+import numpy as np
+import pytest
+from AvailabilityModule import DayAvailability
+from Benchmarks import legacy_find_best_lift, random_day, random_res_stream
+from GarageModule import Day
+from OccupancyModule import BitGrid
+from PackingModule import LiftPacker
+from ReservationsModule import Res
+from TimeUtilities import TimeRange
+
+
+def test_best_lift_matches_reference_loop():
+    rng = np.random.default_rng(1)
+    for trial in range(500):
+        c_day = random_day(int(rng.integers(1, 12)), seed=trial,
+                           fill_ratio=float(rng.uniform(0, 0.9)))
+        s = int(rng.integers(0, 24))
+        e = int(rng.integers(s + 1, 25))
+        tRange = TimeRange(start=s, end=e)
+
+        assert c_day.findBestLift(tRange) == legacy_find_best_lift(c_day.reservedSlots, tRange), \
+            f'day {trial}, {tRange}'
+
+
+def test_bit_grid_matches_slot_grid():
+    # Fill, clear & repack random days held both in a SlotGrid and a
+    # BitGrid: best_lift (with & without an ignored reservation) must agree,
+    # and the bitmasks match the handle grid
+    rng = np.random.default_rng(2)
+    for trial in range(300):
+        c_day = random_day(int(rng.integers(1, 9)), seed=trial,
+                           fill_ratio=float(rng.uniform(0, 0.9)),
+                           slots_per_hour=int(rng.choice([1, 4, 12])))
+        bits = BitGrid(c_day.grid.n_lifts, slots=c_day.grid.slots.copy(), ids=c_day.grid.ids)
+        IDs = list(c_day.grid.handles)
+
+        if IDs and rng.random() < 0.3:
+            for grid in (c_day.grid, bits):
+                grid.clear(IDs[0])
+            IDs = IDs[1:]
+        if IDs and rng.random() < 0.3:
+            placements = LiftPacker.assign(c_day.grid.spans(), c_day.grid.n_lifts)
+            for grid in (c_day.grid, bits):
+                grid.rebuild(placements)
+
+        n_slots = c_day.grid.n_slots
+        s = int(rng.integers(0, n_slots))
+        e = int(rng.integers(s + 1, n_slots + 1))
+        for ignore in [None] + IDs[:1]:
+            assert bits.best_lift(s, e, ignore) == c_day.grid.best_lift(s, e, ignore), \
+                f'trial {trial}'
+
+        assert bits.masks == BitGrid(bits.n_lifts, slots=bits.slots, ids=bits.ids).masks
+
+
+@pytest.mark.parametrize('n_lifts', [8, 32])
+def test_repack_keeps_reservations_in_time(n_lifts):
+    # Book a stream of requests (twice a day's capacity), repacking when a
+    # request fits no lift. A repack must agree with fits_after_repack and
+    # never move a reservation in time.
+    c_day = Day(1, n_lifts)
+    repacks = 0
+    for c_res in random_res_stream(n_lifts * 24 * 2, seed=n_lifts):
+        if c_day.findBestLift(c_res.tRange) != -1:
+            c_day.write_res(c_res)
+            continue
+
+        before = {ID: span[1:] for ID, span in c_day.grid.spans().items()}
+        fits = c_day.fits_after_repack(c_res.tRange)
+        assert c_day.repack_res(c_res) == fits
+
+        if fits:
+            repacks += 1
+            before[c_res.ID] = (int(c_res.start), int(c_res.end))
+            assert {ID: span[1:] for ID, span in c_day.grid.spans().items()} == before
+
+    assert repacks > 0
+
+
+def test_day_indexes_follow_changes():
+    # Write, remove & repack random reservations: each day's incrementally
+    # updated availability summary & res_locs must match ones built from
+    # the grid
+    rng = np.random.default_rng(4)
+    for trial in range(300):
+        slots_per_hour = int(rng.choice([1, 4]))
+        c_day = Day(trial, int(rng.integers(1, 9)), slots_per_hour=slots_per_hour)
+        booked = []
+
+        for i in range(int(rng.integers(1, 60))):
+            if booked and rng.random() < 0.3:
+                c_day.remove_res(booked.pop(int(rng.integers(len(booked)))))
+            else:
+                s = int(rng.integers(0, 24 * slots_per_hour))
+                e = int(rng.integers(s + 1, 24 * slots_per_hour + 1))
+                c_res = Res(f'r{i}', 'test', trial,
+                            TimeRange(start=s / slots_per_hour, end=e / slots_per_hour))
+                try:
+                    c_day.write_res(c_res, repack=True)
+                    booked.append(c_res)
+                except ValueError:
+                    pass
+
+            fresh = DayAvailability.from_grid(c_day.grid)
+            assert c_day.availability.to_record() == fresh.to_record(), f'trial {trial}'
+            assert c_day.check_res_locs(), f'trial {trial}'
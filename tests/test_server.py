@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of ReservationServer, driven over TCP by raw clients & LoadGenerator.
+
+@author: tanne
+"""
+import asyncio
+import json
+from LoadGenerator import LoadGenerator
+from ReservationsAPI import ReservationsAPI
+from ReservationServer import ReservationServer
+
+
+def serve(client, **settings):
+    '''
+    Run client(server) against a started ReservationServer, and return its
+    result
+    '''
+    async def run():
+        server = ReservationServer(port=0, **settings)
+        await server.start()
+        try:
+            return await client(server)
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+async def exchange(port: int, lines: list) -> list:
+    '''
+    Send lines on one connection, and return every response received until
+    the server closes it (or the client half is closed & all are answered)
+    '''
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for line in lines:
+        writer.write(line)
+    await writer.drain()
+    writer.write_eof()
+
+    responses = []
+    for line in (await reader.read()).splitlines():
+        responses.append(json.loads(line))
+    writer.close()
+    return responses
+
+
+def request(**fields) -> bytes:
+    '''
+    One request line
+    '''
+    return (json.dumps(fields) + '\n').encode()
+
+
+def test_load_generator_gets_no_errors(backend):
+    async def client(server):
+        generator = LoadGenerator(port=server.port, clients=8, requests=30, days=5)
+        return await generator.run()
+
+    latencies, errors, seconds = serve(client, workers=4)
+    assert sum(len(values) for values in latencies.values()) == 8 * 30
+    assert not sum(errors.values())
+
+
+def test_not_found_only_for_missing_reservations(files_backend, monkeypatch):
+    def missing_file(*args):
+        raise FileNotFoundError('days/7.txt')
+    monkeypatch.setattr(ReservationsAPI, 'find_available', missing_file)
+
+    lines = [request(id=1, op='get', ID='zz'),
+             request(id=2, op='cancel', ID='zz'),
+             request(id=3, op='modify', ID='zz', day=3, start=1, end=2),
+             request(id=4, op='find', duration=2)]
+    responses = {response['id']: response
+                 for response in serve(lambda server: exchange(server.port, lines))}
+
+    for ID in (1, 2, 3):
+        assert responses[ID] == {'id': ID, 'ok': False, 'error': 'Reservation "zz" not found'}
+    assert not responses[4]['ok'] and responses[4]['error'].startswith('Internal error')
+
+
+def test_request_line_too_long(files_backend):
+    lines = [request(id=1, op='create', ID='ab', owner='bob', day=3, start=1, end=2),
+             b'{"op": "get", "ID": "' + b'x' * 2 ** 17 + b'"}\n',
+             request(id=2, op='get', ID='ab')]
+    responses = serve(lambda server: exchange(server.port, lines))
+
+    # The request before is still answered (& applied); none after is read
+    assert {'id': 1, 'ok': True, 'result': True} in responses
+    assert {'ok': False, 'error': 'Request line too long'} in responses
+    assert len(responses) == 2
+    assert ReservationsAPI.get_res_from_file('ab').owner == 'bob'
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the storage backends & formats (StorageModule, DayFormatModule,
+ResFormatModule, JournalModule), including crash recovery.
+
+@author: tanne
+"""
+import json
+import multiprocessing
+import os
+import time
+import pytest
+from AccountFormatModule import AccountFormat
+from AccountModule import AccountManager
+from Benchmarks import random_day, random_requests
+from GarageModule import GarageManager
+from ReservationsAPI import ReservationsAPI
+from ReservationsModule import Res, ResManager
+from StorageModule import FileStorage, JournalStorage, SQLiteStorage, Storage, YearStorage
+from TimeUtilities import TimeRange
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def booked_slots(n_days: int) -> list:
+    '''
+    The reservedSlots of days 1 to n_days, read from storage
+    '''
+    GarageManager.invalidate_day()
+    return [GarageManager.load_day(day).reservedSlots.tolist() for day in range(1, n_days + 1)]
+
+
+@pytest.mark.parametrize('slots_per_hour', [1, 12])
+@pytest.mark.parametrize('binary', [False, True])
+def test_day_formats_round_trip(workspace, binary, slots_per_hour):
+    c_day = random_day(16, seed=6, slots_per_hour=slots_per_hour)
+    backend = FileStorage(binary_days=binary)
+    backend.save_day(c_day)
+
+    loaded = GarageManager.day_from_record(backend.load_day(c_day.filename))
+    assert (loaded.grid.to_id_array() == c_day.grid.to_id_array()).all()
+    assert loaded.res_locs == c_day.res_locs
+
+
+def test_res_format_round_trips_case_and_active(workspace):
+    # Older text files & ResFormat records both load back unchanged
+    reservations = [Res(f'Res{i}X', f'Owner{i % 7}', i, TimeRange(start=1, end=3.5),
+                        active=bool(i % 3)) for i in range(30)]
+    expected = [(r.ID, r.owner, r.day, r.start, r.end, r.active) for r in reservations]
+    for c_res in reservations:
+        with open(f'reservations/{c_res.filename.lower()}.txt', 'w') as file:
+            file.write(c_res.toString())
+
+    backend = FileStorage()
+    def load_all():
+        loaded = [ResManager.res_from_record(backend.load_res(c_res.filename.lower()))
+                  for c_res in reservations]
+        return [(r.ID, r.owner, r.day, r.start, r.end, r.active) for r in loaded]
+
+    assert load_all() == expected
+    with backend.transaction():
+        for c_res in reservations:
+            backend.save_res(c_res)
+    assert load_all() == expected
+
+
+@pytest.mark.parametrize('name', ['files', 'sqlite'])
+def test_saved_summaries_match_loaded_days(workspace, name):
+    backend = FileStorage() if name == 'files' else SQLiteStorage('test.db')
+    ReservationsAPI.use_storage(backend)
+    with backend.transaction():
+        for day in range(20):
+            backend.save_day(random_day(8, seed=day, fill_ratio=0.7))
+
+    GarageManager.invalidate_day()
+    loaded = [GarageManager.load_day(day).availability.to_record() for day in range(20)]
+    GarageManager.invalidate_day()
+    saved = [summary.to_record() for day, summary in ReservationsAPI.list_availability(0, 19)]
+    assert saved == loaded
+    backend.close()
+
+
+def test_year_storage_matches_day_files(workspace, monkeypatch):
+    monkeypatch.setattr(GarageManager, 'default_num_lifts', 8)
+    days = [random_day(8, seed=day, slots_per_hour=4) for day in range(30)]
+    for day, c_day in enumerate(days):
+        c_day.day, c_day.filename = day, str(day)
+
+    summaries = {}
+    for backend in (FileStorage(), YearStorage(n_lifts=8, slots_per_hour=4)):
+        ReservationsAPI.use_storage(backend)
+        with backend.transaction():
+            for c_day in days:
+                backend.save_day(c_day)
+        summaries[type(backend)] = [summary.to_record() for day, summary
+                                    in ReservationsAPI.list_availability(0, 29)]
+        backend.close()
+
+    assert summaries[FileStorage] == summaries[YearStorage]
+
+
+def test_year_day_keeps_its_slots_after_a_commit(workspace):
+    # Commits renumber the day's handles in the mapping; a day loaded before
+    # must still name its own reservations
+    backend = YearStorage()
+    ReservationsAPI.use_storage(backend)
+    for i, (s, e) in enumerate([(1, 3), (4, 6), (7, 9)]):
+        assert ReservationsAPI.try_create_res(f'r{i}', 'bob', 3, TimeRange(start=s, end=e))
+
+    record = backend.load_day('3')
+    ReservationsAPI.cancel_res('r0')
+    IDs = {record['ids'][int(h)] for h in record['slots'].flatten() if h}
+    assert IDs == {'r0', 'r1', 'r2'}
+    backend.close()
+
+
+def test_journal_replay_and_compaction_keep_bookings(workspace):
+    requests = [(ID, owner, day, TimeRange(start=s, end=e)) for ID, owner, day, s, e
+                in random_requests(300, list(range(1, 11)))]
+    grids = {}
+    for name in ('files', 'journal'):
+        os.makedirs(name)
+        for folder in ('days', 'reservations', 'accounts'):
+            os.mkdir(os.path.join(name, folder))
+        open_backend = (lambda: FileStorage(name)) if name == 'files' else \
+            (lambda: JournalStorage(name, sync_every=0))
+
+        ReservationsAPI.use_storage(open_backend())
+        for request in requests:
+            ReservationsAPI.try_create_res(*request)
+        if name == 'journal':
+            # As a crash would: no compaction
+            Storage.backend.journal.close()
+            ReservationsAPI.use_storage(open_backend())
+            assert Storage.backend.journal.size > 0
+            Storage.backend.compact()
+
+        grids[name] = booked_slots(10)
+        Storage.backend.close()
+
+    assert grids['journal'] == grids['files']
+
+
+def test_journal_appends_account_records_only(workspace):
+    backend = JournalStorage('.', sync_every=0)
+    ReservationsAPI.use_storage(backend)
+    AccountManager.create_acct('bob', 'pw')
+    backend.compact()
+
+    sizes = []
+    IDs = []
+    for i in range(40):
+        sizes.append(backend.journal.size)
+        IDs.append(f'n{i}')
+        assert ReservationsAPI.try_create_many([(IDs[-1], 'bob', i + 1,
+                                                 TimeRange(start=1, end=2))])[0]
+    growth = [b - a for a, b in zip(sizes, sizes[1:])]
+    assert max(growth) - min(growth) < 16, 'journal entries grow with the account'
+
+    backend.journal.close()
+    backend = JournalStorage('.')
+    assert backend.load_acct('bob')['reservations'] == IDs
+    backend.close()
+    assert JournalStorage('.').load_acct('bob')['reservations'] == IDs
+
+
+@pytest.mark.skipif(fcntl == None, reason='manifests are only locked with fcntl')
+def test_recover_leaves_manifests_being_applied(workspace):
+    path = os.path.join('.', 'reservations', 'ab.txt')
+    temp_path = f'{path}.writer.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(b'new')
+    manifest = os.path.join('.', f'{FileStorage.MANIFEST}-writer')
+    with open(manifest, 'w') as file:
+        json.dump([[path, temp_path]], file)
+
+    # A live writer holds its manifest's lock
+    fd = os.open(manifest, os.O_RDONLY)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    FileStorage('.')
+    assert os.path.exists(manifest) and not os.path.exists(path)
+
+    # Once it is gone, the manifest is recovered
+    os.close(fd)
+    FileStorage('.')
+    assert not os.path.exists(manifest) and open(path, 'rb').read() == b'new'
+
+
+def commit_in_loop(root: str, seconds: float) -> None:
+    '''
+    Commit transactions of several files to a FileStorage for seconds
+    '''
+    backend = FileStorage(root)
+    end = time.time() + seconds
+    i = 0
+    while time.time() < end:
+        with backend.transaction():
+            for k in range(5):
+                backend._write(os.path.join(root, 'reservations', f'w{k}.txt'), str(i).encode())
+        i += 1
+
+
+def test_opening_storage_while_others_commit(workspace):
+    with multiprocessing.Pool(2) as pool:
+        writers = [pool.apply_async(commit_in_loop, ('.', 1.5)) for _ in range(2)]
+        while not all(writer.ready() for writer in writers):
+            FileStorage('.')
+        for writer in writers:
+            writer.get()
+
+
+HEADER = b'{"v": 1, "username": "bob", "password": "x", "filename": "bob"}\n'
+ADDED = b'"a1"\n"a2"\n'
+
+
+@pytest.mark.parametrize('on_disk, offset, expected', [
+    # Not applied yet / applied in part
+    (HEADER, len(HEADER), HEADER + ADDED),
+    (HEADER + b'"a1"\n"a', len(HEADER), HEADER + ADDED),
+    # Applied, then later appends: kept
+    (HEADER + ADDED + b'"c1"\n', len(HEADER), HEADER + ADDED + b'"c1"\n'),
+    # Torn, then overwritten by a later append: added after it
+    (HEADER + b'"c1"\n', len(HEADER), HEADER + b'"c1"\n' + ADDED),
+    # Rewritten since, already holding a1
+    (HEADER + b'"a1"\n', len(HEADER) + 100, HEADER + ADDED),
+])
+def test_replayed_append_keeps_later_records(workspace, on_disk, offset, expected):
+    path = os.path.join('accounts', 'bob.acct')
+    with open(path, 'wb') as file:
+        file.write(on_disk)
+
+    FileStorage('.')._apply_append(path, ADDED, offset)
+    data = open(path, 'rb').read()
+    assert data == expected
+    assert AccountFormat.decode(data, 'bob')['reservations'] == \
+        [ID.strip('"') for ID in expected[len(HEADER):].decode().split()]
+
+
+def test_append_overwrites_a_torn_line(workspace):
+    path = os.path.join('accounts', 'bob.acct')
+    with open(path, 'wb') as file:
+        file.write(HEADER + b'"a')
+
+    backend = FileStorage('.')
+    backend._append(path, b'"c1"\n')
+    assert open(path, 'rb').read() == HEADER + b'"c1"\n'